@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; status is 429 (this user's limit) or 503 (server busy)."""
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for expensive endpoints, grouped into classes (e.g. "sweep", "weather").
+    Each class has a per-user token bucket (rate_per_minute, burst), a per-user
+    in-flight limit and a global in-flight cap. Requests over a limit are rejected
+    straight away instead of queueing, so they never hold a worker that cheap
+    endpoints need.
+    """
+    MAX_IDLE_USERS = 10000  # bucket entries kept before idle ones are dropped
+
+    def __init__(self, limits, enabled=True):
+        """limits: {class: {"user_concurrency", "global_concurrency", "rate_per_minute", "burst"}}"""
+        self.limits = limits
+        self.enabled = enabled
+        self._in_flight = {name: 0 for name in limits}
+        self._user_in_flight = {}  # (class, user_id) -> count
+        self._buckets = {}  # (class, user_id) -> [tokens, updated_at]
+        self._service_time = {name: 1.0 for name in limits}  # EWMA seconds, for Retry-After
+        self._rejected = {name: {"429": 0, "503": 0} for name in limits}
+        self._admitted = {name: 0 for name in limits}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, user_id):
+        """Take a slot for user_id in class name, or raise AdmissionRejected. Pair with release()."""
+        if not self.enabled or name not in self.limits:
+            return time.monotonic()
+        limit = self.limits[name]
+        key = (name, user_id)
+        now = time.monotonic()
+        with self._lock:
+            if self._user_in_flight.get(key, 0) >= limit["user_concurrency"]:
+                self._rejected[name]["429"] += 1
+                raise AdmissionRejected(
+                    "You already have a request of this kind running. Please wait for it to finish.",
+                    429, self._retry_after(name)
+                )
+
+            rate = limit["rate_per_minute"] / 60.0
+            tokens, updated_at = self._buckets.get(key, (limit["burst"], now))
+            tokens = min(limit["burst"], tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                self._rejected[name]["429"] += 1
+                raise AdmissionRejected(
+                    "Too many requests. Please slow down.",
+                    429, max(1, math.ceil((1 - tokens) / rate)) if rate > 0 else 60
+                )
+
+            if self._in_flight[name] >= limit["global_concurrency"]:
+                self._rejected[name]["503"] += 1
+                raise AdmissionRejected(
+                    "The server is busy. Please try again shortly.",
+                    503, self._retry_after(name)
+                )
+
+            if len(self._buckets) >= self.MAX_IDLE_USERS:
+                self._prune(now)
+            self._buckets[key] = (tokens - 1, now)
+            self._user_in_flight[key] = self._user_in_flight.get(key, 0) + 1
+            self._in_flight[name] += 1
+            self._admitted[name] += 1
+        return now
+
+    def release(self, name, user_id, started_at):
+        if not self.enabled or name not in self.limits:
+            return
+        key = (name, user_id)
+        with self._lock:
+            self._in_flight[name] = max(0, self._in_flight[name] - 1)
+            count = self._user_in_flight.get(key, 0) - 1
+            if count > 0:
+                self._user_in_flight[key] = count
+            else:
+                self._user_in_flight.pop(key, None)
+            self._service_time[name] += 0.2 * (time.monotonic() - started_at - self._service_time[name])
+
+    def _retry_after(self, name):
+        return max(1, math.ceil(self._service_time[name]))
+
+    def _prune(self, now):
+        """Drop buckets that have refilled completely; they hold no state worth keeping."""
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            limit = self.limits[key[0]]
+            if tokens + (now - updated_at) * limit["rate_per_minute"] / 60.0 >= limit["burst"]:
+                del self._buckets[key]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "in_flight": self._in_flight[name],
+                    "global_concurrency": self.limits[name]["global_concurrency"],
+                    "admitted": self._admitted[name],
+                    "rejected": dict(self._rejected[name]),
+                    "avg_service_sec": round(self._service_time[name], 2)
+                } for name in self.limits
+            }
@@ -0,0 +1,162 @@
+import gzip
+import threading
+import zlib
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson when it is installed.
+    orjson encodes numpy arrays and scalars natively and is several times faster
+    than the stdlib encoder on large route/LAPS payloads. Output stays compact and
+    key-sorted like jsonify's; anything orjson rejects goes through the stdlib path.
+    """
+    name = "orjson" if orjson else "json"
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps(obj), mimetype=self.mimetype)
+
+
+def stream_json_array(items, dumps, chunk_size=100):
+    """Yield a JSON array in chunks so a large result is never held as one string."""
+    yield "["
+    buf = []
+    first = True
+    for item in items:
+        buf.append(dumps(item))
+        if len(buf) >= chunk_size:
+            yield ("" if first else ",") + ",".join(buf)
+            first = False
+            buf = []
+    if buf:
+        yield ("" if first else ",") + ",".join(buf)
+    yield "]"
+
+
+class ResponseCompressor:
+    """
+    gzip/brotli for API responses, chosen from Accept-Encoding.
+    Buffered bodies are compressed when at least min_size bytes; streamed bodies
+    are compressed chunk by chunk. Byte counts feed /api/metrics.
+    """
+    COMPRESSIBLE = ("application/json", "text/csv", "text/plain")
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = {"responses": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+        self._lock = threading.Lock()
+
+    def choose(self, accept_encodings):
+        if brotli and accept_encodings["br"]:
+            return "br"
+        if accept_encodings["gzip"]:
+            return "gzip"
+        return None
+
+    def _record(self, size_in, size_out, compressed):
+        with self._lock:
+            self.stats["responses"] += 1
+            self.stats["bytes_in"] += size_in
+            self.stats["bytes_out"] += size_out
+            if compressed:
+                self.stats["compressed"] += 1
+
+    def compress(self, response, accept_encodings):
+        if response.status_code != 200 or response.direct_passthrough or "Content-Encoding" in response.headers \
+                or response.mimetype not in self.COMPRESSIBLE:
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = self.choose(accept_encodings)
+        if response.is_streamed:
+            if encoding:
+                response.response = self._compress_stream(response.response, encoding)
+                response.headers.pop("Content-Length", None)
+            else:
+                response.response = self._count_stream(response.response)
+        else:
+            body = response.get_data()
+            if not encoding or len(body) < self.min_size:
+                self._record(len(body), len(body), False)
+                return response
+            if encoding == "br":
+                data = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                data = gzip.compress(body, compresslevel=self.gzip_level)
+            response.set_data(data)
+            self._record(len(body), len(data), True)
+
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+            # The encoded bytes differ from the identity body the ETag was computed on
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+        return response
+
+    def _compress_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+            process, finish = compressor.compress, compressor.flush
+        size_in = size_out = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            size_in += len(chunk)
+            data = process(chunk)
+            if data:
+                size_out += len(data)
+                yield data
+        data = finish()
+        size_out += len(data)
+        yield data
+        self._record(size_in, size_out, True)
+
+    def _count_stream(self, chunks):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        self._record(size, size, False)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None
+        return stats
@@ -1,7 +1,14 @@
 import os
+import csv
+import io
+import time
 from datetime import datetime, timedelta
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, run a single process there
+    fcntl = None
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,23 +26,282 @@ else:
     if not secret_key: missing.append('SECRET_KEY')
     print(f"Warning: Missing environment variables: {', '.join(missing)}")
 
+from admission import AdmissionController, AdmissionRejected
+from api_response import FastJSONProvider, ResponseCompressor, stream_json_array
+from assets import AssetManifest, build_assets
+from cache import ResponseCache
 from config import Config
-from models import db, User, Vehicle, Trip
+from models import db, User, Vehicle, Trip, SharedCache, VehicleCache, ensure_schema
+from history import (TripLogger, RouteSampleLogger, get_trip_history, get_monthly_summary, get_corridor_distances,
+                     get_route_samples, purge_route_samples)
+from jobs import JobManager
+from predictor import DelayPredictor
+from prewarm import Prewarmer
+from monitor import TrafficMonitor
+from resilience import Deadline, configure_breakers
 from services import FuelService, TomTomTrafficService, WeatherService
 
 app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
 app.config.from_object(Config)
+app.json = FastJSONProvider(app)
 db.init_app(app)
 
 # Initialize Services
+configure_breakers(
+    failure_threshold=app.config.get('BREAKER_FAILURE_THRESHOLD', 5),
+    reset_timeout=app.config.get('BREAKER_RESET_SECONDS', 30)
+)
 fuel_service = FuelService(app.config.get('FUEL_API_KEY'))
-# ml_service = MLService() # Deprecated
 
 tomtom_service = TomTomTrafficService(app.config.get('TOMTOM_API_KEY'))
 weather_service = WeatherService()
+# Results warmed by the background process are read from the database by every worker
+tomtom_service._summary_cache = SharedCache(app, 'route_summary', tomtom_service._summary_cache)
+tomtom_service._laps_cache = SharedCache(app, 'laps', tomtom_service._laps_cache)
+weather_service._forecast_cache = SharedCache(app, 'forecast', weather_service._forecast_cache)
+vehicle_cache = VehicleCache(ttl=app.config.get('VEHICLE_CACHE_TTL', 600))
+response_cache = ResponseCache(max_entries=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))
 
 with app.app_context():
     db.create_all()
+    ensure_schema(db.engine)
+
+trip_logger = TripLogger(
+    app,
+    batch_size=app.config.get('TRIP_LOG_BATCH_SIZE', 200),
+    flush_interval=app.config.get('TRIP_LOG_FLUSH_SECONDS', 2.0)
+)
+# Seed the route estimator with distances already logged between known cities
+with app.app_context():
+    for origin, destination, distance_km in get_corridor_distances():
+        start, end = tomtom_service.gazetteer.lookup(origin), tomtom_service.gazetteer.lookup(destination)
+        if start and end:
+            tomtom_service.estimator.observe(start, end, distance_km)
+
+# Delay predictor: trained on traffic_data.csv plus every route summary we fetch, and
+# used instead of live calls for dates more than PREDICTION_HORIZON_DAYS ahead
+route_sample_logger = RouteSampleLogger(
+    app,
+    batch_size=app.config.get('TRIP_LOG_BATCH_SIZE', 200),
+    flush_interval=app.config.get('TRIP_LOG_FLUSH_SECONDS', 2.0)
+)
+tomtom_service.on_route_summary = route_sample_logger.log
+delay_predictor = DelayPredictor(app.config.get('PREDICTOR_MODEL_PATH'))
+
+def train_predictor(fetch_holidays=True):
+    """Refit the delay predictor on the logged route summaries and save it. Returns the sample count."""
+    route_sample_logger.flush()
+    history_days = app.config.get('PREDICTOR_HISTORY_DAYS', 180)
+    with app.app_context():
+        purge_route_samples(days=history_days)
+        samples = get_route_samples(days=history_days)
+    holidays = set()
+    if fetch_holidays:
+        for year in {s[1].year for s in samples if s[1]} | {datetime.now().year, datetime.now().year + 1}:
+            holidays |= tomtom_service._holiday_dates(year, deadline=Deadline(10))
+    delay_predictor.train(samples, holidays)
+    delay_predictor.save()
+    return len(samples)
+
+if app.config.get('PREDICTOR_ENABLED'):
+    tomtom_service.predictor = delay_predictor
+    tomtom_service.prediction_horizon_days = app.config.get('PREDICTION_HORIZON_DAYS', 3)
+
+@app.before_request
+def refresh_delay_predictor():
+    # Workers load the saved model on first use and pick up retrains by the background runner
+    if tomtom_service.predictor:
+        delay_predictor.refresh()
+
+job_manager = JobManager(
+    app,
+    max_workers=app.config.get('JOB_WORKERS', 4),
+    result_ttl=app.config.get('JOB_RESULT_TTL', 86400),
+    reuse_seconds=app.config.get('JOB_REUSE_SECONDS', 300),
+    heartbeat_seconds=app.config.get('JOB_HEARTBEAT_SECONDS', 30)
+)
+prewarmer = Prewarmer(
+    app, tomtom_service, weather_service,
+    days=app.config.get('PREWARM_DAYS', 2),
+    top_k=app.config.get('PREWARM_TOP_CORRIDORS', 20),
+    start_hour=app.config.get('PREWARM_START_HOUR', 6),
+    end_hour=app.config.get('PREWARM_END_HOUR', 22),
+    run_at_hour=app.config.get('PREWARM_RUN_AT_HOUR', 3),
+    after_run=train_predictor if app.config.get('PREDICTOR_ENABLED') else None
+)
+traffic_monitor = TrafficMonitor(
+    app, tomtom_service,
+    interval=app.config.get('MONITOR_INTERVAL', 60),
+    static_corridors=app.config.get('MONITOR_CORRIDORS')
+)
+
+_background_lock = None
+
+def _publish_shared_caches():
+    """Write what this process fetches into the shared caches, for the web workers to read."""
+    for cache in (tomtom_service._summary_cache, tomtom_service._laps_cache, weather_service._forecast_cache):
+        cache.publish = True
+
+def start_background_services():
+    """
+    Run the nightly prewarm (and the delay predictor's first fit) and the traffic
+    monitor's sampler in this process.
+    Importing the app never starts them; call this from one process, e.g. with
+    `flask run-background` next to the web workers. A lock file keeps a second caller
+    on the same host from running them twice. Returns False if another process has them.
+    """
+    global _background_lock
+    if _background_lock is not None:
+        return True
+    lock = open(app.config.get('BACKGROUND_LOCK_PATH'), 'a')
+    if fcntl:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+    _background_lock = lock
+
+    if app.config.get('PREDICTOR_ENABLED') and not delay_predictor.load():
+        # First start: fit on what is logged so far, without waiting on the holiday API
+        train_predictor(fetch_holidays=False)
+    if app.config.get('PREWARM_ENABLED'):
+        _publish_shared_caches()
+        prewarmer.start()
+    if app.config.get('MONITOR_ENABLED'):
+        traffic_monitor.start()
+    return True
+
+asset_manifest = AssetManifest(app.config.get('ASSETS_DIR'))
+app.jinja_env.globals['asset_url'] = asset_manifest.url
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress frontend/static into ASSETS_DIR."""
+    try:
+        manifest = build_assets(app.static_folder, app.config.get('ASSETS_DIR'))
+    except ValueError as e:
+        print(f"Not building assets: {e}")
+        return
+    asset_manifest.reload()
+    print(f"Built {len(manifest)} assets into {app.config.get('ASSETS_DIR')}.")
+
+@app.route('/assets/<path:filename>')
+def static_assets(filename):
+    """Hashed static files: cached forever, served gzip/brotli when accepted."""
+    return asset_manifest.serve(filename)
+
+compressor = ResponseCompressor(
+    min_size=app.config.get('COMPRESS_MIN_BYTES', 1024),
+    gzip_level=app.config.get('COMPRESS_GZIP_LEVEL', 6),
+    brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+)
+
+@app.after_request
+def compress_api_response(response):
+    if request.path.startswith('/api/'):
+        return compressor.compress(response, request.accept_encodings)
+    return response
+
+admission = AdmissionController({
+    'sweep': {
+        'user_concurrency': app.config.get('ADMISSION_USER_CONCURRENCY', 2),
+        'global_concurrency': app.config.get('ADMISSION_SWEEP_GLOBAL_CONCURRENCY', 8),
+        'rate_per_minute': app.config.get('ADMISSION_SWEEP_RATE_PER_MINUTE', 10),
+        'burst': max(1, app.config.get('ADMISSION_SWEEP_BURST', 9))
+    },
+    'weather': {
+        'user_concurrency': app.config.get('ADMISSION_USER_CONCURRENCY', 2),
+        'global_concurrency': app.config.get('ADMISSION_WEATHER_GLOBAL_CONCURRENCY', 16),
+        'rate_per_minute': app.config.get('ADMISSION_WEATHER_RATE_PER_MINUTE', 30),
+        'burst': max(1, app.config.get('ADMISSION_WEATHER_RATE_PER_MINUTE', 30) // 2)
+    }
+}, enabled=app.config.get('ADMISSION_ENABLED', True))
+
+def _admitted(endpoint_class, run):
+    """
+    Call run() holding an admission slot for the signed-in user, shedding load on an
+    expensive endpoint before it occupies a worker (429/503 + Retry-After). Callers
+    check auth and caches first, so only requests that actually compute are counted.
+    """
+    user_id = session['user_id']
+    try:
+        started_at = admission.acquire(endpoint_class, user_id)
+    except AdmissionRejected as e:
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    try:
+        return run()
+    finally:
+        admission.release(endpoint_class, user_id, started_at)
+
+def _deadline():
+    """Time budget for a synchronous request; background jobs run without one."""
+    return Deadline(app.config.get('REQUEST_DEADLINE_SECONDS', 20))
+
+def _vehicle_mileage(user_id, vehicle_id):
+    mileage = 15.0 # Default fallback
+    if vehicle_id:
+        vehicle = vehicle_cache.get(user_id, vehicle_id)
+        if vehicle:
+            mileage = vehicle['mileage']
+    return mileage
+
+def _memoized_json(endpoint, params, compute, ttl, admission_class=None):
+    """
+    Serve compute() -> (payload, status) as JSON, memoized per normalized params.
+    Successful results are reused for ttl seconds and carry an ETag, so a repeat
+    request with If-None-Match gets a 304 without recomputing or resending the body.
+    With admission_class, only a cache miss goes through admission control.
+    """
+    # Place names are matched case-insensitively; the vehicle only matters through its mileage
+    params = {k: v.strip().lower() if isinstance(v, str) else v for k, v in params.items() if k not in ('async', 'vehicle_id')}
+    key = response_cache.make_key(endpoint, params)
+    entry = response_cache.get(key)
+    if entry is None:
+        result = _admitted(admission_class, compute) if admission_class else compute()
+        if isinstance(result, Response):
+            return result
+        payload, status = result
+        if status != 200:
+            return jsonify(payload), status
+        entry = response_cache.set(key, app.json.dumps(payload), ttl)
+
+    # These endpoints are POSTs, which werkzeug's make_conditional() leaves alone.
+    # Compressed responses carry the ETag as weak, so compare weakly.
+    if request.if_none_match.contains_weak(entry['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.cache_control.private = True
+    response.cache_control.max_age = max(0, int(entry['expires_at'] - time.time()))
+    return response
+
+@app.cli.command('train-predictor')
+def train_predictor_command():
+    """Refit the delay predictor on logged route summaries now."""
+    samples = train_predictor()
+    print(f"Trained the delay predictor on {samples} logged route summaries.")
+
+@app.cli.command('run-background')
+def run_background_command():
+    """Run the nightly prewarm, predictor retraining and traffic monitor until interrupted."""
+    if not start_background_services():
+        print("Background services are already running in another process.")
+        return
+    print(f"Background services running (prewarm {'on' if app.config.get('PREWARM_ENABLED') else 'off'}, "
+          f"monitor {'on' if app.config.get('MONITOR_ENABLED') else 'off'}). Ctrl+C to stop.")
+    while True:
+        time.sleep(3600)
+
+@app.cli.command('prewarm')
+def prewarm_command():
+    """Warm the route/LAPS/weather caches for popular corridors now."""
+    _publish_shared_caches()
+    print(f"Warmed {prewarmer.run_once()} corridor-days.")
 
 
 
@@ -93,19 +359,13 @@ def vehicle_handler():
             user_id=session['user_id']
         )
         db.session.add(vehicle)
+        vehicle_cache.invalidate(session['user_id'])
         db.session.commit()
         return jsonify({'message': 'Vehicle added'})
     
     elif request.method == 'GET':
-        vehicles = Vehicle.query.filter_by(user_id=session['user_id']).all()
-        vehicle_list = [{
-            'id': v.id,
-            'name': v.name,
-            'mileage': v.mileage,
-            'type': v.vehicle_type,
-            'fuel_type': v.fuel_type
-        } for v in vehicles]
-        return jsonify(vehicle_list)
+        vehicles = vehicle_cache.for_user(session['user_id'])
+        return jsonify(list(vehicles.values()))
 
 @app.route('/api/vehicle/<int:vehicle_id>', methods=['DELETE'])
 def delete_vehicle(vehicle_id):
@@ -117,6 +377,7 @@ def delete_vehicle(vehicle_id):
         return jsonify({'error': 'Vehicle not found'}), 404
     
     db.session.delete(vehicle)
+    vehicle_cache.invalidate(session['user_id'])
     db.session.commit()
     return jsonify({'message': 'Vehicle deleted'})
 
@@ -135,34 +396,165 @@ def calculate_trip():
     if distance_km <= 0:
          return jsonify({'error': 'Invalid distance'}), 400
 
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not vehicle or vehicle.user_id != session['user_id']:
+    vehicle = vehicle_cache.get(session['user_id'], vehicle_id)
+    if not vehicle:
         return jsonify({'error': 'Invalid vehicle'}), 400
 
     # Get fuel prices
     # For now, we use a default city or could pass it from frontend
     prices = fuel_service.get_fuel_prices()
     
-    price_per_unit = prices.get(vehicle.fuel_type, prices['petrol'])
+    price_per_unit = prices.get(vehicle['fuel_type'], prices['petrol'])
     
     # Calculate cost: (Distance / Mileage) * Price
-    fuel_needed = distance_km / vehicle.mileage
+    fuel_needed = distance_km / vehicle['mileage']
     cost = fuel_needed * price_per_unit
     
     result = {
         "cost": round(cost, 2),
         "fuel_needed": round(fuel_needed, 2),
         "price_per_unit": price_per_unit,
-        "vehicle": vehicle.name
+        "vehicle": vehicle['name']
     }
+
+    trip_logger.log(
+        session['user_id'],
+        start_location=data.get('origin') or data.get('start'),
+        end_location=data.get('destination') or data.get('end'),
+        distance_km=distance_km,
+        fuel_cost=result['cost'],
+        fuel_litres=result['fuel_needed'],
+        vehicle_id=vehicle['id'],
+        source='calculate_trip'
+    )
             
     return jsonify(result)
 
+def _parse_fleet_trips():
+    """Read (label, distance_km) trips and vehicle ids from a CSV upload or a JSON body."""
+    upload = request.files.get('file')
+    if upload:
+        reader = csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'))
+        rows = list(reader)
+        vehicle_ids = [v for v in request.form.get('vehicle_ids', '').split(',') if v.strip()]
+    else:
+        data = request.json or {}
+        rows = data.get('trips', [])
+        vehicle_ids = data.get('vehicle_ids') or []
+
+    labels, distances = [], []
+    for i, row in enumerate(rows):
+        if isinstance(row, dict):
+            label = row.get('trip') or row.get('name') or f"Trip {i + 1}"
+            distance = row.get('distance_km')
+        else:
+            label, distance = f"Trip {i + 1}", row
+        labels.append(str(label))
+        distances.append(float(distance))
+    return labels, distances, vehicle_ids
+
+@app.route('/api/fleet_cost', methods=['POST'])
+def fleet_cost():
+    """
+    Cost projection for many vehicles x many trips.
+    Accepts JSON {"vehicle_ids": [...], "trips": [{"trip": "...", "distance_km": 12.5}, ...]}
+    or a CSV upload ('file' with trip,distance_km columns and optional 'vehicle_ids' form field).
+    Omitting vehicle_ids uses all of the user's vehicles. Results are streamed as JSON or CSV (?format=csv).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        labels, distances, vehicle_ids = _parse_fleet_trips()
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Invalid trip data: {e}'}), 400
+    if not distances:
+        return jsonify({'error': 'No trips provided'}), 400
+    if any(d <= 0 for d in distances):
+        return jsonify({'error': 'Invalid distance'}), 400
+
+    # Load every vehicle's mileage and fuel type once
+    user_vehicles = vehicle_cache.for_user(session['user_id'])
+    if vehicle_ids:
+        vehicles = [vehicle_cache.get(session['user_id'], v) for v in vehicle_ids]
+        if not all(vehicles):
+            return jsonify({'error': 'Invalid vehicle'}), 400
+    else:
+        vehicles = list(user_vehicles.values())
+    vehicles = [v for v in vehicles if v['mileage'] and v['mileage'] > 0]
+    if not vehicles:
+        return jsonify({'error': 'Please add a vehicle with a valid mileage'}), 400
+
+    max_pairs = app.config.get('FLEET_MAX_PAIRS', 2000000)
+    if len(vehicles) * len(distances) > max_pairs:
+        return jsonify({'error': f'Too many vehicle/trip pairs (max {max_pairs})'}), 400
+
+    fuel, cost, unit_prices = fuel_service.bulk_trip_costs(
+        [v['mileage'] for v in vehicles],
+        [v['fuel_type'] for v in vehicles],
+        distances
+    )
+    fuel_totals = fuel.sum(axis=1)
+    cost_totals = cost.sum(axis=1)
+    fuel = fuel.round(2)
+    cost = cost.round(2)
+    distances_out = [round(d, 2) for d in distances]
+
+    if request.args.get('format') == 'csv':
+        def generate_csv():
+            yield "vehicle_id,vehicle,trip,distance_km,fuel_needed,price_per_unit,cost\n"
+            for i, v in enumerate(vehicles):
+                out = io.StringIO()
+                writer = csv.writer(out, lineterminator='\n')
+                writer.writerows(
+                    (v['id'], v['name'], labels[j], distances_out[j], f, float(unit_prices[i]), c)
+                    for j, (f, c) in enumerate(zip(fuel[i].tolist(), cost[i].tolist()))
+                )
+                yield out.getvalue()
+        return Response(
+            stream_with_context(generate_csv()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=fleet_cost.csv'}
+        )
+
+    # Per-vehicle totals come first; the full pair list is streamed one vehicle at a time
+    totals = [{
+        'vehicle_id': v['id'],
+        'vehicle': v['name'],
+        'price_per_unit': float(unit_prices[i]),
+        'total_fuel': round(float(fuel_totals[i]), 2),
+        'total_cost': round(float(cost_totals[i]), 2)
+    } for i, v in enumerate(vehicles)]
+
+    def generate_json():
+        yield '{"vehicles": ' + app.json.dumps(totals) + ', "results": ['
+        for i, v in enumerate(vehicles):
+            rows = [app.json.dumps({
+                'vehicle_id': v['id'],
+                'trip': labels[j],
+                'distance_km': distances_out[j],
+                'fuel_needed': f,
+                'cost': c
+            }) for j, (f, c) in enumerate(zip(fuel[i].tolist(), cost[i].tolist()))]
+            yield (', ' if i else '') + ', '.join(rows)
+        yield ']}'
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
 @app.route('/api/smart_plan', methods=['POST'])
 def smart_plan():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
+    user_id = session['user_id']
+
+    def run():
+        if data.get('async'):
+            return jsonify(job_manager.submit(user_id, 'smart_plan', data, _run_smart_plan)), 202
+        payload, status = _run_smart_plan(user_id, data, deadline=_deadline())
+        return jsonify(payload), status
+    return _admitted('sweep', run)
+
+def _run_smart_plan(user_id, data, progress=None, deadline=None):
     start_hour = int(data['start_hour'])
     end_hour = int(data['end_hour'])
     origin = data.get('origin')
@@ -170,20 +562,40 @@ def smart_plan():
     target_date = data.get('date')
     
     if not origin or not destination:
-         return jsonify({'error': 'Missing origin or destination for prediction'}), 400
+         return {'error': 'Missing origin or destination for prediction'}, 400
 
     # Fetch vehicle mileage if vehicle_id is provided
     vehicle_id = data.get('vehicle_id')
     mileage = 15.0 # Default fallback
+    vehicle = None
     if vehicle_id:
-        vehicle = Vehicle.query.get(vehicle_id)
+        vehicle = vehicle_cache.get(user_id, vehicle_id)
         if vehicle:
-            mileage = vehicle.mileage
+            mileage = vehicle['mileage']
 
-    best_hour, avg_speed, traffic_level = tomtom_service.find_best_departure_time(origin, destination, start_hour, end_hour, target_date=target_date)
+    # 'adaptive' searches coarse-to-fine in 15-minute steps under a call budget
+    best_minute = 0
+    if (data.get('search_mode') or app.config.get('DEPARTURE_SEARCH_MODE')) == 'adaptive':
+        # Clients may ask for a smaller search, never a bigger one than the server allows
+        max_budget = app.config.get('DEPARTURE_SEARCH_BUDGET', 12)
+        try:
+            budget = max(1, min(int(data.get('search_budget', max_budget)), max_budget))
+        except (TypeError, ValueError):
+            return {'error': 'Invalid search_budget'}, 400
+        best_time, avg_speed, traffic_level, _ = tomtom_service.find_best_departure_time_adaptive(
+            origin, destination, start_hour, end_hour, target_date=target_date,
+            budget=budget,
+            progress=progress,
+            deadline=deadline
+        )
+        best_hour = None
+        if best_time is not None:
+            best_hour, best_minute = divmod(best_time, 60)
+    else:
+        best_hour, avg_speed, traffic_level = tomtom_service.find_best_departure_time(origin, destination, start_hour, end_hour, target_date=target_date, progress=progress, deadline=deadline)
     
     if best_hour is None:
-        return jsonify({'message': 'Could not calculate best time.'}), 400
+        return {'message': 'Could not calculate best time.'}, 400
 
     # Get route details for the current traffic (at the start_hour)
     selected_date = None
@@ -203,11 +615,14 @@ def smart_plan():
             
     depart_at = check_time.strftime("%Y-%m-%dT%H:%M:%S")
     
-    # Request alternatives to skip traffic
-    route_data = tomtom_service.get_route(origin, destination, depart_at=depart_at, find_alt=True, mileage=mileage)
+    # Beyond the live horizon the predictor answers without a routing call;
+    # otherwise request alternatives to skip traffic
+    route_data = tomtom_service.predicted_route(origin, destination, depart_at, mileage=mileage, deadline=deadline)
+    if route_data is None:
+        route_data = tomtom_service.get_route(origin, destination, depart_at=depart_at, find_alt=True, mileage=mileage, deadline=deadline)
     
     if "error" in route_data:
-        return jsonify(route_data), 400
+        return route_data, 400
 
     primary = route_data.get("primary")
     alternative = route_data.get("alternative")
@@ -217,10 +632,24 @@ def smart_plan():
     hour_12 = best_hour % 12
     if hour_12 == 0:
         hour_12 = 12
-    time_str = f"{hour_12}:00 {period}"
+    time_str = f"{hour_12}:{best_minute:02d} {period}"
 
-    return jsonify({
+    prices = fuel_service.get_fuel_prices()
+    fuel_type = vehicle['fuel_type'] if vehicle else 'petrol'
+    trip_logger.log(
+        user_id,
+        start_location=origin,
+        end_location=destination,
+        distance_km=primary.get('distance_km'),
+        fuel_cost=round(primary.get('fuel_litres', 0) * prices.get(fuel_type, prices['petrol']), 2),
+        fuel_litres=primary.get('fuel_litres'),
+        vehicle_id=vehicle['id'] if vehicle else None,
+        source='smart_plan'
+    )
+
+    return {
         "best_hour": best_hour,
+        "best_minute": best_minute,
         "avg_speed": avg_speed,
         "traffic_level": primary.get("traffic_level", "Low"),
         "reason": primary.get("reason", "No specific issues detected."),
@@ -231,7 +660,219 @@ def smart_plan():
         "alternative": alternative,
         "date_insights": route_data.get("date_insights"),
         "message": f"Based on real traffic data, the best time to leave is around {time_str}. Estimated average speed: {avg_speed} km/h."
-    })
+    }, 200
+
+@app.route('/api/arrive_by', methods=['POST'])
+def arrive_by():
+    """Latest departure that still arrives by a given time, with a safety margin."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json
+    origin = data.get('origin')
+    destination = data.get('destination')
+    if not origin or not destination:
+        return jsonify({'error': 'Missing origin or destination'}), 400
+    try:
+        arrive_by_time = datetime.strptime(data.get('arrive_by') or '', '%H:%M').strftime('%H:%M')
+        margin = int(data.get('margin_minutes', app.config.get('ARRIVE_BY_MARGIN_MINUTES', 10)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid arrive_by (expected HH:MM) or margin_minutes'}), 400
+
+    def compute():
+        result = tomtom_service.find_latest_departure(
+            origin, destination, arrive_by_time, target_date=data.get('date'),
+            margin_minutes=max(0, min(margin, 180)),
+            resolution_minutes=app.config.get('ARRIVE_BY_RESOLUTION_MINUTES', 5),
+            method=data.get('method') or app.config.get('ARRIVE_BY_METHOD', 'arrive_at'),
+            max_probes=app.config.get('ARRIVE_BY_MAX_PROBES', 12),
+            deadline=_deadline()
+        )
+        if 'error' in result:
+            return result, 400
+        return result, 200
+
+    params = {
+        'origin': origin,
+        'destination': destination,
+        'date': data.get('date'),
+        'arrive_by': arrive_by_time,
+        'margin_minutes': margin,
+        'method': data.get('method')
+    }
+    return _memoized_json('arrive_by', params, compute, app.config.get('ROUTE_RESPONSE_TTL', 60), admission_class='sweep')
+
+@app.route('/api/estimate', methods=['POST'])
+def estimate():
+    """
+    Instant approximate distance, duration and fuel cost, without a routing call.
+    Takes origin/destination (and optional vehicle_id), or a list of stops for a
+    distance/duration matrix. The exact figures come from /api/route.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json
+    deadline = _deadline()
+
+    stops = data.get('stops') or []
+    if not isinstance(stops, list) or not all(isinstance(s, str) for s in stops):
+        return jsonify({'error': 'stops must be a list of place names'}), 400
+    stops = [s.strip() for s in stops if s.strip()]
+    if stops:
+        if len(stops) > app.config.get('ITINERARY_MAX_STOPS', 12) * 4:
+            return jsonify({'error': 'Too many stops'}), 400
+        result = tomtom_service.estimate_matrix(stops, deadline=deadline)
+        return jsonify(result), 400 if 'error' in result else 200
+
+    origin = data.get('origin')
+    destination = data.get('destination')
+    if not origin or not destination:
+        return jsonify({'error': 'Missing origin or destination'}), 400
+    if not isinstance(origin, str) or not isinstance(destination, str):
+        return jsonify({'error': 'origin and destination must be place names'}), 400
+
+    vehicle = vehicle_cache.get(session['user_id'], data['vehicle_id']) if data.get('vehicle_id') else None
+    mileage = vehicle['mileage'] if vehicle else 15.0 # Default fallback
+    result = tomtom_service.estimate_route(origin, destination, mileage=mileage, deadline=deadline)
+    if 'error' in result:
+        return jsonify(result), 400
+
+    prices = fuel_service.get_fuel_prices()
+    price_per_unit = prices.get(vehicle['fuel_type'] if vehicle else 'petrol', prices['petrol'])
+    result['price_per_unit'] = price_per_unit
+    result['cost'] = round(result['fuel_litres'] * price_per_unit, 2)
+    return jsonify(result)
+
+@app.route('/api/itinerary', methods=['POST'])
+def itinerary():
+    """Best visiting order, legs and fuel for a day with several stops."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json
+    stops = data.get('stops') or []
+    if not isinstance(stops, list) or not all(isinstance(s, str) for s in stops):
+        return jsonify({'error': 'stops must be a list of place names'}), 400
+    stops = [s.strip() for s in stops if s.strip()]
+    max_stops = app.config.get('ITINERARY_MAX_STOPS', 12)
+    if len(stops) < 2:
+        return jsonify({'error': 'Please enter at least two stops'}), 400
+    if len(stops) > max_stops:
+        return jsonify({'error': f'Too many stops (max {max_stops})'}), 400
+
+    try:
+        hour, minute = (int(x) for x in str(data.get('start_time', '09:00')).split(':')[:2])
+    except ValueError:
+        return jsonify({'error': 'Invalid start time'}), 400
+    depart_time = tomtom_service._departure_datetime(data.get('date'), hour, minute)
+
+    vehicle_id = data.get('vehicle_id')
+    mileage = 15.0 # Default fallback
+    if vehicle_id:
+        vehicle = vehicle_cache.get(session['user_id'], vehicle_id)
+        if vehicle:
+            mileage = vehicle['mileage']
+
+    def run():
+        result = tomtom_service.plan_itinerary(
+            stops,
+            depart_time,
+            mileage=mileage,
+            return_to_start=bool(data.get('return_to_start')),
+            keep_last=bool(data.get('keep_last')),
+            dwell_minutes=int(data.get('dwell_minutes', 0)),
+            deadline=_deadline()
+        )
+        if 'error' in result:
+            return jsonify(result), 400
+        return jsonify(result)
+    return _admitted('sweep', run)
+
+BATCH_PLAN_COLUMNS = [
+    'origin', 'destination', 'date', 'start_hour', 'end_hour', 'best_hour', 'best_time',
+    'avg_speed', 'distance_km', 'duration_formatted', 'fuel_litres', 'traffic_level', 'laps_risk', 'error'
+]
+
+def _parse_batch_rows():
+    """Corridor rows from a CSV upload ('file') or a JSON body {"rows": [...]}."""
+    upload = request.files.get('file')
+    if upload:
+        return list(csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig')))
+    return (request.json or {}).get('rows', [])
+
+@app.route('/api/batch_plan', methods=['POST'])
+def batch_plan():
+    """
+    Best departure time for many corridors in one request.
+    Rows need origin, destination and either start_hour/end_hour or a window like "8-12";
+    date and vehicle_id are optional. Returns a CSV download, or JSON with ?format=json.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        raw_rows = _parse_batch_rows()
+    except UnicodeDecodeError as e:
+        return jsonify({'error': f'Invalid file: {e}'}), 400
+    max_rows = app.config.get('BATCH_PLAN_MAX_ROWS', 200)
+    if not raw_rows:
+        return jsonify({'error': 'No rows provided'}), 400
+    if len(raw_rows) > max_rows:
+        return jsonify({'error': f'Too many rows (max {max_rows})'}), 400
+
+    rows = []
+    for i, r in enumerate(raw_rows, start=1):
+        try:
+            if r.get('window'):
+                start_hour, end_hour = (int(h) for h in str(r['window']).split('-'))
+            else:
+                start_hour, end_hour = int(r.get('start_hour', 8)), int(r.get('end_hour', 18))
+        except (TypeError, ValueError):
+            return jsonify({'error': f'Row {i}: invalid time window'}), 400
+        if not (0 <= start_hour <= 23 and 0 <= end_hour <= 23):
+            return jsonify({'error': f'Row {i}: hours must be between 0 and 23'}), 400
+
+        mileage = 15.0 # Default fallback
+        if r.get('vehicle_id'):
+            vehicle = vehicle_cache.get(session['user_id'], r['vehicle_id'])
+            if vehicle:
+                mileage = vehicle['mileage']
+        rows.append({
+            'origin': r.get('origin'),
+            'destination': r.get('destination'),
+            'date': r.get('date') or None,
+            'start_hour': start_hour,
+            'end_hour': end_hour,
+            'mileage': mileage
+        })
+
+    def run():
+        if request.args.get('async'):
+            return jsonify(job_manager.submit(session['user_id'], 'batch_plan', rows, _run_batch_plan)), 202
+        results, _ = _run_batch_plan(session['user_id'], rows, deadline=_deadline())
+        if request.args.get('format') == 'json':
+            return Response(stream_json_array(results, app.json.dumps), mimetype='application/json')
+        return _batch_plan_csv(results)
+    return _admitted('sweep', run)
+
+def _run_batch_plan(user_id, rows, progress=None, deadline=None):
+    results = tomtom_service.plan_batch(
+        rows, max_workers=app.config.get('BATCH_PLAN_WORKERS', 16), progress=progress, deadline=deadline
+    )
+    for r in results:
+        if 'best_hour' in r:
+            period = "AM" if r['best_hour'] < 12 else "PM"
+            r['best_time'] = f"{r['best_hour'] % 12 or 12}:00 {period}"
+    return results, 200
+
+def _batch_plan_csv(results):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=BATCH_PLAN_COLUMNS, extrasaction='ignore', lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(results)
+    return Response(
+        out.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=batch_plan.csv'}
+    )
 
 @app.route('/api/route', methods=['POST'])
 def route():
@@ -242,12 +883,25 @@ def route():
     if not origin or not destination:
         return jsonify({'error': 'Missing origin or destination'}), 400
         
-    result = tomtom_service.get_route(origin, destination)
-    if "error" in result:
-        return jsonify(result), 400
-        
-    # Return primary route for the regular routing check
-    return jsonify(result.get("primary"))
+    deadline = _deadline()
+
+    def compute():
+        result = tomtom_service.get_route(origin, destination, deadline=deadline)
+        if "error" in result:
+            return result, 400
+        # Return primary route for the regular routing check, with the resolved endpoints
+        return dict(result.get("primary"), corridor=result.get("corridor")), 200
+
+    response = _memoized_json('route', {'origin': origin, 'destination': destination}, compute, app.config.get('ROUTE_RESPONSE_TTL', 60))
+    if isinstance(response, tuple):
+        return response
+
+    # Start live monitoring for the corridor a signed-in user just checked
+    if app.config.get('MONITOR_ENABLED') and 'user_id' in session and response.status_code == 200:
+        corridor = response.get_json().get('corridor')
+        if corridor:
+            session['monitor_corridor'] = traffic_monitor.watch(corridor['origin'], corridor['destination'])
+    return response
 
 @app.route('/api/traffic', methods=['POST'])
 def traffic():
@@ -275,50 +929,140 @@ def weather():
     if not destination:
         return jsonify({'error': 'Missing destination'}), 400
 
-    # Geocode destination to get lat/lon
-    coords = tomtom_service._geocode(destination)
-    if not coords:
-        return jsonify({'error': f'Could not find location: {destination}'}), 400
+    def compute():
+        deadline = _deadline()
+        # Geocode destination to get lat/lon
+        coords = tomtom_service._geocode(destination, deadline=deadline)
+        if not coords:
+            return {'error': f'Could not find location: {destination}'}, 400
 
-    result = weather_service.get_forecast(coords['lat'], coords['lon'], start_hour, end_hour, target_date=target_date)
-    if 'error' in result:
-        return jsonify(result), 400
+        result = weather_service.get_forecast(coords['lat'], coords['lon'], start_hour, end_hour, target_date=target_date, deadline=deadline)
+        if 'error' in result:
+            return result, 400
+        result['image_url'] = asset_manifest.url(f"images/{result['image']}")
 
-    return jsonify(result)
+        # Optional: conditions along the route at the time each stretch is driven
+        if data.get('along_route') and origin:
+            depart_time = tomtom_service._departure_datetime(target_date, start_hour)
+            route_data = tomtom_service.get_route(
+                origin, destination, depart_at=depart_time.strftime("%Y-%m-%dT%H:%M:%S"), deadline=deadline
+            )
+            if 'error' in route_data:
+                result['along_route'] = route_data
+            else:
+                legs = route_data['raw']['routes'][0].get('legs', [])
+                points = [p for leg in legs for p in leg.get('points', [])]
+                result['along_route'] = weather_service.get_route_weather(
+                    points, depart_time, route_data['primary']['duration_sec'], deadline=deadline
+                )
+        return result, 200
+
+    params = {
+        'origin': origin if data.get('along_route') else None,
+        'destination': destination,
+        'start_hour': start_hour,
+        'end_hour': end_hour,
+        'date': target_date,
+        'along_route': bool(data.get('along_route'))
+    }
+    return _memoized_json('weather', params, compute, app.config.get('WEATHER_RESPONSE_TTL', 600), admission_class='weather')
 
 @app.route('/api/laps', methods=['POST'])
 def laps():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
+    user_id = session['user_id']
+    if data.get('async'):
+        return _admitted('sweep', lambda: (jsonify(job_manager.submit(user_id, 'laps', data, _run_laps)), 202))
+    params = dict(data, mileage=_vehicle_mileage(user_id, data.get('vehicle_id')))
+    return _memoized_json(
+        'laps', params, lambda: _run_laps(user_id, data, deadline=_deadline()),
+        app.config.get('LAPS_RESPONSE_TTL', 300), admission_class='sweep'
+    )
+
+def _run_laps(user_id, data, progress=None, deadline=None):
     origin = data.get('origin')
     destination = data.get('destination')
     start_hour = int(data.get('start_hour', 8))
     end_hour = int(data.get('end_hour', 18))
     target_date = data.get('date')
+    arrive_by = data.get('arrive_by') or None  # optional "HH:MM": on-time probability per hour
 
     if not origin or not destination:
-        return jsonify({'error': 'Missing origin or destination'}), 400
+        return {'error': 'Missing origin or destination'}, 400
+    if arrive_by:
+        try:
+            arrive_by = datetime.strptime(arrive_by, '%H:%M').strftime('%H:%M')
+        except (TypeError, ValueError):
+            return {'error': 'Invalid arrive_by, expected HH:MM'}, 400
 
     # Fetch vehicle mileage if vehicle_id is provided
     vehicle_id = data.get('vehicle_id')
     mileage = 15.0 # Default fallback
     if vehicle_id:
-        vehicle = Vehicle.query.get(vehicle_id)
+        vehicle = vehicle_cache.get(user_id, vehicle_id)
         if vehicle:
-            mileage = vehicle.mileage
+            mileage = vehicle['mileage']
 
-    result = tomtom_service.calculate_laps(origin, destination, start_hour, end_hour, target_date=target_date, mileage=mileage)
+    result = tomtom_service.calculate_laps(origin, destination, start_hour, end_hour, target_date=target_date, mileage=mileage, progress=progress, deadline=deadline, arrive_by=arrive_by)
     if isinstance(result, dict) and 'error' in result:
-        return jsonify(result), 400
+        return result, 400
     
-    return jsonify(result)
+    return result, 200
 
 @app.route('/api/monitor', methods=['GET'])
 def monitor():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
-    return jsonify(tomtom_service.get_monitor_data())
+    return jsonify(traffic_monitor.get_state(session.get('monitor_corridor')))
+
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """City suggestions for a typed prefix, from the bundled gazetteer (no upstream call)."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    return jsonify(tomtom_service.gazetteer.complete(request.args.get('q', ''), limit=limit))
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Response size, compression and admission counters since startup, and the delay predictor."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({
+        'json_encoder': app.json.name,
+        'compression': compressor.snapshot(),
+        'admission': admission.snapshot(),
+        'predictor': delay_predictor.snapshot()
+    })
+
+@app.route('/api/trips', methods=['GET'])
+def trips():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    before_id = request.args.get('before_id', type=int)
+    return jsonify(get_trip_history(session['user_id'], limit=limit, before_id=before_id))
+
+@app.route('/api/trips/summary', methods=['GET'])
+def trips_summary():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    months = max(1, min(request.args.get('months', 12, type=int), 120))
+    return jsonify(get_monthly_summary(session['user_id'], months=months))
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a background job; finished batch_plan jobs can be downloaded with ?format=csv."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    job = job_manager.get(job_id, session['user_id'])
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if request.args.get('format') == 'csv' and job['kind'] == 'batch_plan' and job['status'] == 'done':
+        return _batch_plan_csv(job['result'])
+    return jsonify(job)
 
 @app.route('/logout')
 def logout():
@@ -327,4 +1071,7 @@ def logout():
 
 
 if __name__ == '__main__':
+    # Under the reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(debug=True)
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+MIN_COMPRESS_BYTES = 512
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def build_assets(static_dir, out_dir):
+    """
+    Copy static files into out_dir under content-hashed names (style.3f9a1c2b7e.css),
+    write .gz/.br variants for text assets and a manifest of logical -> hashed paths.
+    Returns the manifest. Raises ValueError if out_dir overlaps static_dir or already
+    holds files that are not from a previous build.
+    """
+    static_dir, out_dir = os.path.realpath(static_dir), os.path.realpath(out_dir)
+    if os.path.commonpath([static_dir, out_dir]) in (static_dir, out_dir):
+        raise ValueError(f"Asset output directory {out_dir} overlaps the static directory {static_dir}")
+    _remove_previous_build(out_dir)
+    manifest = {}
+    for root, _, files in os.walk(static_dir):
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            logical = os.path.relpath(src, static_dir).replace(os.sep, "/")
+            with open(src, "rb") as f:
+                data = f.read()
+
+            stem, ext = os.path.splitext(logical)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+            dest = os.path.join(out_dir, hashed)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(dest, "wb") as f:
+                f.write(data)
+
+            # Images are already compressed; only text assets get variants
+            if ext.lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+                with open(dest + ".gz", "wb") as f:
+                    f.write(gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli:
+                    with open(dest + ".br", "wb") as f:
+                        f.write(brotli.compress(data, quality=11))
+            manifest[logical] = hashed
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _remove_previous_build(out_dir):
+    """Delete the files a previous build_assets() wrote to out_dir, and nothing else."""
+    if not os.path.isdir(out_dir) or not os.listdir(out_dir):
+        return
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        raise ValueError(f"{out_dir} is not empty and has no {MANIFEST} from a previous build; refusing to clear it")
+
+    for hashed in previous.values():
+        path = os.path.realpath(os.path.join(out_dir, hashed))
+        if os.path.commonpath([out_dir, path]) != out_dir:
+            continue  # never follow a manifest entry outside the build directory
+        for variant in (path, path + ".gz", path + ".br"):
+            if os.path.isfile(variant):
+                os.remove(variant)
+    os.remove(manifest_path)
+    # Drop the subdirectories the build created once they are empty
+    for root, dirs, files in os.walk(out_dir, topdown=False):
+        if root != out_dir and not os.listdir(root):
+            os.rmdir(root)
+
+
+class AssetManifest:
+    """
+    Fingerprinted static assets for templates and the /assets route.
+    Falls back to Flask's plain static files when no build is present, so
+    development works without running the build step.
+    """
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.manifest = {}
+        self.reload()
+
+    def reload(self):
+        try:
+            with open(os.path.join(self.out_dir, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def url(self, filename):
+        hashed = self.manifest.get(filename)
+        if hashed:
+            return url_for("static_assets", filename=hashed)
+        return url_for("static", filename=filename)
+
+    def serve(self, filename):
+        """Send a hashed asset, precompressed when the client accepts it."""
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        accepted = request.accept_encodings
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accepted[candidate] and os.path.isfile(os.path.join(self.out_dir, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+
+        response = send_from_directory(self.out_dir, filename, mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
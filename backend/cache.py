@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with per-entry expiry.
+    Used for data that is read far more often than it changes (vehicles, lookups).
+    """
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None, allow_stale=False):
+        """
+        Return a fresh entry, or default. Expired entries are kept until evicted
+        so that allow_stale=True can still serve them when the source is unavailable.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic() and not allow_stale:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            # Evict least recently used entries once over capacity
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    """
+    Rendered JSON responses keyed by a normalized request.
+    Each entry carries a strong ETag derived from the body, so identical results
+    keep the same ETag even after they are recomputed.
+    """
+    def __init__(self, max_entries=2000):
+        self._cache = TTLCache(max_entries=max_entries)
+
+    @staticmethod
+    def make_key(endpoint, params):
+        raw = json.dumps([endpoint, params], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, body, ttl):
+        if isinstance(body, str):
+            body = body.encode()
+        entry = {
+            "body": body,
+            "etag": hashlib.sha256(body).hexdigest()[:32],
+            "expires_at": time.time() + ttl
+        }
+        self._cache.set(key, entry, ttl=ttl)
+        return entry
@@ -8,5 +8,126 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite gets a longer lock wait (WAL and other pragmas are set in models.py);
+    # server databases get a sized connection pool that drops dead connections.
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 15}}
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_recycle': 1800,
+            'pool_pre_ping': True
+        }
+
+    # Seconds a user's vehicle list is served from memory before re-reading the DB; adds and
+    # deletes bump a version stamp in the DB, so every worker reloads straight away
+    VEHICLE_CACHE_TTL = int(os.environ.get('VEHICLE_CACHE_TTL', 600))
+
     FUEL_API_KEY = os.environ.get('FUEL_API_KEY') or 'PLACEHOLDER_FUEL_KEY'
     TOMTOM_API_KEY = os.environ.get('TOMTOM_API_KEY') or 'PLACEHOLDER_TOMTOM_KEY'
+
+    # Trip history is written behind the request in batches
+    TRIP_LOG_BATCH_SIZE = int(os.environ.get('TRIP_LOG_BATCH_SIZE', 200))
+    TRIP_LOG_FLUSH_SECONDS = float(os.environ.get('TRIP_LOG_FLUSH_SECONDS', 2.0))
+
+    # Upper bound on vehicles x trips for a single /api/fleet_cost request
+    FLEET_MAX_PAIRS = int(os.environ.get('FLEET_MAX_PAIRS', 2000000))
+
+    # Multi-stop planning builds an n x n travel-time matrix, so keep n small
+    ITINERARY_MAX_STOPS = int(os.environ.get('ITINERARY_MAX_STOPS', 12))
+
+    # Max TomTom calls in flight at once across all requests and batch workers
+    UPSTREAM_CONCURRENCY = int(os.environ.get('UPSTREAM_CONCURRENCY', 8))
+    BATCH_PLAN_MAX_ROWS = int(os.environ.get('BATCH_PLAN_MAX_ROWS', 200))
+    BATCH_PLAN_WORKERS = int(os.environ.get('BATCH_PLAN_WORKERS', 16))
+
+    # Background jobs (async smart_plan / laps / batch_plan)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 86400))  # how long results stay pollable
+    JOB_REUSE_SECONDS = int(os.environ.get('JOB_REUSE_SECONDS', 300))  # identical submissions share a result
+    # Owners refresh running jobs this often; jobs silent for 3 intervals count as interrupted
+    JOB_HEARTBEAT_SECONDS = int(os.environ.get('JOB_HEARTBEAT_SECONDS', 30))
+
+    # Daily off-peak cache warming for the most requested corridors. Runs only in the
+    # process that calls start_background_services() (`flask --app app run-background`)
+    PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', 'false').lower() == 'true'
+    PREWARM_RUN_AT_HOUR = int(os.environ.get('PREWARM_RUN_AT_HOUR', 3))
+    PREWARM_DAYS = int(os.environ.get('PREWARM_DAYS', 2))
+    PREWARM_TOP_CORRIDORS = int(os.environ.get('PREWARM_TOP_CORRIDORS', 20))
+    PREWARM_START_HOUR = int(os.environ.get('PREWARM_START_HOUR', 6))
+    PREWARM_END_HOUR = int(os.environ.get('PREWARM_END_HOUR', 22))
+    # Held by the one process per host that runs the prewarm and predictor retraining
+    BACKGROUND_LOCK_PATH = os.environ.get(
+        'BACKGROUND_LOCK_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'background.lock')
+    )
+
+    # Departure search for /api/smart_plan: 'hourly' checks every hour,
+    # 'adaptive' samples coarsely then refines to 15 minutes within a call budget
+    DEPARTURE_SEARCH_MODE = os.environ.get('DEPARTURE_SEARCH_MODE', 'hourly')
+    DEPARTURE_SEARCH_BUDGET = int(os.environ.get('DEPARTURE_SEARCH_BUDGET', 12))
+
+    # Live monitor (opt-in, 3 flow calls per corridor): corridors are sampled every MONITOR_INTERVAL seconds.
+    # MONITOR_CORRIDORS pins extra corridors, e.g. "28.61,77.20>28.45,77.02;19.07,72.87>18.52,73.85"
+    MONITOR_ENABLED = os.environ.get('MONITOR_ENABLED', 'false').lower() == 'true'
+    MONITOR_INTERVAL = int(os.environ.get('MONITOR_INTERVAL', 60))
+    MONITOR_CORRIDORS = [
+        tuple(pair.split('>', 1)) for pair in os.environ.get('MONITOR_CORRIDORS', '').split(';') if '>' in pair
+    ]
+
+    # Upstream resilience: per-request time budget for synchronous endpoints, and
+    # circuit breakers that fail fast (serving stale cache) after repeated upstream errors
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 20))
+    BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+    BREAKER_RESET_SECONDS = int(os.environ.get('BREAKER_RESET_SECONDS', 30))
+
+    # Memoized JSON responses (with ETag / 304) for repeated route, weather and LAPS queries
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+    ROUTE_RESPONSE_TTL = int(os.environ.get('ROUTE_RESPONSE_TTL', 60))
+    WEATHER_RESPONSE_TTL = int(os.environ.get('WEATHER_RESPONSE_TTL', 600))
+    LAPS_RESPONSE_TTL = int(os.environ.get('LAPS_RESPONSE_TTL', 300))
+
+    # Fingerprinted, precompressed static assets (built with `flask --app app build-assets`)
+    ASSETS_DIR = os.environ.get(
+        'ASSETS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist')
+    )
+
+    # gzip/brotli for /api/* responses of at least COMPRESS_MIN_BYTES (streamed ones always)
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+    # Admission control for expensive endpoints: per-user in-flight and rate limits, plus a
+    # global in-flight cap per class ('sweep' = smart_plan/laps/arrive_by/itinerary/batch_plan,
+    # 'weather'). Only requests that compute are admitted; cached answers and 304s are free.
+    # Requests over a limit get an immediate 429 (this user) or 503 (server busy) with Retry-After.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_USER_CONCURRENCY = int(os.environ.get('ADMISSION_USER_CONCURRENCY', 2))
+    ADMISSION_SWEEP_RATE_PER_MINUTE = int(os.environ.get('ADMISSION_SWEEP_RATE_PER_MINUTE', 10))
+    # One dashboard plan spends up to 3 sweep tokens (smart_plan, arrive_by, laps); the
+    # default burst covers three plans in a row before the per-minute rate applies
+    ADMISSION_SWEEP_BURST = int(os.environ.get('ADMISSION_SWEEP_BURST', 9))
+    ADMISSION_SWEEP_GLOBAL_CONCURRENCY = int(os.environ.get('ADMISSION_SWEEP_GLOBAL_CONCURRENCY', 8))
+    ADMISSION_WEATHER_RATE_PER_MINUTE = int(os.environ.get('ADMISSION_WEATHER_RATE_PER_MINUTE', 30))
+    ADMISSION_WEATHER_GLOBAL_CONCURRENCY = int(os.environ.get('ADMISSION_WEATHER_GLOBAL_CONCURRENCY', 16))
+
+    # Delay predictor for departures more than PREDICTION_HORIZON_DAYS ahead (no live calls).
+    # Trained from traffic_data.csv and logged route summaries, saved to PREDICTOR_MODEL_PATH
+    # and retrained after each nightly prewarm (or with `flask --app app train-predictor`).
+    # Web workers load the saved model lazily and reload it when it is retrained
+    PREDICTOR_ENABLED = os.environ.get('PREDICTOR_ENABLED', 'true').lower() == 'true'
+    PREDICTOR_MODEL_PATH = os.environ.get(
+        'PREDICTOR_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'delay_model.joblib')
+    )
+    PREDICTION_HORIZON_DAYS = int(os.environ.get('PREDICTION_HORIZON_DAYS', 3))
+    PREDICTOR_HISTORY_DAYS = int(os.environ.get('PREDICTOR_HISTORY_DAYS', 180))
+
+    # Arrive-by planning (/api/arrive_by): 'arrive_at' routes backwards from the arrival in
+    # one call, 'bisection' searches departAt to ARRIVE_BY_RESOLUTION_MINUTES (also the fallback)
+    ARRIVE_BY_METHOD = os.environ.get('ARRIVE_BY_METHOD', 'arrive_at')
+    ARRIVE_BY_MARGIN_MINUTES = int(os.environ.get('ARRIVE_BY_MARGIN_MINUTES', 10))
+    ARRIVE_BY_RESOLUTION_MINUTES = int(os.environ.get('ARRIVE_BY_RESOLUTION_MINUTES', 5))
+    ARRIVE_BY_MAX_PROBES = int(os.environ.get('ARRIVE_BY_MAX_PROBES', 12))
+
+    # Stream LAPS sweep responses and keep route points as compact arrays instead of dicts
+    ROUTE_LEAN_PARSING = os.environ.get('ROUTE_LEAN_PARSING', 'true').lower() == 'true'
@@ -0,0 +1,141 @@
+import numpy as np
+
+from estimator import haversine_km
+
+# Delay ratio (travel time / no-traffic time) boundaries between the levels
+LEVEL_THRESHOLDS = np.array([1.15, 1.4, 1.8])
+LEVELS = np.array(["Low", "Moderate", "Heavy", "Critical"])
+LEVEL_REASONS = {
+    "Low": "Traffic is flowing smoothly with minimal delays.",
+    "Moderate": "Moderate traffic detected, possibly due to regular urban flow or minor bottlenecks.",
+    "Heavy": "Heavy congestion detected. High volume of vehicles expected.",
+    "Critical": "Critical delays detected. Major road incidents or severe gridlock possible."
+}
+MIN_SECTION_DELAY = 30  # seconds; sections not tagged TRAFFIC still count above this
+
+
+def classify(delay_ratios):
+    """Congestion level for each delay ratio (array in, array of level names out)."""
+    return LEVELS[np.digitize(np.asarray(delay_ratios, dtype=float), LEVEL_THRESHOLDS)]
+
+
+def congestion_level(delay_ratio):
+    """Congestion level for a single delay ratio."""
+    return str(classify([delay_ratio])[0])
+
+
+def laps_risk(delay_ratios):
+    """Late arrival risk (%) per delay ratio: 1.0 -> 0%, 1.5 -> 75%, 1.67+ -> 100%."""
+    risk = np.clip(np.round((np.asarray(delay_ratios, dtype=float) - 1) * 100 * 1.5), 0, 100).astype(int)
+    return int(risk) if risk.ndim == 0 else risk
+
+
+def arrival_distribution(depart_sec, travel_sec, free_sec, spread, arrive_by_sec, samples=4000, seed=0):
+    """
+    Monte Carlo arrival times for many departures in one pass.
+    Each departure's travel time is lognormal around travel_sec with log-space standard
+    deviation spread, and never faster than free flow. Times are seconds from midnight
+    of the travel date. Returns (on-time probability, P50 arrival, P90 arrival) arrays.
+    A fixed seed keeps repeated answers identical.
+    """
+    depart_sec, travel_sec, free_sec, spread = (np.asarray(x, dtype=float)[:, None]
+                                                for x in (depart_sec, travel_sec, free_sec, spread))
+    noise = np.random.default_rng(seed).standard_normal((len(travel_sec), samples))
+    arrival = depart_sec + np.maximum(travel_sec * np.exp(noise * spread), free_sec)
+    on_time = (arrival <= arrive_by_sec).mean(axis=1)
+    p50, p90 = np.percentile(arrival, [50, 90], axis=1)
+    return on_time, p50, p90
+
+
+def route_coords(route):
+    """(lat, lon) arrays of a route's points, from point dicts or the compact "points_array" of a lean parse."""
+    lat, lon = [], []
+    for leg in route.get("legs", []):
+        if "points_array" in leg:
+            lat.append(leg["points_array"][:, 0])
+            lon.append(leg["points_array"][:, 1])
+        else:
+            points = leg.get("points", [])
+            lat.append(np.array([p["latitude"] for p in points], dtype=float))
+            lon.append(np.array([p["longitude"] for p in points], dtype=float))
+    if not lat:
+        return np.array([]), np.array([])
+    return np.concatenate(lat), np.concatenate(lon)
+
+
+def analyze_sections(routes):
+    """
+    Every congested section of one or more routes (e.g. all hours of a sweep) as arrays.
+    Returns a dict of equal-length arrays: route (index into routes), start/end point
+    index, from_km/to_km, length_km, delay (s), delay_ratio, level, and mid point lat/lon.
+    A section's delay ratio uses its route's free-flow average speed for the base time.
+    """
+    cols = {k: [] for k in ("route", "start", "end", "from_km", "to_km", "delay", "lat", "lon", "free_kmh")}
+    for r, route in enumerate(routes):
+        sections = [s for s in route.get("sections", [])
+                    if (s.get("sectionType") == "TRAFFIC" or s.get("delayInSeconds", 0) > MIN_SECTION_DELAY)
+                    and s.get("startPointIndex") is not None and s.get("endPointIndex") is not None]
+        if not sections:
+            continue
+        lat, lon = route_coords(route)
+        if not len(lat):
+            continue
+        cum_km = np.concatenate([[0.0], np.cumsum(haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+
+        start = np.clip([s["startPointIndex"] for s in sections], 0, len(lat) - 1)
+        end = np.clip([s["endPointIndex"] for s in sections], 0, len(lat) - 1)
+        mid = (start + end) // 2
+        summary = route.get("summary", {})
+        free_time = summary.get("noTrafficTravelTimeInSeconds", 0)
+        free_kmh = summary.get("lengthInMeters", 0) / 1000 / (free_time / 3600) if free_time > 0 else 50.0
+
+        cols["route"].append(np.full(len(sections), r))
+        cols["start"].append(start)
+        cols["end"].append(end)
+        cols["from_km"].append(cum_km[start])
+        cols["to_km"].append(cum_km[end])
+        cols["delay"].append(np.array([s.get("delayInSeconds", 0) for s in sections], dtype=float))
+        cols["lat"].append(lat[mid])
+        cols["lon"].append(lon[mid])
+        cols["free_kmh"].append(np.full(len(sections), free_kmh))
+
+    if not cols["route"]:
+        empty = {k: np.array([]) for k in cols}
+        empty.update(length_km=np.array([]), delay_ratio=np.array([]), level=np.array([], dtype=LEVELS.dtype))
+        return empty
+
+    out = {k: np.concatenate(v) for k, v in cols.items()}
+    out["length_km"] = out["to_km"] - out["from_km"]
+    base_sec = np.maximum(out["length_km"] / np.maximum(out["free_kmh"], 1) * 3600, 1)
+    out["delay_ratio"] = 1 + out["delay"] / base_sec
+    out["level"] = classify(out["delay_ratio"])
+    return out
+
+
+def top_sections(sections, k, per_route=None):
+    """Indices of the k sections with the largest delay (optionally at most per_route from each route)."""
+    order = np.argsort(-sections["delay"], kind="stable")
+    if per_route is None:
+        return order[:k]
+    picked, counts = [], {}
+    for i in order:
+        r = int(sections["route"][i])
+        if counts.get(r, 0) < per_route:
+            counts[r] = counts.get(r, 0) + 1
+            picked.append(i)
+            if len(picked) == k:
+                break
+    return np.array(picked, dtype=int)
+
+
+def congestion_profile(sections, route_index=0):
+    """Congested stretches of one route in driving order, for the UI."""
+    mask = sections["route"] == route_index
+    order = np.argsort(sections["from_km"][mask], kind="stable")
+    return [{
+        "from_km": round(float(f), 1),
+        "to_km": round(float(t), 1),
+        "delay_sec": int(d),
+        "level": str(lv)
+    } for f, t, d, lv in zip(sections["from_km"][mask][order], sections["to_km"][mask][order],
+                             sections["delay"][mask][order], sections["level"][mask][order])]
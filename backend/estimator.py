@@ -0,0 +1,94 @@
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments broadcast like numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class RouteEstimator:
+    """
+    Instant approximate road distance and duration between coordinates.
+    Road distance is straight-line distance times a circuity factor, and duration is
+    road distance over a typical speed. Both are learned per region (a grid cell
+    around the trip midpoint) from real routing results, with national figures
+    used until a region has min_samples observations of its own.
+    """
+    def __init__(self, circuity=1.3, speed_kmh=45.0, cell_deg=1.0, min_samples=3, alpha=0.1):
+        self.cell_deg = cell_deg
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self._stats = {None: {"n": 0, "circuity": circuity, "speed_n": 0, "speed": speed_kmh}}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return int(np.floor(lat / self.cell_deg)), int(np.floor(lon / self.cell_deg))
+
+    def observe(self, start, end, distance_km, duration_sec=None):
+        """Learn from one real route between two {"lat", "lon"} points."""
+        straight = float(haversine_km(start["lat"], start["lon"], end["lat"], end["lon"]))
+        # Very short hops are dominated by the street grid; large ratios are ferries or detours
+        if straight < 2 or not distance_km or not 1 <= distance_km / straight <= 4:
+            return
+        circuity = distance_km / straight
+        speed = distance_km / (duration_sec / 3600) if duration_sec else None
+
+        cell = self._cell((start["lat"] + end["lat"]) / 2, (start["lon"] + end["lon"]) / 2)
+        with self._lock:
+            for key in (cell, None):
+                stats = self._stats.setdefault(key, {"n": 0, "circuity": circuity, "speed_n": 0, "speed": speed})
+                stats["n"] += 1
+                # Running mean at first, then an EWMA so the factors keep tracking new data
+                w = max(self.alpha, 1 / stats["n"])
+                stats["circuity"] += w * (circuity - stats["circuity"])
+                if speed:
+                    stats["speed_n"] += 1
+                    w = max(self.alpha, 1 / stats["speed_n"])
+                    stats["speed"] = speed if stats["speed"] is None else stats["speed"] + w * (speed - stats["speed"])
+
+    def factors(self, cell):
+        """(circuity, speed km/h, samples) for a region, falling back to the national figures."""
+        national = self._stats[None]
+        stats = self._stats.get(cell)
+        if not stats or stats["n"] < self.min_samples:
+            return national["circuity"], national["speed"], 0
+        speed = stats["speed"] if stats["speed_n"] >= self.min_samples else national["speed"]
+        return stats["circuity"], speed, stats["n"]
+
+    def estimate(self, start, end):
+        distances, durations, samples = self.estimate_matrix([start, end])
+        return {
+            "distance_km": round(float(distances[0, 1]), 1),
+            "duration_sec": int(durations[0, 1]),
+            "calibration_samples": int(samples[0, 1]),
+            "approximate": True
+        }
+
+    def estimate_matrix(self, coords):
+        """
+        Approximate road distance (km) and duration (s) between every pair of points.
+        Returns (distances, durations, samples) as n x n arrays.
+        """
+        lat = np.array([c["lat"] for c in coords], dtype=float)
+        lon = np.array([c["lon"] for c in coords], dtype=float)
+        straight = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+        # Look up each distinct midpoint cell once and broadcast its factors
+        cells = np.stack([
+            np.floor((lat[:, None] + lat[None, :]) / 2 / self.cell_deg),
+            np.floor((lon[:, None] + lon[None, :]) / 2 / self.cell_deg)
+        ], axis=-1).reshape(-1, 2).astype(int)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        with self._lock:
+            table = np.array([self.factors(tuple(c)) for c in unique.tolist()], dtype=float)
+        circuity, speed, samples = (table[:, k][inverse.ravel()].reshape(straight.shape) for k in range(3))
+
+        distances = straight * circuity
+        durations = distances / speed * 3600
+        return distances, durations, samples
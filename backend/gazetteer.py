@@ -0,0 +1,72 @@
+import csv
+import os
+import re
+from bisect import bisect_left
+
+
+class Gazetteer:
+    """
+    Offline lookup of Indian cities and towns from gazetteer.csv (name, aliases, state, lat, lon).
+    Names and aliases are normalized into one sorted key array, so exact lookups and
+    prefix completion are binary searches with no network call. Rows are ordered
+    roughly by population, and that order ranks completions.
+    """
+    def __init__(self, path=None):
+        path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+        self.places = []
+        entries = []
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    place = {
+                        "name": row["name"],
+                        "state": row["state"],
+                        "lat": float(row["lat"]),
+                        "lon": float(row["lon"])
+                    }
+                    idx = len(self.places)
+                    self.places.append(place)
+                    for name in [row["name"]] + [a for a in (row.get("aliases") or "").split("|") if a]:
+                        entries.append((self.normalize(name), idx))
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Gazetteer not loaded: {e}")
+
+        entries.sort()
+        self._keys = [k for k, _ in entries]
+        self._ids = [i for _, i in entries]
+        # Exact names map to the most populous place that uses them
+        self._exact = {}
+        for key, idx in entries:
+            self._exact.setdefault(key, idx)
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+    def lookup(self, query):
+        """
+        The place a query names exactly ("Pune", "Bombay", "Pune, Maharashtra", "Delhi, India"),
+        or None. Anything more specific than a city is left to the upstream geocoder.
+        """
+        if not isinstance(query, str):
+            return None
+        parts = [self.normalize(p) for p in query.split(",")]
+        parts = [p[:-len(" india")] if p.endswith(" india") else p for p in parts if p and p != "india"]
+        if not parts:
+            return None
+        idx = self._exact.get(parts[0])
+        if idx is None:
+            return None
+        place = self.places[idx]
+        if any(p != self.normalize(place["state"]) for p in parts[1:]):
+            return None
+        return place
+
+    def complete(self, prefix, limit=8):
+        """Places whose name or alias starts with prefix, most populous first."""
+        key = self.normalize(prefix)
+        if not key:
+            return []
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + "\uffff", lo)
+        return [self.places[i] for i in sorted(set(self._ids[lo:hi]))[:limit]]
@@ -0,0 +1,260 @@
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+
+from models import db, RouteSample, Trip, Vehicle
+
+
+class WriteBehindLogger:
+    """
+    Write-behind logger for one table.
+    Callers enqueue rows and return immediately; a background thread
+    bulk-inserts them in batches so no request waits on a commit.
+    The thread starts with the first row logged in each process, so a logger built
+    before a server forks its workers still writes from every worker.
+    """
+    model = None
+
+    def __init__(self, app, batch_size=200, flush_interval=2.0, max_queue=10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _start(self):
+        """Start the flush thread in this process (threads do not survive a fork)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.model.__tablename__.replace('_', '-')}-logger", daemon=True
+            )
+            self._thread.start()
+
+    def _enqueue(self, row):
+        """Never blocks; rows are dropped if the queue is full."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def _drain(self, timeout=None):
+        """Wait for the first row, then take whatever else is queued up to batch_size."""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(self.model), batch)
+                db.session.commit()
+                self.written += len(batch)
+            except Exception as e:
+                db.session.rollback()
+                self.dropped += len(batch)
+                print(f"{type(self).__name__}: failed to write {len(batch)} rows: {e}")
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        while True:
+            batch = self._drain(timeout=0)
+            if not batch:
+                break
+            self._write(batch)
+
+    def close(self):
+        """Stop the flush thread and write what is still queued; runs at interpreter exit."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+
+class TripLogger(WriteBehindLogger):
+    """Trip history rows, written behind the request."""
+    model = Trip
+
+    def log(self, user_id, start_location=None, end_location=None, distance_km=None,
+            fuel_cost=None, fuel_litres=None, vehicle_id=None, source=None):
+        """Queue a trip row. Never blocks; rows are dropped if the queue is full."""
+        row = {
+            "user_id": user_id,
+            "start_location": (start_location or "")[:128] or None,
+            "end_location": (end_location or "")[:128] or None,
+            "distance_km": distance_km,
+            "fuel_cost": fuel_cost,
+            "fuel_litres": fuel_litres,
+            "vehicle_id": vehicle_id,
+            "source": source,
+            "timestamp": datetime.utcnow()
+        }
+        self._enqueue(row)
+
+
+class RouteSampleLogger(WriteBehindLogger):
+    """Summaries of freshly fetched routes, kept as training data for the delay predictor."""
+    model = RouteSample
+
+    def log(self, corridor, depart_at, length_km, travel_time, no_traffic_time):
+        """Queue one routed departure. Never blocks."""
+        if not travel_time or not no_traffic_time or not length_km:
+            return
+        self._enqueue({
+            "corridor": corridor,
+            "depart_at": depart_at,
+            "length_km": length_km,
+            "travel_time": int(travel_time),
+            "no_traffic_time": int(no_traffic_time),
+            "created_at": datetime.utcnow()
+        })
+
+
+def _month_expr(column):
+    """'YYYY-MM' bucket for a datetime column in the current database dialect."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m", column)
+    if dialect in ("mysql", "mariadb"):
+        return func.date_format(column, "%Y-%m")
+    return func.to_char(column, "YYYY-MM")
+
+
+def get_trip_history(user_id, limit=50, before_id=None):
+    """Most recent trips first; pass the last id seen as before_id to page backwards."""
+    query = Trip.query.filter(Trip.user_id == user_id)
+    if before_id:
+        query = query.filter(Trip.id < before_id)
+    trips = query.order_by(Trip.timestamp.desc(), Trip.id.desc()).limit(limit).all()
+    return [t.to_dict() for t in trips]
+
+
+def get_monthly_summary(user_id, months=12):
+    """
+    Monthly cost, distance and fuel per vehicle.
+    Aggregated in the database over the (user_id, timestamp) index, so the cost
+    depends on the size of the window rather than the user's total history.
+    """
+    now = datetime.utcnow()
+    first_month = now.year * 12 + (now.month - 1) - (max(1, months) - 1)
+    since = datetime(first_month // 12, first_month % 12 + 1, 1)
+
+    month = _month_expr(Trip.timestamp).label("month")
+    rows = db.session.query(
+        month,
+        Trip.vehicle_id,
+        Vehicle.name,
+        func.count(Trip.id),
+        func.sum(Trip.fuel_cost),
+        func.sum(Trip.distance_km),
+        func.sum(Trip.fuel_litres)
+    ).outerjoin(Vehicle, Vehicle.id == Trip.vehicle_id) \
+     .filter(Trip.user_id == user_id, Trip.timestamp >= since) \
+     .group_by(month, Trip.vehicle_id, Vehicle.name) \
+     .order_by(month.desc()) \
+     .all()
+
+    summary = {}
+    for month_key, vehicle_id, vehicle_name, trips, cost, distance, fuel in rows:
+        entry = summary.setdefault(month_key, {
+            "month": month_key,
+            "trips": 0,
+            "total_cost": 0.0,
+            "total_distance_km": 0.0,
+            "total_fuel": 0.0,
+            "vehicles": []
+        })
+        entry["trips"] += trips
+        entry["total_cost"] += cost or 0
+        entry["total_distance_km"] += distance or 0
+        entry["total_fuel"] += fuel or 0
+        entry["vehicles"].append({
+            "vehicle_id": vehicle_id,
+            "vehicle": vehicle_name or "Unknown",
+            "trips": trips,
+            "cost": round(cost or 0, 2),
+            "distance_km": round(distance or 0, 1),
+            "fuel": round(fuel or 0, 2)
+        })
+
+    for entry in summary.values():
+        entry["total_cost"] = round(entry["total_cost"], 2)
+        entry["total_distance_km"] = round(entry["total_distance_km"], 1)
+        entry["total_fuel"] = round(entry["total_fuel"], 2)
+    return list(summary.values())
+
+
+def get_top_corridors(limit=20, days=30):
+    """Most requested (origin, destination) pairs across all users over the last few days."""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(Trip.start_location, Trip.end_location, func.count(Trip.id).label("requests")) \
+        .filter(Trip.timestamp >= since, Trip.start_location.isnot(None), Trip.end_location.isnot(None)) \
+        .group_by(Trip.start_location, Trip.end_location) \
+        .order_by(func.count(Trip.id).desc()) \
+        .limit(limit) \
+        .all()
+    return [(origin, destination) for origin, destination, _ in rows]
+
+
+def get_corridor_distances(limit=2000):
+    """Average logged road distance per (origin, destination) pair, most travelled first."""
+    rows = db.session.query(Trip.start_location, Trip.end_location, func.avg(Trip.distance_km)) \
+        .filter(Trip.start_location.isnot(None), Trip.end_location.isnot(None), Trip.distance_km > 0) \
+        .group_by(Trip.start_location, Trip.end_location) \
+        .order_by(func.count(Trip.id).desc()) \
+        .limit(limit) \
+        .all()
+    return [(origin, destination, float(distance_km)) for origin, destination, distance_km in rows]
+
+
+def get_route_samples(days=180, limit=200000):
+    """Logged (corridor, depart_at, length_km, travel_time, no_traffic_time) rows, newest first."""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(
+        RouteSample.corridor,
+        RouteSample.depart_at,
+        RouteSample.length_km,
+        RouteSample.travel_time,
+        RouteSample.no_traffic_time
+    ).filter(RouteSample.created_at >= since) \
+     .order_by(RouteSample.created_at.desc()) \
+     .limit(limit) \
+     .all()
+    return [tuple(row) for row in rows]
+
+
+def purge_route_samples(days=180):
+    """Drop route samples older than the training window."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = RouteSample.query.filter(RouteSample.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
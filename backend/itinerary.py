@@ -0,0 +1,71 @@
+import numpy as np
+
+
+def route_cost(durations, order):
+    """Total travel time of visiting the stops in the given order."""
+    order = np.asarray(order)
+    return float(durations[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour_order(durations, start=0, end=None):
+    """Greedy tour: always drive to the closest stop not yet visited."""
+    n = len(durations)
+    remaining = set(range(n)) - {start}
+    if end is not None:
+        remaining.discard(end)
+
+    order = [start]
+    current = start
+    while remaining:
+        nxt = min(remaining, key=lambda j: durations[current, j])
+        order.append(nxt)
+        remaining.remove(nxt)
+        current = nxt
+    if end is not None:
+        order.append(end)
+    return order
+
+
+def two_opt(durations, order, fixed_end=False, max_passes=50):
+    """
+    Improve a tour by reversing segments while that shortens it.
+    The first stop always stays first; with fixed_end the last stop stays last too.
+    Travel times may be asymmetric, so each candidate is costed in full.
+    """
+    best = list(order)
+    best_cost = route_cost(durations, best)
+    last = len(best) - 1 if fixed_end else len(best)
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, last - 1):
+            for k in range(i + 1, last):
+                candidate = best[:i] + best[i:k + 1][::-1] + best[k + 1:]
+                cost = route_cost(durations, candidate)
+                if cost < best_cost - 1e-9:
+                    best, best_cost = candidate, cost
+                    improved = True
+        if not improved:
+            break
+    return best
+
+
+def plan_visit_order(durations, start=0, end=None):
+    """
+    Visit order for a multi-stop trip: nearest-neighbour construction refined with 2-opt.
+    Args:
+        durations: n x n travel-time matrix (inf where no route exists)
+        start (int): index of the first stop
+        end (int): index of a fixed final stop (pass start for a round trip), or None
+    Returns:
+        list of stop indices in visiting order
+    """
+    durations = np.asarray(durations, dtype=float)
+
+    # Keep unreachable pairs comparable so the search still terminates
+    finite = durations[np.isfinite(durations)]
+    penalty = (finite.max() if finite.size else 1.0) * len(durations) * 10
+    costs = np.where(np.isfinite(durations), durations, penalty)
+
+    order = nearest_neighbour_order(costs, start=start, end=end)
+    return two_opt(costs, order, fixed_end=end is not None)
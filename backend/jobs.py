@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from models import db, Job
+
+
+class JobManager:
+    """
+    In-process background jobs for long-running sweeps.
+    Work runs on a thread pool and every job is recorded in the Job table, so a
+    client gets an id straight away and can poll for progress and the result.
+    Submitting the same work twice returns the existing job instead of running it again.
+    Several processes can share the table: each job records its owner, and the owner
+    refreshes its heartbeat while the job is queued or running. Only jobs whose heartbeat
+    has gone stale (the owner died or was restarted) are marked as interrupted.
+    The pool and heartbeat threads start with the first submitted job, not at construction.
+    Progress is written to the job row (at most every PROGRESS_WRITE_SECONDS), so a poll
+    that lands on another worker still sees it.
+    """
+    PROGRESS_WRITE_SECONDS = 1.0
+    def __init__(self, app, max_workers=4, result_ttl=86400, reuse_seconds=300, heartbeat_seconds=30):
+        self.app = app
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.reuse_seconds = reuse_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_after = 3 * heartbeat_seconds
+        # The random suffix keeps a restarted process that reuses a pid from adopting old jobs
+        self.owner = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = None
+        self._heartbeat = None
+        self._progress = {}  # job_id -> (done, total) while the job is running
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, kind, params, func):
+        """
+        Queue func(user_id, params, progress=...) and return the job as a dict.
+        func returns (payload, status_code) like the endpoint helpers in app.py.
+        """
+        key = hashlib.sha256(
+            json.dumps([user_id, kind, params], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        with self._lock:
+            self._expire_stale()
+            existing = self._find_reusable(key)
+            if existing:
+                return self._to_dict(existing)
+
+            self._purge_expired()
+            job = Job(id=uuid.uuid4().hex, kind=kind, status="queued", dedup_key=key, user_id=user_id,
+                      owner=self.owner, heartbeat_at=datetime.utcnow())
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+            info = self._to_dict(job)
+            self._start()
+
+        self._executor.submit(self._run, job_id, user_id, params, func)
+        return info
+
+    def get(self, job_id, user_id):
+        job = db.session.get(Job, job_id)
+        if not job or job.user_id != user_id:
+            return None
+        if job.status in ("queued", "running") and self._is_stale(job):
+            self._expire_stale()
+            db.session.refresh(job)
+        return self._to_dict(job, include_result=True)
+
+    def _start(self):
+        """Start the worker pool and the heartbeat thread on first use (caller holds the lock)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                with self.app.app_context():
+                    Job.query.filter(Job.owner == self.owner, Job.status.in_(("queued", "running"))).update(
+                        {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+                    )
+                    db.session.commit()
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
+
+    def _is_stale(self, job):
+        beat = job.heartbeat_at or job.created_at
+        return beat is None or beat < datetime.utcnow() - timedelta(seconds=self.stale_after)
+
+    def _expire_stale(self):
+        """Fail queued/running jobs whose owner has stopped sending heartbeats."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        Job.query.filter(
+            Job.status.in_(("queued", "running")),
+            or_(Job.heartbeat_at < cutoff, and_(Job.heartbeat_at.is_(None), Job.created_at < cutoff))
+        ).update(
+            {"status": "failed", "error": "Interrupted by a server restart", "finished_at": datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def _find_reusable(self, key):
+        """A queued/running job with the same key, or one that finished successfully very recently."""
+        reuse_after = datetime.utcnow() - timedelta(seconds=self.reuse_seconds)
+        return Job.query.filter(
+            Job.dedup_key == key,
+            or_(Job.status.in_(("queued", "running")),
+                and_(Job.status == "done", Job.finished_at >= reuse_after))
+        ).order_by(Job.created_at.desc()).first()
+
+    def _purge_expired(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+        Job.query.filter(Job.created_at < cutoff).delete(synchronize_session=False)
+
+    def _run(self, job_id, user_id, params, func):
+        with self.app.app_context():
+            self._update(job_id, status="running", heartbeat_at=datetime.utcnow(), progress=0)
+            self._progress[job_id] = (0, 0)
+            written = {"percent": 0, "at": time.monotonic()}
+
+            def progress(done, total):
+                # Called from the job's own worker threads too, so write in a context of its own
+                self._progress[job_id] = (done, total)
+                percent = round(done * 100 / total) if total else 0
+                now = time.monotonic()
+                if percent != written["percent"] and now - written["at"] >= self.PROGRESS_WRITE_SECONDS:
+                    written.update(percent=percent, at=now)
+                    with self.app.app_context():
+                        self._update(job_id, progress=percent)
+
+            try:
+                payload, status = func(user_id, params, progress=progress)
+                if status >= 400:
+                    error = payload.get("error") or payload.get("message") or "Job failed"
+                    self._update(job_id, status="failed", error=str(error)[:256], finished_at=datetime.utcnow())
+                else:
+                    self._update(job_id, status="done", result=json.dumps(payload), progress=100,
+                                 finished_at=datetime.utcnow())
+            except Exception as e:
+                db.session.rollback()
+                self._update(job_id, status="failed", error=str(e)[:256], finished_at=datetime.utcnow())
+            finally:
+                self._progress.pop(job_id, None)
+
+    def _update(self, job_id, **fields):
+        Job.query.filter_by(id=job_id).update(fields, synchronize_session=False)
+        db.session.commit()
+
+    def _to_dict(self, job, include_result=False):
+        local = self._progress.get(job.id)
+        if job.status == "done":
+            progress = 100
+        elif local:
+            # Running here: the in-memory count is fresher than the row
+            done, total = local
+            progress = round(done * 100 / total) if total else 0
+        else:
+            progress = job.progress or 0
+
+        info = {
+            "job_id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": progress,
+            "created_at": job.created_at.strftime("%Y-%m-%dT%H:%M:%S") if job.created_at else None,
+            "finished_at": job.finished_at.strftime("%Y-%m-%dT%H:%M:%S") if job.finished_at else None
+        }
+        if include_result:
+            if job.status == "done":
+                info["result"] = json.loads(job.result) if job.result else None
+            elif job.status == "failed":
+                info["error"] = job.error
+        return info
@@ -1,13 +1,61 @@
+import hashlib
+import json
+import sqlite3
+import time
+from flask import g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from cache import TTLCache
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run while a writer commits instead of locking the whole file
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is crash-safe under WAL and avoids an fsync on every commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Wait for a competing writer rather than failing with "database is locked"
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")  # ~16 MB page cache
+    cursor.close()
+
+
+def ensure_schema(engine):
+    """
+    create_all() skips tables that already exist, so bring older databases up to date:
+    add missing (nullable) columns, then any missing indexes.
+    """
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                col_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     password_hash = db.Column(db.String(128))
+    vehicles_version = db.Column(db.Integer, default=0)  # bumped on every vehicle add/delete
     vehicles = db.relationship('Vehicle', backref='owner', lazy='dynamic')
 
     def set_password(self, password):
@@ -22,13 +70,207 @@ class Vehicle(db.Model):
     mileage = db.Column(db.Float)  # km/l or km/kWh
     vehicle_type = db.Column(db.String(20))  # 'fuel' or 'ev'
     fuel_type = db.Column(db.String(20), default='petrol')  # 'petrol', 'diesel', 'cng', 'ev'
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'mileage': self.mileage,
+            'type': self.vehicle_type,
+            'fuel_type': self.fuel_type
+        }
 
 class Trip(db.Model):
+    # History and summaries always filter by user and time range
+    __table_args__ = (db.Index('ix_trip_user_timestamp', 'user_id', 'timestamp'),)
+
     id = db.Column(db.Integer, primary_key=True)
     start_location = db.Column(db.String(128))
     end_location = db.Column(db.String(128))
     distance_km = db.Column(db.Float)
     fuel_cost = db.Column(db.Float)
+    fuel_litres = db.Column(db.Float)  # litres, kg (CNG) or kWh (EV)
+    source = db.Column(db.String(20))  # endpoint that logged it: 'calculate_trip', 'smart_plan'
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicle.id', ondelete='SET NULL'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'start_location': self.start_location,
+            'end_location': self.end_location,
+            'distance_km': self.distance_km,
+            'fuel_cost': self.fuel_cost,
+            'fuel_litres': self.fuel_litres,
+            'source': self.source,
+            'vehicle_id': self.vehicle_id,
+            'timestamp': self.timestamp.strftime("%Y-%m-%dT%H:%M:%S") if self.timestamp else None
+        }
+
+
+class RouteSample(db.Model):
+    """One routed departure (travel vs free-flow time), logged to train the delay predictor."""
+    id = db.Column(db.Integer, primary_key=True)
+    corridor = db.Column(db.String(64), index=True)  # "lat,lon>lat,lon" rounded to 3 decimals
+    depart_at = db.Column(db.DateTime)  # local departure time the summary is for
+    length_km = db.Column(db.Float)
+    travel_time = db.Column(db.Integer)  # seconds, with traffic
+    no_traffic_time = db.Column(db.Integer)  # seconds, free flow
+    created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(32))  # 'smart_plan', 'laps', 'batch_plan'
+    status = db.Column(db.String(16), default='queued')  # queued, running, done, failed
+    dedup_key = db.Column(db.String(64), index=True)
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.String(256))
+    created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    owner = db.Column(db.String(64))  # host:pid:nonce of the process running the job
+    heartbeat_at = db.Column(db.DateTime)  # refreshed by the owner while queued/running
+    progress = db.Column(db.Integer)  # percent done, written by the owner so any worker can report it
+
+
+class MonitorCorridor(db.Model):
+    """A corridor watched by the traffic monitor; workers register it, the sampler writes its state."""
+    key = db.Column(db.String(100), primary_key=True)  # "lat,lon>lat,lon"
+    origin = db.Column(db.String(50), nullable=False)
+    destination = db.Column(db.String(50), nullable=False)
+    pinned = db.Column(db.Boolean, default=False)  # configured corridors are never dropped
+    last_requested = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    state = db.Column(db.Text)  # JSON alert state from the latest sample
+    sampled_at = db.Column(db.DateTime)
+
+
+class SharedCacheEntry(db.Model):
+    """An upstream result cached for every process (see SharedCache)."""
+    namespace = db.Column(db.String(32), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of the JSON-encoded cache key
+    value = db.Column(db.Text, nullable=False)  # JSON
+    expires_at = db.Column(db.DateTime, index=True, nullable=False)  # UTC
+
+
+class VehicleCache:
+    """
+    Per-user cache of vehicle data for the read-heavy endpoints.
+    Each entry carries the user's vehicles_version from the DB. An add or delete in any
+    worker bumps that version, so every worker reloads on its next request. The version
+    is read once per request, which costs one primary-key lookup instead of the vehicle list.
+    """
+    def __init__(self, ttl=600, max_users=4096):
+        self._cache = TTLCache(ttl=ttl, max_entries=max_users)
+
+    def _version(self, user_id):
+        versions = g.setdefault("vehicle_versions", {})
+        if user_id not in versions:
+            versions[user_id] = db.session.query(User.vehicles_version).filter_by(id=user_id).scalar() or 0
+        return versions[user_id]
+
+    def for_user(self, user_id):
+        """Return {vehicle_id: vehicle dict} for a user, loading it from the DB when it changed."""
+        version = self._version(user_id)
+        entry = self._cache.get(user_id)
+        if entry is None or entry[0] != version:
+            rows = Vehicle.query.filter_by(user_id=user_id).all()
+            entry = (version, {v.id: v.to_dict() for v in rows})
+            self._cache.set(user_id, entry)
+        return entry[1]
+
+    def get(self, user_id, vehicle_id):
+        """Return one of the user's vehicles, or None if it doesn't exist or isn't theirs."""
+        try:
+            vehicle_id = int(vehicle_id)
+        except (TypeError, ValueError):
+            return None
+        return self.for_user(user_id).get(vehicle_id)
+
+    def invalidate(self, user_id):
+        """Bump the user's version stamp; call in the same transaction as the vehicle change."""
+        User.query.filter_by(id=user_id).update(
+            {User.vehicles_version: func.coalesce(User.vehicles_version, 0) + 1}, synchronize_session=False
+        )
+        g.pop("vehicle_versions", None)
+        self._cache.pop(user_id)
+
+
+class SharedCache:
+    """
+    A TTLCache backed by the SharedCacheEntry table, so results warmed in one process
+    (the nightly prewarm) are served by every web worker.
+    Reads fall through to the table on a local miss, which costs one primary-key lookup
+    instead of an upstream call. Writes go to the table only when publish is set (in the
+    process running the background services), keeping the request path read-only.
+    Expired rows are kept for STALE_SECONDS so they can still be served stale.
+    Keys and values must be JSON-serializable.
+    """
+    STALE_SECONDS = 86400
+    PURGE_SECONDS = 3600  # how often a publisher deletes rows past STALE_SECONDS
+
+    def __init__(self, app, namespace, local, publish=False):
+        self.app = app
+        self.namespace = namespace
+        self.local = local
+        self.publish = publish
+        self._purged_at = None
+
+    def _row_key(self, key):
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key, default=None, allow_stale=False):
+        value = self.local.get(key, allow_stale=allow_stale)
+        if value is not None:
+            return value
+        try:
+            with self.app.app_context():
+                row = db.session.get(SharedCacheEntry, (self.namespace, self._row_key(key)))
+                if row is None:
+                    return default
+                value = json.loads(row.value)
+                remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+        except (SQLAlchemyError, ValueError):
+            return default
+        # An expired row is kept locally as stale, so the allow_stale retry doesn't read it again
+        self.local.set(key, value, ttl=remaining)
+        if remaining <= 0 and not allow_stale:
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl=ttl)
+        if not self.publish:
+            return
+        ttl = self.local.ttl if ttl is None else ttl
+        try:
+            with self.app.app_context():
+                db.session.merge(SharedCacheEntry(
+                    namespace=self.namespace, key=self._row_key(key),
+                    value=json.dumps(value), expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+                ))
+                self._purge()
+                db.session.commit()
+        except (SQLAlchemyError, TypeError, ValueError):
+            pass
+
+    def _purge(self):
+        now = time.monotonic()
+        if self._purged_at is not None and now - self._purged_at < self.PURGE_SECONDS:
+            return
+        self._purged_at = now
+        SharedCacheEntry.query.filter(
+            SharedCacheEntry.namespace == self.namespace,
+            SharedCacheEntry.expires_at < datetime.utcnow() - timedelta(seconds=self.STALE_SECONDS)
+        ).delete(synchronize_session=False)
+
+    def pop(self, key, default=None):
+        return self.local.pop(key, default)
+
+    def clear(self):
+        self.local.clear()
+
+    def __len__(self):
+        return len(self.local)
@@ -0,0 +1,253 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MonitorCorridor
+
+
+def load_peak_hours(path=None, threshold=60):
+    """Hours whose typical traffic density (traffic_data.csv) is at or above threshold."""
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic_data.csv")
+    try:
+        with open(path, newline="") as f:
+            return {int(r["hour"]) for r in csv.DictReader(f) if float(r["traffic_density"]) >= threshold}
+    except (OSError, KeyError, ValueError):
+        return {8, 9, 10, 17, 18, 19}
+
+
+class CorridorStats:
+    """
+    Streaming speed statistics for one corridor.
+    Samples go into a fixed-size ring buffer; the EWMA, the windowed min/max
+    (monotonic deques) and the per-hour baseline all update in O(1) amortised time.
+    """
+    def __init__(self, capacity=180, window_sec=600, alpha=0.3, baseline_alpha=0.05):
+        self.times = np.zeros(capacity)
+        self.speeds = np.zeros(capacity)
+        self.head = 0
+        self.count = 0
+        self.window_sec = window_sec
+        self.alpha = alpha
+        self.baseline_alpha = baseline_alpha
+        self.ewma = None
+        self.free_flow = None
+        self.hour_baseline = [None] * 24
+        self.hour_samples = [0] * 24
+        self._max_q = deque()  # (time, speed), speeds decreasing
+        self._min_q = deque()  # (time, speed), speeds increasing
+
+    def add(self, t, speed, free_flow=None):
+        self.times[self.head] = t
+        self.speeds[self.head] = speed
+        self.head = (self.head + 1) % len(self.speeds)
+        self.count = min(self.count + 1, len(self.speeds))
+
+        self.ewma = speed if self.ewma is None else self.alpha * speed + (1 - self.alpha) * self.ewma
+        if free_flow:
+            self.free_flow = free_flow
+
+        while self._max_q and self._max_q[-1][1] <= speed:
+            self._max_q.pop()
+        self._max_q.append((t, speed))
+        while self._min_q and self._min_q[-1][1] >= speed:
+            self._min_q.pop()
+        self._min_q.append((t, speed))
+
+        cutoff = t - self.window_sec
+        while self._max_q[0][0] < cutoff:
+            self._max_q.popleft()
+        while self._min_q[0][0] < cutoff:
+            self._min_q.popleft()
+
+    def update_baseline(self, hour, speed):
+        """Slow EWMA of the speed usually seen at this hour of day."""
+        base = self.hour_baseline[hour]
+        self.hour_baseline[hour] = speed if base is None else \
+            self.baseline_alpha * speed + (1 - self.baseline_alpha) * base
+        self.hour_samples[hour] += 1
+
+    @property
+    def latest(self):
+        return float(self.speeds[self.head - 1]) if self.count else None
+
+    @property
+    def window_max(self):
+        return self._max_q[0][1] if self._max_q else None
+
+    @property
+    def window_min(self):
+        return self._min_q[0][1] if self._min_q else None
+
+
+class TrafficMonitor:
+    """
+    Background sampler behind /api/monitor.
+    Watched corridors and their latest alert state live in the MonitorCorridor table,
+    so every web worker can register a corridor and read its state without calling
+    upstream. One process (see start_background_services) polls TomTom flow for them,
+    keeps the rolling statistics in memory and writes the state back.
+    Corridors are dropped after idle_ttl seconds without being read; configured
+    corridors are always watched.
+    """
+    MIN_BASELINE_SAMPLES = 30  # per hour of day, before the learned baseline is trusted
+
+    def __init__(self, app, tomtom_service, interval=60, window_sec=600, idle_ttl=3600,
+                 max_corridors=50, static_corridors=None):
+        self.app = app
+        self.tomtom_service = tomtom_service
+        self.interval = interval
+        self.window_sec = window_sec
+        self.idle_ttl = idle_ttl
+        self.max_corridors = max_corridors
+        self.static_corridors = list(static_corridors or [])
+        self.peak_hours = load_peak_hours()
+        self._stats = {}  # key -> CorridorStats, only in the sampling process
+        self._thread = None
+
+    def watch(self, origin, destination, pinned=False):
+        """Start (or keep) sampling a corridor of "lat,lon" points. Returns its key."""
+        key = f"{origin}>{destination}"
+        now = datetime.utcnow()
+        corridor = db.session.get(MonitorCorridor, key)
+        if corridor is None:
+            if MonitorCorridor.query.count() >= self.max_corridors:
+                self._evict_oldest()
+            corridor = MonitorCorridor(key=key, origin=origin, destination=destination, pinned=pinned)
+            db.session.add(corridor)
+        corridor.last_requested = now
+        corridor.pinned = corridor.pinned or pinned
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker registered it first
+            db.session.rollback()
+            MonitorCorridor.query.filter_by(key=key).update({"last_requested": now})
+            db.session.commit()
+        return key
+
+    def _evict_oldest(self):
+        oldest = (MonitorCorridor.query.filter_by(pinned=False)
+                  .order_by(MonitorCorridor.last_requested).first())
+        if oldest:
+            db.session.delete(oldest)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="traffic-monitor", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        with self.app.app_context():
+            for origin, destination in self.static_corridors:
+                self.watch(origin, destination, pinned=True)
+        while True:
+            try:
+                self.sample_all()
+            except Exception as e:
+                print(f"Traffic monitor sampling failed: {e}")
+            time.sleep(self.interval)
+
+    def sample_all(self):
+        with self.app.app_context():
+            cutoff = datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+            MonitorCorridor.query.filter(
+                MonitorCorridor.pinned.is_(False), MonitorCorridor.last_requested < cutoff
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            corridors = MonitorCorridor.query.all()
+            for key in set(self._stats) - {c.key for c in corridors}:
+                del self._stats[key]
+            if not corridors:
+                return
+
+            with ThreadPoolExecutor(max_workers=min(8, len(corridors))) as pool:
+                readings = list(pool.map(
+                    lambda c: self.tomtom_service.get_traffic(c[0], c[1]),
+                    [(c.origin, c.destination) for c in corridors]
+                ))
+
+            now = time.time()
+            hour = datetime.now().hour
+            for corridor, data in zip(corridors, readings):
+                if "error" in data:
+                    continue
+                flow = data.get("raw", {}).get("flowSegmentData", {})
+                speed = flow.get("currentSpeed")
+                if not isinstance(speed, (int, float)):
+                    continue
+                stats = self._stats.get(corridor.key)
+                if stats is None:
+                    stats = self._stats[corridor.key] = CorridorStats(window_sec=self.window_sec)
+                stats.add(now, float(speed), flow.get("freeFlowSpeed"))
+                corridor.state = json.dumps(self._evaluate(stats, hour))
+                corridor.sampled_at = datetime.utcnow()
+                # Learn the baseline after evaluating, so an anomaly isn't compared with itself
+                stats.update_baseline(hour, float(speed))
+            db.session.commit()
+
+    def _evaluate(self, stats, hour):
+        latest = stats.latest
+        window_max = stats.window_max
+
+        # Sudden drop: latest speed well below the best seen in the window
+        drop = window_max - latest if window_max is not None else 0
+        speed_drop = drop >= max(10, 0.25 * window_max) if window_max else False
+
+        # Unusual congestion: slow for this hour, outside the usual peak hours
+        baseline = stats.hour_baseline[hour] if stats.hour_samples[hour] >= self.MIN_BASELINE_SAMPLES else None
+        reference = baseline or stats.free_flow
+        off_peak = hour not in self.peak_hours
+        congested = bool(reference) and stats.ewma < (0.7 if baseline else 0.6) * reference
+
+        return {
+            "active": True,
+            "current_speed": round(latest, 1),
+            "ewma_speed": round(stats.ewma, 1),
+            "window_min_speed": round(stats.window_min, 1),
+            "window_max_speed": round(window_max, 1),
+            "free_flow_speed": stats.free_flow,
+            "samples": stats.count,
+            "speed_drop": {
+                "detected": bool(speed_drop),
+                "amount": round(drop),
+                "window": f"{self.window_sec // 60} min",
+                "message": f"Sudden drop in average speed within {self.window_sec // 60} minutes"
+            },
+            "off_peak_congestion": {
+                "detected": bool(off_peak and congested),
+                "message": "Unusual congestion during non-peak hours detected"
+            }
+        }
+
+    def get_state(self, key=None):
+        """Latest state for a corridor as written by the sampler (one row read, no upstream calls)."""
+        corridor = db.session.get(MonitorCorridor, key) if key else None
+        if corridor:
+            # Reading keeps the corridor watched; refresh the timestamp at most once per interval
+            now = datetime.utcnow()
+            if not corridor.last_requested or (now - corridor.last_requested).total_seconds() > self.interval:
+                corridor.last_requested = now
+                db.session.commit()
+            if corridor.state:
+                return json.loads(corridor.state)
+        return {
+            "active": bool(corridor),
+            "speed_drop": {
+                "detected": False,
+                "amount": 0,
+                "window": f"{self.window_sec // 60} min",
+                "message": "No speed data yet"
+            },
+            "off_peak_congestion": {
+                "detected": False,
+                "message": "No congestion data yet"
+            }
+        }
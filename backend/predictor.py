@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def corridor_key(start, end):
+    """Stable id for an origin/destination pair of {"lat", "lon"} points."""
+    return f"{start['lat']:.3f},{start['lon']:.3f}>{end['lat']:.3f},{end['lon']:.3f}"
+
+
+class DelayPredictor:
+    """
+    Predicts the delay ratio (travel time / free-flow time) of a departure from its hour,
+    weekday, public holiday flag and corridor length, so dates beyond the live-traffic
+    horizon can be answered without upstream calls.
+    A linear model on log delay ratio is fitted to logged route summaries, seeded with the
+    hourly profile in traffic_data.csv, and each corridor gets its own offset, shrunk
+    towards the global model until it has a few samples. A whole hour window is
+    predicted with one vectorized predict() call.
+    """
+    BASELINE_WEIGHT = 0.2  # weight of each traffic_data.csv row relative to one logged sample
+    BASELINE_LENGTH_KM = 20.0
+    CORRIDOR_PRIOR = 5  # samples' worth of shrinkage for per-corridor offsets
+    MIN_HOUR_SAMPLES = 5  # below this an hour's spread falls back to the overall spread
+    DEFAULT_SPREAD = 0.15  # log-ratio standard deviation when nothing has been observed
+    REFRESH_SECONDS = 60  # how often refresh() looks for a newer saved model
+
+    def __init__(self, path=None, baseline_csv=None):
+        self.path = path
+        self.baseline_csv = baseline_csv or os.path.join(BASE_DIR, "traffic_data.csv")
+        self.model = None
+        self.corridors = {}  # corridor -> {"offset", "n", "length_km", "free_sec"}
+        self.residual_std = np.full(24, self.DEFAULT_SPREAD)
+        self.samples = 0
+        self.trained_at = None
+        self._loaded_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    @staticmethod
+    def features(hours, weekdays, holidays, length_km):
+        """Design matrix: one-hot hour (24) and weekday (7), holiday flag, log corridor length."""
+        hours = np.asarray(hours, dtype=int).ravel()
+        n = len(hours)
+        weekdays, holidays, length_km = (np.broadcast_to(np.asarray(v, dtype=float), (n,))
+                                         for v in (weekdays, holidays, length_km))
+        X = np.zeros((n, 33))
+        X[np.arange(n), hours % 24] = 1
+        X[np.arange(n), 24 + weekdays.astype(int) % 7] = 1
+        X[:, 31] = holidays
+        X[:, 32] = np.log1p(length_km)
+        return X
+
+    def _baseline(self):
+        """(hours, weekdays, delay ratios) for every hour of the week from traffic_data.csv."""
+        try:
+            df = pd.read_csv(self.baseline_csv)
+            density = df.set_index("hour")["traffic_density"]
+            # Hours the file does not cover are assumed no busier than its quietest hour
+            density = density.reindex(range(24)).fillna(density.min()).to_numpy(dtype=float)
+        except (OSError, KeyError, ValueError):
+            density = np.zeros(24)
+        # Density 100 corresponds to the Critical delay ratio (1.8)
+        ratio = 1 + density / 100 * 0.8
+        return np.tile(np.arange(24), 7), np.repeat(np.arange(7), 24), np.tile(ratio, 7)
+
+    def train(self, samples, holiday_dates=()):
+        """
+        Fit on logged (corridor, depart_at, length_km, travel_time, no_traffic_time) rows.
+        holiday_dates: "YYYY-MM-DD" strings of public holidays covering the samples.
+        """
+        rows = [s for s in samples if s[1] and s[2] and s[3] and s[4]]
+        b_hours, b_weekdays, b_ratio = self._baseline()
+        hours = np.array([s[1].hour for s in rows], dtype=int)
+        weekdays = np.array([s[1].weekday() for s in rows], dtype=int)
+        holidays = np.array([s[1].strftime("%Y-%m-%d") in holiday_dates for s in rows], dtype=float)
+        length_km = np.array([s[2] for s in rows], dtype=float)
+        free_sec = np.array([s[4] for s in rows], dtype=float)
+        ratio = np.clip(np.array([s[3] for s in rows], dtype=float) / np.maximum(free_sec, 1), 1, 5)
+
+        X = np.vstack([
+            self.features(b_hours, b_weekdays, 0, self.BASELINE_LENGTH_KM),
+            self.features(hours, weekdays, holidays, length_km)
+        ])
+        y = np.log(np.concatenate([b_ratio, ratio]))
+        weights = np.concatenate([np.full(len(b_ratio), self.BASELINE_WEIGHT), np.ones(len(rows))])
+        model = LinearRegression().fit(X, y, sample_weight=weights)
+
+        corridors = {}
+        residual_std = np.full(24, self.DEFAULT_SPREAD)
+        if rows:
+            df = pd.DataFrame({
+                "corridor": [s[0] for s in rows],
+                "hour": hours,
+                "residual": y[len(b_ratio):] - model.predict(X[len(b_ratio):]),
+                "length_km": length_km,
+                "free_sec": free_sec
+            })
+            grouped = df.groupby("corridor")
+            stats = pd.DataFrame({
+                "offset": grouped["residual"].sum() / (grouped.size() + self.CORRIDOR_PRIOR),
+                "n": grouped.size(),
+                "length_km": grouped["length_km"].median(),
+                "free_sec": grouped["free_sec"].median()
+            })
+            corridors = stats.to_dict("index")
+
+            # Spread of what the corridor-adjusted model still misses, per hour of day
+            df["residual"] -= df["corridor"].map(stats["offset"])
+            if len(df) > 1:
+                overall = float(df["residual"].std())
+                residual_std[:] = max(overall, 0.02)
+                by_hour = df.groupby("hour")["residual"].agg(["std", "size"])
+                by_hour = by_hour[by_hour["size"] >= self.MIN_HOUR_SAMPLES]
+                residual_std[by_hour.index.to_numpy()] = np.maximum(by_hour["std"].to_numpy(), 0.02)
+
+        with self._lock:
+            self.model = model
+            self.corridors = corridors
+            self.residual_std = residual_std
+            self.samples = len(rows)
+            self.trained_at = datetime.now()
+
+    def corridor(self, corridor):
+        """Logged stats (offset, n, length_km, free_sec) for a corridor, or None."""
+        return self.corridors.get(corridor)
+
+    def predict(self, hours, day, holiday=False, length_km=None, corridor=None):
+        """
+        Delay ratio for each departure hour on day (a date), plus the log-ratio spread
+        of each hour. Returns two arrays aligned with hours.
+        """
+        with self._lock:
+            model, info, residual_std = self.model, self.corridors.get(corridor), self.residual_std
+        if length_km is None:
+            length_km = info["length_km"] if info else self.BASELINE_LENGTH_KM
+        hours = np.asarray(hours, dtype=int)
+        log_ratio = model.predict(self.features(hours, day.weekday(), float(holiday), length_km))
+        if info:
+            log_ratio = log_ratio + info["offset"]
+        return np.maximum(np.exp(log_ratio), 1.0), residual_std[hours % 24]
+
+    def spread(self, hours):
+        """Log-ratio standard deviation of the model's error for each hour of day."""
+        return self.residual_std[np.asarray(hours, dtype=int) % 24]
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path or not self.ready:
+            return False
+        with self._lock:
+            artifact = {
+                "version": 1,
+                "model": self.model,
+                "corridors": self.corridors,
+                "residual_std": self.residual_std,
+                "samples": self.samples,
+                "trained_at": self.trained_at
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        joblib.dump(artifact, tmp)
+        os.replace(tmp, path)
+        if path == self.path:
+            self._loaded_mtime = os.path.getmtime(path)
+        return True
+
+    def refresh(self):
+        """
+        Load the saved model if it is newer than the one in memory, e.g. after another
+        process retrained it. Looks at the file at most every REFRESH_SECONDS.
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.REFRESH_SECONDS:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except (OSError, TypeError):
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+        return self.load()
+
+    def load(self, path=None):
+        """Load a saved model; returns False if there is none (or it cannot be read)."""
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            mtime = os.path.getmtime(path)
+            artifact = joblib.load(path)
+        except Exception as e:
+            print(f"Delay predictor not loaded: {e}")
+            return False
+        if artifact.get("version") != 1:
+            return False
+        with self._lock:
+            self.model = artifact["model"]
+            self.corridors = artifact["corridors"]
+            self.residual_std = artifact["residual_std"]
+            self.samples = artifact["samples"]
+            self.trained_at = artifact["trained_at"]
+            if path == self.path:
+                self._loaded_mtime = mtime
+        return True
+
+    def snapshot(self):
+        return {
+            "ready": self.ready,
+            "samples": self.samples,
+            "corridors": len(self.corridors),
+            "trained_at": self.trained_at.strftime("%Y-%m-%dT%H:%M:%S") if self.trained_at else None
+        }
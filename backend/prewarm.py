@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from history import get_top_corridors
+
+
+class Prewarmer:
+    """
+    Off-peak cache warming for the most requested corridors.
+    Once a day (at run_at_hour) it takes the top corridors from trip history and
+    precomputes hourly route summaries, LAPS risk and destination weather for the
+    next few days, so the first /api/smart_plan and /api/laps of the day are cache hits.
+    The services' caches are SharedCaches, published to the database by the process
+    running this, so every web worker sees the warmed results.
+    """
+    def __init__(self, app, tomtom_service, weather_service, days=2, top_k=20,
+                 start_hour=6, end_hour=22, run_at_hour=3, after_run=None):
+        self.app = app
+        self.tomtom_service = tomtom_service
+        self.weather_service = weather_service
+        self.days = days
+        self.top_k = top_k
+        self.start_hour = start_hour
+        self.end_hour = end_hour
+        self.run_at_hour = run_at_hour
+        self.after_run = after_run  # e.g. retrain on the summaries the run just logged
+        self.last_run = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=self.run_at_hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            time.sleep((next_run - now).total_seconds())
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Prewarm failed: {e}")
+            if self.after_run:
+                try:
+                    self.after_run()
+                except Exception as e:
+                    print(f"Post-prewarm task failed: {e}")
+
+    def run_once(self):
+        """Warm the caches now. Returns the number of corridor-days warmed."""
+        with self.app.app_context():
+            corridors = get_top_corridors(limit=self.top_k)
+        if not corridors:
+            return 0
+
+        today = datetime.now().date()
+        dates = [(today + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(self.days)]
+
+        # 1. Hourly route summaries for every corridor and day, deduplicated and concurrent
+        rows = [{
+            "origin": origin,
+            "destination": destination,
+            "date": date,
+            "start_hour": self.start_hour,
+            "end_hour": self.end_hour
+        } for origin, destination in corridors for date in dates]
+        self.tomtom_service.plan_batch(rows)
+
+        # 2. LAPS risk and hotspots per hour (reuses the cached geocodes)
+        for row in rows:
+            self.tomtom_service.calculate_laps(
+                row["origin"], row["destination"], self.start_hour, self.end_hour, target_date=row["date"]
+            )
+
+        # 3. Destination weather covering the whole warmed period
+        for destination in {d for _, d in corridors}:
+            coords = self.tomtom_service._geocode(destination)
+            if coords:
+                try:
+                    self.weather_service._fetch_hourly(coords["lat"], coords["lon"])
+                except Exception:
+                    continue
+
+        self.last_run = datetime.now()
+        return len(rows)
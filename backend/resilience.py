@@ -0,0 +1,201 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was skipped or abandoned (breaker open or out of time)."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class Deadline:
+    """
+    End-to-end time budget for one request.
+    Passed down through the services so every upstream call gets the smaller of
+    its own timeout and whatever is left of the budget.
+    """
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, default):
+        """Timeout for the next call; raises once there is no useful time left."""
+        left = self.remaining()
+        if left < 0.2:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(default, left)
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+    After failure_threshold consecutive failures calls fail fast for reset_timeout
+    seconds; then a single trial call decides whether to close it again.
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, method, url, deadline=None, semaphore=None, **kwargs):
+        """Make an HTTP call through the breaker, bounded by the deadline."""
+        # Check the budget before taking the half-open trial slot, so running out of
+        # time never leaves the trial marked as in progress
+        if deadline:
+            kwargs["timeout"] = deadline.timeout(kwargs.get("timeout", 10))
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable")
+        try:
+            if semaphore:
+                if not semaphore.acquire(timeout=deadline.remaining() if deadline else None):
+                    raise DeadlineExceeded("Request deadline exceeded waiting for an upstream slot")
+                try:
+                    resp = method(url, **kwargs)
+                finally:
+                    semaphore.release()
+            else:
+                resp = method(url, **kwargs)
+        except DeadlineExceeded:
+            with self._lock:
+                self._trial_running = False
+            raise
+        except requests.RequestException:
+            self.record_failure()
+            raise
+        # Rate limiting and server errors count against the provider; 4xx are our fault
+        if resp.status_code >= 500 or resp.status_code == 429:
+            self.record_failure()
+        else:
+            self.record_success()
+        return resp
+
+
+BREAKERS = {}
+BREAKER_DEFAULTS = {}
+
+
+def configure_breakers(**kwargs):
+    """Set failure_threshold / reset_timeout for all breakers, existing and future."""
+    BREAKER_DEFAULTS.update(kwargs)
+    for breaker in BREAKERS.values():
+        for attr, value in kwargs.items():
+            setattr(breaker, attr, value)
+
+
+def get_breaker(name, **kwargs):
+    """Shared breaker per upstream provider."""
+    if name not in BREAKERS:
+        BREAKERS[name] = CircuitBreaker(name, **{**BREAKER_DEFAULTS, **kwargs})
+    return BREAKERS[name]
+
+
+class Revalidator:
+    """
+    Stale-while-revalidate reads over a TTLCache.
+    Fresh entries are returned as is. Otherwise the value is fetched within the
+    request's deadline; if the provider is down, the breaker is open or the budget
+    is spent, the expired copy is served and refreshed in the background instead.
+    """
+    MIN_BUDGET = 0.5  # seconds; below this don't even try a live fetch when stale data exists
+
+    def __init__(self, breaker, max_workers=2):
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"revalidate-{breaker.name}")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def fetch(self, cache, key, fetch, ttl=None, deadline=None):
+        """fetch(deadline) returns the value or None; it may raise on upstream failure."""
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        stale = cache.get(key, allow_stale=True)
+        if stale is not None and (self.breaker.is_open or (deadline and deadline.remaining() < self.MIN_BUDGET)):
+            self._refresh(cache, key, fetch, ttl)
+            return stale
+
+        try:
+            value = fetch(deadline)
+        except (UpstreamUnavailable, requests.RequestException, ValueError):
+            value = None
+        if value is None:
+            if stale is not None:
+                self._refresh(cache, key, fetch, ttl)
+            return stale
+
+        cache.set(key, value, ttl)
+        return value
+
+    def _refresh(self, cache, key, fetch, ttl):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        def run():
+            try:
+                value = fetch(None)
+                if value is not None:
+                    cache.set(key, value, ttl)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(run)
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+
+POINTS_KEY = b'"points":['
+
+
+class RouteStreamParser:
+    """
+    Incremental parser for TomTom calculateRoute responses that never builds per-point dicts.
+    Everything outside the "points" arrays (summary, sections, ...) is kept as raw bytes
+    and parsed with json at the end, so that part stays small. Each compact '"points":['
+    array is converted to floats chunk by chunk as it streams in, then attached to its leg
+    as a (n, 2) lat/lon array under "points_array", leaving "points" empty. Arrays written
+    with other spacing are not captured and stay in "points" as ordinary dicts.
+    """
+    REF_KEY = "_points_ref"
+
+    def __init__(self):
+        self._skeleton = bytearray()
+        self._pending = b""
+        self._in_points = False
+        self._values = []
+        self._point_arrays = []
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        self._pending = b""
+        pos = 0
+        while pos < len(data):
+            if self._in_points:
+                # Points are flat {"latitude":..,"longitude":..} objects, so the first "]" ends the array
+                end = data.find(b"]", pos)
+                if end == -1:
+                    last = data.rfind(b"}", pos)
+                    if last != -1:
+                        self._numbers(data[pos:last + 1])
+                        pos = last + 1
+                    self._pending = data[pos:]
+                    return
+                self._numbers(data[pos:end])
+                values = np.concatenate(self._values) if self._values else np.empty(0)
+                self._point_arrays.append(values[:len(values) // 2 * 2].reshape(-1, 2))
+                self._values = []
+                self._in_points = False
+                # Tag the leg with the captured array's index so result() can find it
+                self._skeleton += b']' + f',"{self.REF_KEY}":{len(self._point_arrays) - 1}'.encode()
+                pos = end + 1
+            else:
+                start = data.find(POINTS_KEY, pos)
+                if start == -1:
+                    # Hold back a possible partial key at the end of the chunk
+                    safe = max(pos, len(data) - len(POINTS_KEY) + 1)
+                    self._skeleton += data[pos:safe]
+                    self._pending = data[safe:]
+                    return
+                self._skeleton += data[pos:start + len(POINTS_KEY)]
+                self._in_points = True
+                pos = start + len(POINTS_KEY)
+
+    def _numbers(self, block):
+        text = block.replace(b'"latitude":', b"").replace(b'"longitude":', b"").translate(None, b"{} \t\r\n")
+        text = text.strip(b",")
+        if text:
+            self._values.append(np.fromstring(text, sep=","))
+
+    def result(self):
+        """The parsed response; legs whose points were captured get a compact "points_array"."""
+        if self._in_points:
+            raise ValueError("Truncated route response")
+        data = json.loads(bytes(self._skeleton + self._pending))
+        for route in data.get("routes", []):
+            for leg in route.get("legs", []):
+                ref = leg.pop(self.REF_KEY, None)
+                if ref is not None:
+                    leg["points_array"] = self._point_arrays[ref]
+        return data
+
+
+def parse_route_stream(resp, chunk_size=65536):
+    """Parse a streamed (stream=True) routing response with RouteStreamParser."""
+    parser = RouteStreamParser()
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            parser.feed(chunk)
+    finally:
+        resp.close()
+    return parser.result()
@@ -1,11 +1,21 @@
 import requests
 import random
+import threading
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import os
 
+from cache import TTLCache
+from congestion import LEVEL_REASONS, analyze_sections, arrival_distribution, congestion_level, congestion_profile, laps_risk, top_sections
+from estimator import RouteEstimator, haversine_km
+from gazetteer import Gazetteer
+from itinerary import plan_visit_order
+from predictor import DelayPredictor, corridor_key
+from route_parser import parse_route_stream
+from resilience import Revalidator, UpstreamUnavailable, get_breaker
+
 class FuelService:
     def __init__(self, api_key=None):
         self.api_key = api_key
@@ -42,42 +52,119 @@ class FuelService:
             "ev": 9.50  # Cost per kWh
         }
 
+    def bulk_trip_costs(self, mileages, fuel_types, distances_km, city="Delhi"):
+        """
+        Fuel and cost for every (vehicle, trip) pair in one vectorized pass.
+        Args:
+            mileages (list[float]): km per unit for each vehicle
+            fuel_types (list[str]): fuel type for each vehicle
+            distances_km (list[float]): distance of each trip
+        Returns:
+            (fuel, cost, unit_prices) where fuel and cost are (vehicles x trips) arrays.
+        """
+        prices = self.get_fuel_prices(city)
+        unit_prices = np.array([prices.get(f, prices['petrol']) for f in fuel_types], dtype=float)
+        mileages = np.asarray(mileages, dtype=float)
+        distances = np.asarray(distances_km, dtype=float)
+
+        # (V, 1) against (1, T) broadcasts to the full V x T matrix
+        fuel = distances[np.newaxis, :] / mileages[:, np.newaxis]
+        cost = fuel * unit_prices[:, np.newaxis]
+        return fuel, cost, unit_prices
+
 class TomTomTrafficService:
     """
     Wrapper for TomTom Traffic API.
     """
-    def __init__(self, api_key=None):
+    MATRIX_URL = "https://api.tomtom.com/routing/matrix/2"
+    MAX_SYNC_MATRIX_CELLS = 200  # Larger matrices fall back to concurrent route calls
+    MAX_NAMED_HOTSPOTS = 5  # Congested sections per route/sweep that get a reverse-geocoded name
+
+    def __init__(self, api_key=None, max_upstream=None):
         # Use Config if available, otherwise fallback to env or placeholder
         try:
             from config import Config
             self.api_key = api_key or Config.TOMTOM_API_KEY
+            max_upstream = max_upstream or Config.UPSTREAM_CONCURRENCY
+            self.lean_parsing = Config.ROUTE_LEAN_PARSING
         except Exception:
             self.api_key = api_key
-        self.base_url = "https://api.tomtom.com/traffic/services/4/flowSegment"
+            self.lean_parsing = True
+        # Global cap on in-flight TomTom calls, shared by every request and batch worker
+        self._upstream = threading.BoundedSemaphore(max_upstream or 8)
+        self.base_url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
+        # Place coordinates rarely change; anything carrying traffic expires per _cache_ttl()
+        self._geocode_cache = TTLCache(ttl=24 * 3600, max_entries=5000)
+        self._reverse_cache = TTLCache(ttl=24 * 3600, max_entries=20000)
+        self._holiday_cache = TTLCache(ttl=24 * 3600, max_entries=20)
+        self._summary_cache = TTLCache(ttl=600, max_entries=20000)
+        self._laps_cache = TTLCache(ttl=600, max_entries=20000)
+        self._route_cache = TTLCache(ttl=600, max_entries=300)  # full responses incl. points
+        # Common city names resolve locally; the Search API is only the fallback
+        self.gazetteer = Gazetteer()
+        # Learns per-region road circuity and speed from every route we fetch
+        self.estimator = RouteEstimator()
+        # Set by app.py: a trained DelayPredictor answers sweeps for dates more than
+        # prediction_horizon_days ahead, and on_route_summary logs fetched summaries for it
+        self.predictor = None
+        self.prediction_horizon_days = 3
+        self.on_route_summary = None
+
+        # Fail fast once a provider is degraded, serving stale cache entries meanwhile
+        self.breaker = get_breaker("tomtom")
+        self.nager_breaker = get_breaker("nager")
+        self._revalidator = Revalidator(self.breaker)
+        self._nager_revalidator = Revalidator(self.nager_breaker)
+
+    def _get(self, url, deadline=None, **kwargs):
+        return self.breaker.call(requests.get, url, deadline=deadline, semaphore=self._upstream, **kwargs)
+
+    def _post(self, url, deadline=None, **kwargs):
+        return self.breaker.call(requests.post, url, deadline=deadline, semaphore=self._upstream, **kwargs)
 
     def get_traffic(self, origin, destination):
         """Fetch traffic flow between two lat,lon points.
+        The Flow Segment Data API reports the road segment nearest one point, so the
+        origin, midpoint and destination are probed and their speeds averaged.
         Args:
             origin (str): "lat,lon"
             destination (str): "lat,lon"
         Returns:
-            dict with travelTimeSec and congestionLevel or error.
+            dict with travelTimeSec and congestionLevel or error. raw["flowSegmentData"]
+            holds the averaged currentSpeed / freeFlowSpeed and raw["probes"] each reading.
         """
-        url = f"{self.base_url}/{origin}/{destination}/json"
-        params = {"key": self.api_key}
         try:
-            resp = requests.get(url, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-            flow = data.get("flowSegmentData", {})
-            travel_time = flow.get("currentTravelTime", 0)
-            speed = flow.get("currentSpeed", 0)
-            congestion = max(0, min(100, int(100 - speed))) if isinstance(speed, (int, float)) else 0
-            return {"travelTimeSec": travel_time, "congestionLevel": congestion, "raw": data}
+            (lat1, lon1), (lat2, lon2) = ([float(x) for x in p.split(",")] for p in (origin, destination))
+        except (AttributeError, ValueError):
+            return {"error": "origin and destination must be \"lat,lon\""}
+
+        probes = []
+        try:
+            for lat, lon in ((lat1, lon1), ((lat1 + lat2) / 2, (lon1 + lon2) / 2), (lat2, lon2)):
+                resp = self._get(self.base_url, params={"key": self.api_key, "point": f"{lat},{lon}"}, timeout=10)
+                if resp.status_code == 200:
+                    probes.append(resp.json().get("flowSegmentData", {}))
         except Exception as e:
-            return {"error": str(e)}
+            if not probes:
+                return {"error": str(e)}
+
+        speeds = [p["currentSpeed"] for p in probes if isinstance(p.get("currentSpeed"), (int, float))]
+        if not speeds:
+            return {"error": "No flow data for this corridor"}
+        free_flow = [p["freeFlowSpeed"] for p in probes if isinstance(p.get("freeFlowSpeed"), (int, float))]
+        speed = sum(speeds) / len(speeds)
+        free_flow_speed = sum(free_flow) / len(free_flow) if free_flow else None
+        congestion = int(max(0, min(100, 100 * (1 - speed / free_flow_speed)))) if free_flow_speed else 0
+        return {
+            "travelTimeSec": sum(p.get("currentTravelTime", 0) for p in probes),
+            "congestionLevel": congestion,
+            "raw": {
+                "flowSegmentData": {"currentSpeed": round(speed, 1), "freeFlowSpeed": free_flow_speed},
+                "probes": probes
+            }
+        }
 
-    def get_route(self, origin, destination, depart_at=None, find_alt=False, mileage=15.0, incidents=True):
+    def get_route(self, origin, destination, depart_at=None, find_alt=False, mileage=15.0, incidents=True, deadline=None):
         """Calculate route between two points.
         Args:
             origin (str): "City Name"
@@ -86,14 +173,15 @@ class TomTomTrafficService:
             find_alt (bool): Whether to find alternative routes
             mileage (float): Vehicle mileage for fuel calculation
             incidents (bool): Whether to fetch traffic incidents
+            deadline (Deadline): Optional end-to-end time budget
         """
         # 1. Geocode Origin
-        start_coords = self._geocode(origin)
+        start_coords = self._geocode(origin, deadline=deadline)
         if not start_coords:
             return {"error": f"Could not find location: {origin}"}
             
         # 2. Geocode Destination
-        end_coords = self._geocode(destination)
+        end_coords = self._geocode(destination, deadline=deadline)
         if not end_coords:
             return {"error": f"Could not find location: {destination}"}
             
@@ -112,10 +200,21 @@ class TomTomTrafficService:
         if find_alt:
             params["maxAlternatives"] = 1
         
-        try:
-            resp = requests.get(url, params=params, timeout=10)
+        def fetch(deadline):
+            resp = self._get(url, params=params, timeout=10, deadline=deadline)
             resp.raise_for_status()
             data = resp.json()
+            if data.get("routes"):
+                self._record_summary(locations, depart_at, data["routes"][0].get("summary", {}))
+            return data
+
+        try:
+            data = self._revalidator.fetch(
+                self._route_cache, (locations, depart_at, find_alt), fetch,
+                ttl=self._cache_ttl(depart_at), deadline=deadline
+            )
+            if data is None:
+                return {"error": "Routing service is unavailable right now, please try again shortly"}
             
             routes = data.get("routes", [])
             if not routes:
@@ -129,19 +228,8 @@ class TomTomTrafficService:
                 
                 # Traffic Classification Logic: Low, Moderate, Heavy, Critical
                 delay_ratio = travel_time_seconds / no_traffic_time_seconds if no_traffic_time_seconds > 0 else 1
-                
-                if delay_ratio < 1.15:
-                    traffic_level = "Low"
-                    reason = "Traffic is flowing smoothly with minimal delays."
-                elif delay_ratio < 1.4:
-                    traffic_level = "Moderate"
-                    reason = "Moderate traffic detected, possibly due to regular urban flow or minor bottlenecks."
-                elif delay_ratio < 1.8:
-                    traffic_level = "Heavy"
-                    reason = "Heavy congestion detected. High volume of vehicles expected."
-                else:
-                    traffic_level = "Critical"
-                    reason = "Critical delays detected. Major road incidents or severe gridlock possible."
+                traffic_level = congestion_level(delay_ratio)
+                reason = LEVEL_REASONS[traffic_level]
 
                 # Format Duration
                 hours = travel_time_seconds // 3600
@@ -153,22 +241,13 @@ class TomTomTrafficService:
                 travel_time_hours = travel_time_seconds / 3600
                 avg_speed = round(distance_km / travel_time_hours, 1) if travel_time_hours > 0 else 0
                 
-                # Extract Jam Spots (Incidents)
+                # Extract Jam Spots: all congested sections at once, names only for the worst few
+                sections = analyze_sections([route])
                 jam_spots = []
-                sections = route.get("sections", [])
-                for section in sections:
-                    if section.get("sectionType") == "TRAFFIC":
-                        # If a section is marked as traffic, try to get its location
-                        start_idx = section.get("startPointIndex")
-                        end_idx = section.get("endPointIndex")
-                        if start_idx is not None and end_idx is not None:
-                            legs = route.get("legs", [])
-                            if legs:
-                                points = legs[0].get("points", [])
-                                mid_pt = points[(start_idx + end_idx) // 2]
-                                location_name = self._reverse_geocode(mid_pt['latitude'], mid_pt['longitude'])
-                                if location_name:
-                                    jam_spots.append(location_name)
+                for i in top_sections(sections, self.MAX_NAMED_HOTSPOTS):
+                    location_name = self._reverse_geocode(float(sections["lat"][i]), float(sections["lon"][i]), deadline=deadline)
+                    if location_name and location_name not in jam_spots:
+                        jam_spots.append(location_name)
 
                 # Get a midpoint for 'via' point description and Road Type
                 via_point = "N/A"
@@ -179,7 +258,7 @@ class TomTomTrafficService:
                     if len(points) > 2:
                         mid_idx = len(points) // 2
                         mid_point = points[mid_idx]
-                        via_info = self._reverse_geocode(mid_point['latitude'], mid_point['longitude'])
+                        via_info = self._reverse_geocode(mid_point['latitude'], mid_point['longitude'], deadline=deadline)
                         via_point = via_info if via_info else "Main Link"
                     
                     # Heuristic for road type: search for common highway markers in via_point or length
@@ -198,7 +277,8 @@ class TomTomTrafficService:
                     "via_point": via_point,
                     "road_type": road_type,
                     "delay_ratio": round(delay_ratio, 2),
-                    "jam_spots": list(set(jam_spots))[:3] # Unique and capped
+                    "jam_spots": jam_spots[:3], # Unique and capped
+                    "congestion_profile": congestion_profile(sections)
                 }
 
             primary = process_route(routes[0])
@@ -233,54 +313,525 @@ class TomTomTrafficService:
             return {
                 "primary": primary,
                 "alternative": alternative,
-                "date_insights": self.get_date_insights(depart_at.split('T')[0] if depart_at else None),
+                "date_insights": self.get_date_insights(depart_at.split('T')[0] if depart_at else None, deadline=deadline),
+                "corridor": {"origin": f"{start_coords['lat']},{start_coords['lon']}",
+                             "destination": f"{end_coords['lat']},{end_coords['lon']}"},
                 "raw": data
             }
         except Exception as e:
             return {"error": str(e)}
 
-    def _geocode(self, query):
-        """Geocode a place name to lat,lon using TomTom Search API."""
+    def _geocode(self, query, deadline=None):
+        """Geocode a place name to lat,lon: bundled gazetteer first, then TomTom Search API."""
+        if not isinstance(query, str) or not query.strip():
+            return None
+        place = self.gazetteer.lookup(query)
+        if place:
+            return {"lat": place["lat"], "lon": place["lon"]}
+
         url = f"https://api.tomtom.com/search/2/search/{requests.utils.quote(query)}.json"
         params = {
             "key": self.api_key,
             "limit": 1
         }
-        try:
-            resp = requests.get(url, params=params, timeout=10)
+
+        def fetch(deadline):
+            resp = self._get(url, params=params, timeout=10, deadline=deadline)
             resp.raise_for_status()
-            data = resp.json()
-            results = data.get("results", [])
+            results = resp.json().get("results", [])
             if results:
                 pos = results[0].get("position", {})
                 return {"lat": pos.get("lat"), "lon": pos.get("lon")}
             return None
+
+        try:
+            return self._revalidator.fetch(self._geocode_cache, query.strip().lower(), fetch, deadline=deadline)
         except:
             return None
 
-    def _reverse_geocode(self, lat, lon):
+    def _reverse_geocode(self, lat, lon, deadline=None):
         """Reverse geocode coordinates to a place/street name."""
         url = f"https://api.tomtom.com/search/2/reverseGeocode/{lat},{lon}.json"
         params = {"key": self.api_key}
+
+        def fetch(deadline):
+            resp = self._get(url, params=params, timeout=5, deadline=deadline)
+            if resp.status_code != 200:
+                return None
+            addresses = resp.json().get("addresses", [])
+            if addresses:
+                addr = addresses[0].get("address", {})
+                # Prioritize more specific local areas
+                return addr.get("municipalitySubdivision") or \
+                       addr.get("neighbourhood") or \
+                       addr.get("municipality") or \
+                       addr.get("streetName") or \
+                       addr.get("freeformAddress")
+            return None
+
+        # ~100 m grid: nearby points along a jam resolve to the same name
+        cache_key = (round(lat, 3), round(lon, 3))
+        try:
+            return self._revalidator.fetch(self._reverse_cache, cache_key, fetch, deadline=deadline)
+        except:
+            return None
+
+    def _departure_datetime(self, target_date, hour, minute=0):
+        """Departure time on target_date ("YYYY-MM-DD"), or the next occurrence of hour:minute if no date."""
+        selected_date = None
+        if target_date:
+            try:
+                selected_date = datetime.strptime(target_date, "%Y-%m-%d").date()
+            except:
+                selected_date = None
+
+        if selected_date:
+            return datetime.combine(selected_date, datetime.min.time()).replace(hour=hour, minute=minute)
+        now = datetime.now()
+        check_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if check_time < now:
+            check_time += timedelta(days=1)
+        return check_time
+
+    @staticmethod
+    def _cache_ttl(depart_at):
+        """
+        Seconds to keep traffic data for a departure. Near-term departures follow live
+        traffic and go stale quickly; predictions for later departures are kept until
+        an hour before departure (at most a day), when live traffic takes over.
+        """
+        if not depart_at:
+            return 300
         try:
-            resp = requests.get(url, params=params, timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                addresses = data.get("addresses", [])
-                if addresses:
-                    addr = addresses[0].get("address", {})
-                    # Prioritize more specific local areas
-                    name = addr.get("municipalitySubdivision") or \
-                           addr.get("neighbourhood") or \
-                           addr.get("municipality") or \
-                           addr.get("streetName") or \
-                           addr.get("freeformAddress")
-                    return name
+            lead = (datetime.strptime(depart_at, "%Y-%m-%dT%H:%M:%S") - datetime.now()).total_seconds()
+        except ValueError:
+            return 300
+        if lead < 2 * 3600:
+            return 300
+        return min(lead - 3600, 24 * 3600)
+
+    def _route_summary(self, locations, depart_at=None, deadline=None):
+        """
+        Travel time, no-traffic time and length of the fastest route for one departure.
+        Cached per (locations, depart_at) so sweeps and matrix builds share upstream calls.
+        """
+        url = f"https://api.tomtom.com/routing/1/calculateRoute/{locations}/json"
+        params = {
+            "key": self.api_key,
+            "traffic": "true",
+            "computeTravelTimeFor": "all",
+            "routeRepresentation": "summaryOnly"
+        }
+        if depart_at:
+            params["departAt"] = depart_at
+
+        def fetch(deadline):
+            resp = self._get(url, params=params, timeout=5, deadline=deadline)
+            if resp.status_code != 200:
+                return None
+            routes = resp.json().get("routes", [])
+            if not routes:
+                return None
+            summary = routes[0].get("summary", {})
+            self._record_summary(locations, depart_at, summary)
+            return {
+                "travel_time": summary.get("travelTimeInSeconds", 0),
+                "no_traffic_time": summary.get("noTrafficTravelTimeInSeconds", 0),
+                "length": summary.get("lengthInMeters", 0)
+            }
+
+        try:
+            return self._revalidator.fetch(
+                self._summary_cache, (locations, depart_at), fetch,
+                ttl=self._cache_ttl(depart_at), deadline=deadline
+            )
+        except:
             return None
+
+    def _arrive_at_summary(self, locations, arrive_at, deadline=None):
+        """
+        Fastest route that arrives at arrive_at, routed backwards from the arrival by TomTom.
+        Like _route_summary, plus the departure_time ("YYYY-MM-DDTHH:MM:SS", local) it implies.
+        """
+        url = f"https://api.tomtom.com/routing/1/calculateRoute/{locations}/json"
+        params = {
+            "key": self.api_key,
+            "traffic": "true",
+            "computeTravelTimeFor": "all",
+            "routeRepresentation": "summaryOnly",
+            "arriveAt": arrive_at
+        }
+
+        def fetch(deadline):
+            resp = self._get(url, params=params, timeout=5, deadline=deadline)
+            if resp.status_code != 200:
+                return None
+            routes = resp.json().get("routes", [])
+            if not routes or not routes[0].get("summary", {}).get("departureTime"):
+                return None
+            summary = routes[0]["summary"]
+            departure_time = summary["departureTime"][:19]  # drop the UTC offset; times are local
+            self._record_summary(locations, departure_time, summary)
+            return {
+                "travel_time": summary.get("travelTimeInSeconds", 0),
+                "no_traffic_time": summary.get("noTrafficTravelTimeInSeconds", 0),
+                "length": summary.get("lengthInMeters", 0),
+                "departure_time": departure_time
+            }
+
+        try:
+            return self._revalidator.fetch(
+                self._summary_cache, (locations, "arrive", arrive_at), fetch,
+                ttl=self._cache_ttl(arrive_at), deadline=deadline
+            )
         except:
             return None
 
-    def get_date_insights(self, date_str=None):
+    def _record_summary(self, locations, depart_at, summary):
+        """Learn from a freshly fetched route summary: estimator factors and predictor training data."""
+        start, end = ({"lat": float(lat), "lon": float(lon)}
+                      for lat, lon in (p.split(",") for p in locations.split(":")))
+        length_km = summary.get("lengthInMeters", 0) / 1000
+        travel_time = summary.get("travelTimeInSeconds", 0)
+        self.estimator.observe(start, end, length_km, travel_time)
+        if self.on_route_summary:
+            try:
+                depart = datetime.strptime(depart_at, "%Y-%m-%dT%H:%M:%S") if depart_at else datetime.now()
+                self.on_route_summary(corridor_key(start, end), depart, length_km, travel_time,
+                                      summary.get("noTrafficTravelTimeInSeconds", 0))
+            except Exception:
+                pass
+
+    def _predicted_summaries(self, start, end, hours, target_date, deadline=None):
+        """
+        Route summaries {hour: summary} from the delay predictor for a date beyond the
+        live-traffic horizon, or None when live traffic should be used instead.
+        """
+        if not self.predictor or not self.predictor.ready or not target_date:
+            return None
+        try:
+            day = datetime.strptime(target_date, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+        if (day - datetime.now().date()).days <= self.prediction_horizon_days:
+            return None
+
+        corridor = corridor_key(start, end)
+        info = self.predictor.corridor(corridor)
+        if info:
+            length_km, free_sec = info["length_km"], info["free_sec"]
+        else:
+            estimate = self.estimator.estimate(start, end)
+            length_km, free_sec = estimate["distance_km"], estimate["duration_sec"]
+        holiday = day.strftime("%Y-%m-%d") in self._holiday_dates(day.year, deadline=deadline)
+        ratios, _ = self.predictor.predict(hours, day, holiday, length_km, corridor)
+        return {hour: {
+            "travel_time": int(free_sec * ratio),
+            "no_traffic_time": int(free_sec),
+            "length": int(length_km * 1000),
+            "predicted": True
+        } for hour, ratio in zip(hours, ratios.tolist())}
+
+    def get_travel_matrix(self, coords, depart_at=None, max_workers=8, deadline=None):
+        """
+        Travel time (s) and road distance (m) between every ordered pair of points.
+        Small matrices come from one Matrix Routing call; larger ones, and any cell the
+        matrix call could not fill, from concurrent cached route summaries.
+        Returns (durations, distances) as n x n arrays with inf for unreachable pairs.
+        """
+        n = len(coords)
+        durations = np.full((n, n), np.inf)
+        distances = np.full((n, n), np.inf)
+        np.fill_diagonal(durations, 0)
+        np.fill_diagonal(distances, 0)
+
+        if n * n <= self.MAX_SYNC_MATRIX_CELLS:
+            points = [{"point": {"latitude": c['lat'], "longitude": c['lon']}} for c in coords]
+            body = {
+                "origins": points,
+                "destinations": points,
+                "options": {
+                    "departAt": depart_at or "now",
+                    "routeType": "fastest",
+                    "traffic": "historical" if depart_at else "live",
+                    "travelMode": "car"
+                }
+            }
+            try:
+                resp = self._post(self.MATRIX_URL, params={"key": self.api_key}, json=body, timeout=10, deadline=deadline)
+                if resp.status_code == 200:
+                    for cell in resp.json().get("data", []):
+                        summary = cell.get("routeSummary")
+                        if summary:
+                            i, j = cell["originIndex"], cell["destinationIndex"]
+                            durations[i, j] = summary.get("travelTimeInSeconds", np.inf)
+                            distances[i, j] = summary.get("lengthInMeters", np.inf)
+            except:
+                pass
+
+        missing = [(i, j) for i in range(n) for j in range(n) if i != j and np.isinf(durations[i, j])]
+        if missing:
+            def fetch(pair):
+                a, b = coords[pair[0]], coords[pair[1]]
+                return pair, self._route_summary(f"{a['lat']},{a['lon']}:{b['lat']},{b['lon']}", depart_at, deadline=deadline)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for (i, j), summary in pool.map(fetch, missing):
+                    if summary:
+                        durations[i, j] = summary["travel_time"]
+                        distances[i, j] = summary["length"]
+        return durations, distances
+
+    def estimate_route(self, origin, destination, mileage=15.0, deadline=None):
+        """Instant approximate distance, duration and fuel between two places (no routing call)."""
+        start_coords = self._geocode(origin, deadline=deadline)
+        if not start_coords:
+            return {"error": f"Could not find location: {origin}"}
+        end_coords = self._geocode(destination, deadline=deadline)
+        if not end_coords:
+            return {"error": f"Could not find location: {destination}"}
+
+        result = self.estimator.estimate(start_coords, end_coords)
+        result["duration_formatted"] = self._format_duration(result["duration_sec"])
+        result["fuel_litres"] = round(result["distance_km"] / mileage, 2)
+        return result
+
+    def predicted_route(self, origin, destination, depart_at, mileage=15.0, deadline=None):
+        """
+        get_route-shaped result from the delay predictor for a departure beyond the
+        live-traffic horizon (no routing call), or None when get_route should be used.
+        """
+        try:
+            depart = datetime.strptime(depart_at, "%Y-%m-%dT%H:%M:%S")
+        except (TypeError, ValueError):
+            return None
+        start_coords = self._geocode(origin, deadline=deadline)
+        end_coords = self._geocode(destination, deadline=deadline)
+        if not start_coords or not end_coords:
+            return None
+        target_date = depart.strftime("%Y-%m-%d")
+        predicted = self._predicted_summaries(start_coords, end_coords, [depart.hour], target_date, deadline)
+        if not predicted:
+            return None
+
+        summary = predicted[depart.hour]
+        travel_time, no_traffic_time = summary["travel_time"], summary["no_traffic_time"]
+        delay_ratio = travel_time / no_traffic_time if no_traffic_time > 0 else 1
+        traffic_level = congestion_level(delay_ratio)
+        distance_km = summary["length"] / 1000
+        time_h = travel_time / 3600
+        primary = {
+            "distance_km": round(distance_km, 1),
+            "duration_formatted": self._format_duration(travel_time),
+            "duration_sec": travel_time,
+            "avg_speed_kmh": round(distance_km / time_h, 1) if time_h > 0 else 0,
+            "traffic_level": traffic_level,
+            "reason": LEVEL_REASONS[traffic_level],
+            "via_point": "N/A",
+            "road_type": "State Highway" if distance_km > 15 else "Local Road",
+            "delay_ratio": round(delay_ratio, 2),
+            "jam_spots": [],
+            "congestion_profile": [],
+            "fuel_litres": round(distance_km / mileage, 2),
+            "fuel_saved": 0,
+            "time_saved_sec": 0,
+            "predicted": True
+        }
+        return {
+            "primary": primary,
+            "alternative": None,
+            "date_insights": self.get_date_insights(target_date, deadline=deadline)
+        }
+
+    def estimate_matrix(self, stops, deadline=None):
+        """Approximate distance (km) and duration (s) between every pair of places."""
+        coords = []
+        for stop in stops:
+            c = self._geocode(stop, deadline=deadline)
+            if not c:
+                return {"error": f"Could not find location: {stop}"}
+            coords.append(c)
+
+        distances, durations, _ = self.estimator.estimate_matrix(coords)
+        return {
+            "stops": stops,
+            "distance_km": np.round(distances, 1).tolist(),
+            "duration_sec": durations.astype(int).tolist(),
+            "approximate": True
+        }
+
+    def plan_itinerary(self, stops, depart_time, mileage=15.0, return_to_start=False, keep_last=False, dwell_minutes=0,
+                       deadline=None):
+        """
+        Order a multi-stop trip to minimise total travel time.
+        Args:
+            stops (list[str]): place names; the first one is the starting point
+            depart_time (datetime): departure from the first stop
+            mileage (float): vehicle mileage for fuel calculation
+            return_to_start (bool): finish back at the first stop
+            keep_last (bool): keep the last stop as the final destination
+            dwell_minutes (int): time spent at each intermediate stop
+            deadline (Deadline): optional end-to-end time budget
+        """
+        # 1. Geocode every stop once
+        coords = []
+        for stop in stops:
+            c = self._geocode(stop, deadline=deadline)
+            if not c:
+                return {"error": f"Could not find location: {stop}"}
+            coords.append(c)
+
+        # 2. Full travel-time matrix for the departure time
+        depart_at = depart_time.strftime("%Y-%m-%dT%H:%M:%S")
+        durations, distances = self.get_travel_matrix(coords, depart_at=depart_at, deadline=deadline)
+
+        # 3. Visit order
+        end = 0 if return_to_start else (len(stops) - 1 if keep_last else None)
+        order = plan_visit_order(durations, start=0, end=end)
+
+        # 4. Legs, with departure times chained through the day
+        legs = []
+        clock = depart_time
+        for leg_no, (i, j) in enumerate(zip(order[:-1], order[1:])):
+            if np.isinf(durations[i, j]):
+                return {"error": f"Could not find a route from {stops[i]} to {stops[j]}"}
+            if leg_no > 0:
+                clock += timedelta(minutes=dwell_minutes)
+            duration_sec = int(durations[i, j])
+            arrive = clock + timedelta(seconds=duration_sec)
+            legs.append({
+                "from": stops[i],
+                "to": stops[j],
+                "depart_at": clock.strftime("%Y-%m-%dT%H:%M"),
+                "arrive_at": arrive.strftime("%Y-%m-%dT%H:%M"),
+                "distance_km": round(distances[i, j] / 1000, 1),
+                "duration_sec": duration_sec,
+                "duration_formatted": self._format_duration(duration_sec)
+            })
+            clock = arrive
+
+        total_km = sum(leg["distance_km"] for leg in legs)
+        total_sec = int((clock - depart_time).total_seconds())
+        return {
+            "order": [stops[i] for i in order],
+            "legs": legs,
+            "total_distance_km": round(total_km, 1),
+            "total_duration_sec": total_sec,
+            "total_duration_formatted": self._format_duration(total_sec),
+            "fuel_litres": round(total_km / mileage, 2),
+            "arrive_at": clock.strftime("%Y-%m-%dT%H:%M")
+        }
+
+    def plan_batch(self, rows, max_workers=16, progress=None, deadline=None):
+        """
+        Best departure hour for many corridors at once.
+        Each row is a dict with origin, destination, date, start_hour, end_hour and mileage.
+        Places are geocoded once across all rows and identical (route, hour) probes are
+        fetched once; all upstream calls share the service-wide concurrency cap.
+        progress: optional callback(done, total) called as probes complete.
+        """
+        # 1. Geocode each distinct place once
+        places = {r[k].strip() for r in rows for k in ("origin", "destination") if r.get(k)}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            coords = dict(zip(places, pool.map(lambda p: self._geocode(p, deadline=deadline), places)))
+
+        # 2. Work out every row's probes and deduplicate them across rows
+        row_probes = []
+        probes = set()
+        for r in rows:
+            origin = (r.get("origin") or "").strip()
+            destination = (r.get("destination") or "").strip()
+            start, end = coords.get(origin), coords.get(destination)
+            if not start or not end:
+                row_probes.append(None)
+                continue
+            locations = f"{start['lat']},{start['lon']}:{end['lat']},{end['lon']}"
+            start_hour, end_hour = r["start_hour"], r["end_hour"]
+            hours = range(start_hour, end_hour + 1) if end_hour >= start_hour else range(start_hour, 24)
+            keys = [(hour, (locations, self._departure_datetime(r.get("date"), hour).strftime("%Y-%m-%dT%H:%M:%S")))
+                    for hour in hours]
+            row_probes.append(keys)
+            probes.update(key for _, key in keys)
+
+        # 3. Run all distinct probes concurrently
+        probes = list(probes)
+        done = [0]
+        lock = threading.Lock()
+
+        def fetch(key):
+            summary = self._route_summary(*key, deadline=deadline)
+            if progress:
+                with lock:
+                    done[0] += 1
+                    progress(done[0], len(probes))
+            return summary
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            summaries = dict(zip(probes, pool.map(fetch, probes)))
+
+        # 4. Pick each row's best hour
+        results = []
+        for r, keys in zip(rows, row_probes):
+            result = {
+                "origin": r.get("origin"),
+                "destination": r.get("destination"),
+                "date": r.get("date"),
+                "start_hour": r.get("start_hour"),
+                "end_hour": r.get("end_hour")
+            }
+            if keys is None:
+                result["error"] = "Invalid locations"
+                results.append(result)
+                continue
+            best = None
+            for hour, key in keys:
+                summary = summaries.get(key)
+                if summary and (best is None or summary["travel_time"] < best[1]["travel_time"]):
+                    best = (hour, summary)
+            if best is None:
+                result["error"] = "Could not calculate best time."
+                results.append(result)
+                continue
+
+            hour, summary = best
+            distance_km = summary["length"] / 1000
+            travel_h = summary["travel_time"] / 3600
+            ratio = summary["travel_time"] / summary["no_traffic_time"] if summary["no_traffic_time"] > 0 else 1
+            result.update({
+                "best_hour": hour,
+                "avg_speed": round(distance_km / travel_h, 1) if travel_h > 0 else 0,
+                "duration_formatted": self._format_duration(summary["travel_time"]),
+                "distance_km": round(distance_km, 1),
+                "fuel_litres": round(distance_km / r.get("mileage", 15.0), 2),
+                "traffic_level": congestion_level(ratio),
+                "laps_risk": laps_risk(ratio)
+            })
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _format_duration(seconds):
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        return f"{hours} hr {minutes} mins" if hours > 0 else f"{minutes} mins"
+
+    def _holidays(self, year, country_code="IN", deadline=None):
+        """{"YYYY-MM-DD": name} public holidays from the Nager.Date API (free, no key); {} if unavailable."""
+        def fetch(deadline):
+            url = f"https://date.nager.at/api/v3/PublicHolidays/{year}/{country_code}"
+            resp = self.nager_breaker.call(requests.get, url, deadline=deadline, timeout=5)
+            return resp.json() if resp.status_code == 200 else None
+
+        try:
+            holidays = self._nager_revalidator.fetch(self._holiday_cache, (year, country_code), fetch, deadline=deadline)
+        except:
+            holidays = None
+        return {h.get("date"): h.get("localName") or h.get("name") for h in holidays or []}
+
+    def _holiday_dates(self, year, deadline=None):
+        return set(self._holidays(year, deadline=deadline))
+
+    def get_date_insights(self, date_str=None, deadline=None):
         """Determine if a date is a weekday, weekend, or holiday using Nager.Date API."""
         if not date_str:
             target_date = datetime.now()
@@ -297,23 +848,7 @@ class TomTomTrafficService:
         else:
             impact = "Standard office-hour congestion patterns."
 
-        # Fetch Real Holidays using Nager.Date API (Free, no key)
-        # We'll use India (IN) as default since the project seems to reference it
-        country_code = "IN"
-        year = target_date.year
-        holiday_name = None
-        
-        try:
-            url = f"https://date.nager.at/api/v3/PublicHolidays/{year}/{country_code}"
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                holidays = resp.json()
-                for h in holidays:
-                    if h.get("date") == target_date.strftime("%Y-%m-%d"):
-                        holiday_name = h.get("localName") or h.get("name")
-                        break
-        except:
-            pass
+        holiday_name = self._holidays(target_date.year, deadline=deadline).get(target_date.strftime("%Y-%m-%d"))
         
         if holiday_name:
             return {
@@ -330,12 +865,14 @@ class TomTomTrafficService:
             "impact": impact
         }
 
-    def find_best_departure_time(self, origin, destination, start_hour, end_hour, target_date=None):
+    def find_best_departure_time(self, origin, destination, start_hour, end_hour, target_date=None, progress=None,
+                                 deadline=None):
         """
         Find the best departure time using real TomTom Routing API traffic predictions.
+        progress: optional callback(done, total) called after each hour is checked.
         """
-        start_coords = self._geocode(origin)
-        end_coords = self._geocode(destination)
+        start_coords = self._geocode(origin, deadline=deadline)
+        end_coords = self._geocode(destination, deadline=deadline)
         
         if not start_coords or not end_coords:
             return None, 0, "Unknown"
@@ -361,6 +898,9 @@ class TomTomTrafficService:
              hours_to_check = range(start_hour, end_hour + 1)
         else:
              hours_to_check = range(start_hour, 24)
+
+        # Far-off dates are answered by the delay predictor in one call
+        predicted = self._predicted_summaries(start_coords, end_coords, list(hours_to_check), target_date, deadline)
         
         for hour in hours_to_check:
             if selected_date:
@@ -371,52 +911,233 @@ class TomTomTrafficService:
                     check_time += timedelta(days=1)
                 
             depart_at = check_time.strftime("%Y-%m-%dT%H:%M:%S")
-            url = f"https://api.tomtom.com/routing/1/calculateRoute/{locations}/json"
-            params = {
-                "key": self.api_key,
-                "traffic": "true",
-                "departAt": depart_at,
-                "computeTravelTimeFor": "all",
-                "sectionType": "traffic"
-            }
-            
-            try:
-                resp = requests.get(url, params=params, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    routes = data.get("routes", [])
-                    if routes:
-                        summary = routes[0].get("summary", {})
-                        travel_time = summary.get("travelTimeInSeconds", 0)
-                        no_traffic_time = summary.get("noTrafficTravelTimeInSeconds", 0)
-                        length = summary.get("lengthInMeters", 0)
-                        
-                        if travel_time < min_travel_time:
-                            min_travel_time = travel_time
-                            best_hour = hour
-                            dist_km = length / 1000
-                            time_h = travel_time / 3600
-                            best_avg_speed = round(dist_km / time_h, 1) if time_h > 0 else 0
-                            
-                        # Capture traffic level for the first hour checked (start of window)
-                        if hour == start_hour:
-                            ratio = travel_time / no_traffic_time if no_traffic_time > 0 else 1
-                            if ratio < 1.15: current_traffic_level = "Low"
-                            elif ratio < 1.4: current_traffic_level = "Moderate"
-                            elif ratio < 1.8: current_traffic_level = "Heavy"
-                            else: current_traffic_level = "Critical"
-            except:
+            # Only the summary is needed here, and it may already be cached (or pre-warmed)
+            if predicted:
+                summary = predicted[hour]
+            else:
+                summary = self._route_summary(locations, depart_at, deadline=deadline)
+            if progress:
+                progress(hour - hours_to_check.start + 1, len(hours_to_check))
+            if not summary:
                 continue
+
+            travel_time = summary["travel_time"]
+            no_traffic_time = summary["no_traffic_time"]
+            length = summary["length"]
+
+            if travel_time < min_travel_time:
+                min_travel_time = travel_time
+                best_hour = hour
+                dist_km = length / 1000
+                time_h = travel_time / 3600
+                best_avg_speed = round(dist_km / time_h, 1) if time_h > 0 else 0
+
+            # Capture traffic level for the first hour checked (start of window)
+            if hour == start_hour:
+                ratio = travel_time / no_traffic_time if no_traffic_time > 0 else 1
+                current_traffic_level = congestion_level(ratio)
                 
         return best_hour, best_avg_speed, current_traffic_level
 
-    def calculate_laps(self, origin, destination, start_hour, end_hour, target_date=None, mileage=15.0):
+    def find_best_departure_time_adaptive(self, origin, destination, start_hour, end_hour, target_date=None,
+                                          budget=12, fine_step=15, top_n=2, progress=None, deadline=None):
+        """
+        Coarse-to-fine departure search with sub-hour resolution.
+        Samples the window at a coarse step sized to half the call budget, then refines
+        around the best top_n candidates by halving the step down to fine_step minutes.
+        Returns (best minute of day, avg speed, traffic level at window start, probes used).
+        """
+        start_coords = self._geocode(origin, deadline=deadline)
+        end_coords = self._geocode(destination, deadline=deadline)
+        if not start_coords or not end_coords:
+            return None, 0, "Unknown", 0
+
+        locations = f"{start_coords['lat']},{start_coords['lon']}:{end_coords['lat']},{end_coords['lon']}"
+        first = start_hour * 60
+        last = (end_hour if end_hour >= start_hour else 23) * 60
+        budget = max(2, budget)
+        predicted = self._predicted_summaries(
+            start_coords, end_coords, list(range(start_hour, last // 60 + 1)), target_date, deadline
+        )
+
+        probed = {}
+
+        def probe(minute):
+            if minute in probed:
+                return probed[minute]
+            if len(probed) >= budget:
+                return None
+            hour, mins = divmod(minute, 60)
+            if predicted:
+                # Predictions are hourly; probes within an hour share its figure
+                probed[minute] = predicted[hour]
+            else:
+                depart_at = self._departure_datetime(target_date, hour, mins).strftime("%Y-%m-%dT%H:%M:%S")
+                probed[minute] = self._route_summary(locations, depart_at, deadline=deadline)
+            if progress:
+                progress(len(probed), budget)
+            return probed[minute]
+
+        # 1. Coarse pass: about half the budget, on a multiple of the fine step
+        span = last - first
+        coarse_slots = max(1, budget // 2 - 1)
+        coarse_step = max(fine_step, -(-span // coarse_slots // fine_step) * fine_step) if span else fine_step
+        for minute in range(first, last + 1, coarse_step):
+            probe(minute)
+        probe(last)
+
+        def travel_time(minute):
+            summary = probed.get(minute)
+            return summary["travel_time"] if summary else float('inf')
+
+        # 2. Refine around the best candidates by halving the step
+        candidates = sorted((m for m in probed if probed[m]), key=travel_time)[:top_n]
+        for best in candidates:
+            step = coarse_step // 2 // fine_step * fine_step
+            while step >= fine_step and len(probed) < budget:
+                for minute in (best - step, best + step):
+                    if first <= minute <= last:
+                        probe(minute)
+                best = min((best, best - step, best + step), key=travel_time)
+                step = step // 2 // fine_step * fine_step
+
+        valid = [m for m in probed if probed[m]]
+        if not valid:
+            return None, 0, "Unknown", len(probed)
+
+        best_minute = min(valid, key=lambda m: (travel_time(m), m))
+        summary = probed[best_minute]
+        time_h = summary["travel_time"] / 3600
+        avg_speed = round(summary["length"] / 1000 / time_h, 1) if time_h > 0 else 0
+
+        start_summary = probed.get(first)
+        traffic_level = "Low"
+        if start_summary and start_summary["no_traffic_time"] > 0:
+            traffic_level = congestion_level(start_summary["travel_time"] / start_summary["no_traffic_time"])
+        return best_minute, avg_speed, traffic_level, len(probed)
+
+    def find_latest_departure(self, origin, destination, arrive_by, target_date=None, margin_minutes=10,
+                              resolution_minutes=5, method="arrive_at", max_probes=12, deadline=None):
+        """
+        Latest departure that still arrives by arrive_by ("HH:MM" on target_date) with
+        margin_minutes to spare.
+        method "arrive_at" lets TomTom route backwards from the arrival in one call; if that
+        fails, or with method "bisection", departures are probed with departAt and the gap
+        between one that makes it and one that doesn't is halved down to resolution_minutes,
+        about log2(window / resolution) calls. Arrival time only grows with departure time,
+        so the search is exact at that resolution. Probes are snapped to the resolution grid
+        and go through the cached route summaries, so sweeps and repeat searches share them.
+        """
+        start_coords = self._geocode(origin, deadline=deadline)
+        end_coords = self._geocode(destination, deadline=deadline)
+        if not start_coords or not end_coords:
+            return {"error": "Invalid locations"}
+
+        locations = f"{start_coords['lat']},{start_coords['lon']}:{end_coords['lat']},{end_coords['lon']}"
+        by_hour, by_minute = (int(x) for x in arrive_by.split(":"))
+        target = self._departure_datetime(target_date, by_hour, by_minute) - timedelta(minutes=margin_minutes)
+
+        def result(depart, summary, method, probes):
+            travel_time = summary["travel_time"]
+            ratio = travel_time / summary["no_traffic_time"] if summary["no_traffic_time"] > 0 else 1
+            return {
+                "depart_at": depart.strftime("%Y-%m-%dT%H:%M:%S"),
+                "depart_label": depart.strftime("%H:%M"),
+                "expected_arrival": (depart + timedelta(seconds=travel_time)).strftime("%H:%M"),
+                "arrive_by": arrive_by,
+                "margin_minutes": margin_minutes,
+                "travel_time_sec": travel_time,
+                "duration_formatted": self._format_duration(travel_time),
+                "traffic_level": congestion_level(ratio),
+                "already_passed": depart < datetime.now(),
+                "method": method,
+                "probes": probes
+            }
+
+        if method == "arrive_at":
+            summary = self._arrive_at_summary(locations, target.strftime("%Y-%m-%dT%H:%M:%S"), deadline=deadline)
+            if summary:
+                depart = datetime.strptime(summary["departure_time"], "%Y-%m-%dT%H:%M:%S")
+                return result(depart, summary, "arrive_at", 1)
+
+        step = timedelta(minutes=max(1, resolution_minutes))
+        probed = {}
+
+        def snap(t):
+            return datetime.min + (t - datetime.min) // step * step
+
+        def on_time(depart):
+            """True/False whether depart arrives by target; None once out of probes or data."""
+            if depart not in probed:
+                if len(probed) >= max_probes:
+                    return None
+                probed[depart] = self._route_summary(locations, depart.strftime("%Y-%m-%dT%H:%M:%S"), deadline=deadline)
+            summary = probed[depart]
+            if not summary:
+                return None
+            return depart + timedelta(seconds=summary["travel_time"]) <= target
+
+        # 1. First guess from the instant estimate, then bracket the answer
+        guess = snap(target - timedelta(seconds=self.estimator.estimate(start_coords, end_coords)["duration_sec"]))
+        ok = on_time(guess)
+        if ok is None:
+            return {"error": "Routing service is unavailable right now, please try again shortly"}
+        if ok:
+            lo = guess
+            # Nothing leaving later than target minus the free-flow time can make it
+            hi = snap(target - timedelta(seconds=probed[guess]["no_traffic_time"])) + step
+        else:
+            hi = guess
+            lo = None
+            while lo is None:
+                late_by = guess + timedelta(seconds=probed[guess]["travel_time"]) - target
+                guess = snap(guess - late_by) - step
+                ok = on_time(guess)
+                if ok is None:
+                    return {"error": "Could not find a departure that arrives in time"}
+                if ok:
+                    lo = guess
+                else:
+                    hi = guess
+
+        # 2. Bisect between a departure that makes it (lo) and one that doesn't (hi)
+        while hi - lo > step:
+            mid = lo + (hi - lo) // step // 2 * step
+            ok = on_time(mid)
+            if ok is None:
+                break
+            if ok:
+                lo = mid
+            else:
+                hi = mid
+
+        return result(lo, probed[lo], "bisection", len(probed))
+
+    @staticmethod
+    def _hour_label(hour):
+        """12-hour format label, e.g. "9 AM"."""
+        period = "AM" if hour < 12 else "PM"
+        h12 = hour % 12
+        if h12 == 0: h12 = 12
+        return f"{h12} {period}"
+
+    @staticmethod
+    def _clock(seconds):
+        """Seconds from midnight as "HH:MM", with "+1d" once past midnight."""
+        days, rest = divmod(int(round(seconds / 60)) * 60, 24 * 3600)
+        label = f"{rest // 3600:02d}:{rest % 3600 // 60:02d}"
+        return f"{label} +{days}d" if days else label
+
+    def calculate_laps(self, origin, destination, start_hour, end_hour, target_date=None, mileage=15.0, progress=None,
+                       deadline=None, arrive_by=None):
         """
         Calculate Late Arrival Probability Score (%) for each hour in the window.
-        Risk is derived from the TomTom delay ratio.
+        Risk is derived from the TomTom delay ratio, or with arrive_by ("HH:MM" on the
+        travel date) it is the simulated probability of arriving after that time.
+        progress: optional callback(done, total) called after each hour is checked.
         """
-        start_coords = self._geocode(origin)
-        end_coords = self._geocode(destination)
+        start_coords = self._geocode(origin, deadline=deadline)
+        end_coords = self._geocode(destination, deadline=deadline)
         
         if not start_coords or not end_coords:
             return {"error": "Invalid locations"}
@@ -438,7 +1159,25 @@ class TomTomTrafficService:
         else:
              hours_to_check = range(start_hour, 24)
         
-        results = []
+        entries = []
+        predicted = self._predicted_summaries(start_coords, end_coords, list(hours_to_check), target_date, deadline)
+        if predicted:
+            # Beyond the live horizon: risk from predicted delay ratios, no hotspot detail
+            for hour in hours_to_check:
+                summary = predicted[hour]
+                entries.append({
+                    "hour": hour,
+                    "time_label": self._hour_label(hour),
+                    "delay_ratio": summary["travel_time"] / summary["no_traffic_time"] if summary["no_traffic_time"] > 0 else 1,
+                    "travel_time": summary["travel_time"],
+                    "no_traffic_time": summary["no_traffic_time"],
+                    "sections": {"lat": [], "lon": [], "delay": []},
+                    "predicted": True
+                })
+            if progress:
+                progress(len(hours_to_check), len(hours_to_check))
+            hours_to_check = []
+
         for hour in hours_to_check:
             if selected_date:
                 check_time = datetime.combine(selected_date, datetime.min.time()).replace(hour=hour)
@@ -456,75 +1195,107 @@ class TomTomTrafficService:
                 "computeTravelTimeFor": "all",
                 "sectionType": "traffic"
             }
-            
+
+            def fetch(deadline, hour=hour, params=params, depart_at=depart_at):
+                # Only the summary and the worst sections are kept, so stream the body and
+                # reduce each leg's points to a compact array instead of thousands of dicts
+                resp = self._get(url, params=params, timeout=5, deadline=deadline, stream=self.lean_parsing)
+                if resp.status_code != 200:
+                    resp.close()
+                    return None
+                data = parse_route_stream(resp) if self.lean_parsing else resp.json()
+                routes = data.get("routes", [])
+                if not routes:
+                    return None
+                summary = routes[0].get("summary", {})
+                self._record_summary(locations, depart_at, summary)
+                travel_time = summary.get("travelTimeInSeconds", 0)
+                no_traffic_time = summary.get("noTrafficTravelTimeInSeconds", 0)
+
+                # Keep only the worst congested sections of this hour (no names yet)
+                sections = analyze_sections(routes[:1])
+                top = top_sections(sections, self.MAX_NAMED_HOTSPOTS)
+                return {
+                    "hour": hour,
+                    "time_label": self._hour_label(hour),
+                    "delay_ratio": travel_time / no_traffic_time if no_traffic_time > 0 else 1,
+                    "travel_time": travel_time,
+                    "no_traffic_time": no_traffic_time,
+                    "sections": {k: sections[k][top].tolist() for k in ("lat", "lon", "delay")}
+                }
+
             try:
-                resp = requests.get(url, params=params, timeout=5)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    routes = data.get("routes", [])
-                    if routes:
-                        summary = routes[0].get("summary", {})
-                        travel_time = summary.get("travelTimeInSeconds", 0)
-                        no_traffic_time = summary.get("noTrafficTravelTimeInSeconds", 0)
-                        
-                        if no_traffic_time > 0:
-                            delay_ratio = travel_time / no_traffic_time
-                            # Risk mapping:
-                            # 1.0 ratio -> 0% risk
-                            # 1.5 ratio -> 50% risk
-                            # 2.0+ ratio -> 90-100% risk
-                            risk = max(0, min(100, round((delay_ratio - 1) * 100 * 1.5)))
-                        else:
-                            risk = 0
-                        
-                        # 12-hour format label
-                        period = "AM" if hour < 12 else "PM"
-                        h12 = hour % 12
-                        if h12 == 0: h12 = 12
-                        time_label = f"{h12} {period}"
-
-                        # Extract hotspots for this hour
-                        hour_hotspots = []
-                        sections = routes[0].get("sections", [])
-                        for section in sections:
-                            # TRAFFIC sections or any section with significant delay
-                            if section.get("sectionType") == "TRAFFIC" or (section.get("delayInSeconds", 0) > 30):
-                                start_idx = section.get("startPointIndex")
-                                end_idx = section.get("endPointIndex")
-                                if start_idx is not None and end_idx is not None:
-                                    points = routes[0]["legs"][0]["points"]
-                                    mid_idx = (start_idx + end_idx) // 2
-                                    mid_pt = points[min(mid_idx, len(points)-1)]
-                                    loc = self._reverse_geocode(mid_pt['latitude'], mid_pt['longitude'])
-                                    if loc and loc not in hour_hotspots:
-                                        hour_hotspots.append(loc)
-
-                        results.append({
-                            "hour": hour,
-                            "time_label": time_label,
-                            "risk": risk,
-                            "micro_jams": "Yes" if risk > 60 else "No",
-                            "jam_spots": list(hour_hotspots)[:3]
-                        })
+                entry = self._revalidator.fetch(
+                    self._laps_cache, (locations, depart_at), fetch,
+                    ttl=self._cache_ttl(depart_at), deadline=deadline
+                )
+                if entry:
+                    entries.append(entry)
             except:
                 continue
-        
-        return results
+            finally:
+                if progress:
+                    progress(hour - hours_to_check.start + 1, len(hours_to_check))
 
-    def get_monitor_data(self):
-        """Simulate monitor data for recent speeds and congestion."""
-        return {
-            "speed_drop": {
-                "detected": random.random() > 0.7,
-                "amount": random.randint(15, 30),
-                "window": "10 min",
-                "message": "Sudden drop in average speed within 10 minutes"
-            },
-            "off_peak_congestion": {
-                "detected": random.random() > 0.8,
-                "message": "Unusual congestion during non-peak hours detected"
-            }
-        }
+        if not entries:
+            return []
+
+        # Score every hour, then rank the congested sections of all hours together and
+        # reverse-geocode only the worst few distinct spots
+        risks = laps_risk([e["delay_ratio"] for e in entries])
+        owner = np.concatenate([np.full(len(e["sections"]["delay"]), n, dtype=int) for n, e in enumerate(entries)])
+        lat, lon, delay = (np.concatenate([e["sections"][k] for e in entries]) for k in ("lat", "lon", "delay"))
+        spots = list(zip(np.round(lat, 3).tolist(), np.round(lon, 3).tolist()))
+
+        names = {}
+        for i in np.argsort(-delay, kind="stable"):
+            if spots[i] in names:
+                continue
+            if len(names) >= self.MAX_NAMED_HOTSPOTS:
+                break
+            names[spots[i]] = self._reverse_geocode(float(lat[i]), float(lon[i]), deadline=deadline)
+
+        jam_spots = [[] for _ in entries]
+        for i in np.argsort(-delay, kind="stable"):
+            name = names.get(spots[i])
+            hour_spots = jam_spots[owner[i]]
+            if name and name not in hour_spots and len(hour_spots) < 3:
+                hour_spots.append(name)
+
+        results = []
+        for entry, risk, hour_spots in zip(entries, risks.tolist(), jam_spots):
+            results.append({
+                "hour": entry["hour"],
+                "time_label": entry["time_label"],
+                "risk": risk,
+                "micro_jams": "Yes" if risk > 60 else "No",
+                "jam_spots": hour_spots,
+                "predicted": entry.get("predicted", False)
+            })
+
+        if arrive_by:
+            # Probabilistic mode: the risk becomes the chance of arriving after arrive_by
+            by_hour, by_minute = (int(x) for x in arrive_by.split(":"))
+            arrive_by_sec = by_hour * 3600 + by_minute * 60
+            if arrive_by_sec <= start_hour * 3600:
+                arrive_by_sec += 24 * 3600  # an earlier clock time means the next morning
+            hours = [e["hour"] for e in entries]
+            if self.predictor and self.predictor.ready:
+                spread = self.predictor.spread(hours)
+            else:
+                spread = np.full(len(hours), DelayPredictor.DEFAULT_SPREAD)
+            on_time, p50, p90 = arrival_distribution(
+                [h * 3600 for h in hours],
+                [e["travel_time"] for e in entries],
+                [e["no_traffic_time"] or e["travel_time"] for e in entries],
+                spread, arrive_by_sec
+            )
+            for result, p_on_time, arrival_p50, arrival_p90 in zip(results, on_time.tolist(), p50.tolist(), p90.tolist()):
+                result["risk"] = int(round((1 - p_on_time) * 100))
+                result["on_time_probability"] = int(round(p_on_time * 100))
+                result["arrival_p50"] = self._clock(arrival_p50)
+                result["arrival_p90"] = self._clock(arrival_p90)
+        return results
 
 
 class WeatherService:
@@ -591,7 +1362,38 @@ class WeatherService:
         }
     }
 
-    def get_forecast(self, lat, lon, start_hour, end_hour, target_date=None):
+    FORECAST_DAYS = 16  # Open-Meteo maximum; one response answers any date in range
+
+    def __init__(self):
+        # Keyed on a ~1 km grid
+        self._forecast_cache = TTLCache(ttl=1800, max_entries=2000)
+        self.breaker = get_breaker("open-meteo")
+        self._revalidator = Revalidator(self.breaker)
+
+    def _fetch_hourly(self, lat, lon, deadline=None):
+        """
+        Raw hourly Open-Meteo forecast for a point, served from cache (stale if the
+        provider is down). Raises UpstreamUnavailable when there is nothing to serve.
+        """
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": "temperature_2m,weather_code,wind_speed_10m,relative_humidity_2m,visibility",
+            "forecast_days": self.FORECAST_DAYS,
+            "timezone": "auto"
+        }
+
+        def fetch(deadline):
+            resp = self.breaker.call(requests.get, self.BASE_URL, deadline=deadline, params=params, timeout=10)
+            resp.raise_for_status()
+            return resp.json()
+
+        data = self._revalidator.fetch(self._forecast_cache, (round(lat, 2), round(lon, 2)), fetch, deadline=deadline)
+        if data is None:
+            raise UpstreamUnavailable("Weather service is unavailable right now")
+        return data
+
+    def get_forecast(self, lat, lon, start_hour, end_hour, target_date=None, deadline=None):
         """
         Get weather forecast for a location and time window.
         target_date: optional "YYYY-MM-DD" string for a specific date (up to 16 days ahead).
@@ -600,27 +1402,14 @@ class WeatherService:
         try:
             now = datetime.now()
             
-            # Calculate how many forecast days we need
-            forecast_days = 2
             selected_date = None
             if target_date:
                 try:
                     selected_date = datetime.strptime(target_date, "%Y-%m-%d").date()
-                    days_ahead = (selected_date - now.date()).days
-                    forecast_days = max(3, min(days_ahead + 2, 16))  # Open-Meteo supports up to 16 days with extra cushion
                 except:
                     selected_date = None
             
-            params = {
-                "latitude": lat,
-                "longitude": lon,
-                "hourly": "temperature_2m,weather_code,wind_speed_10m,relative_humidity_2m,visibility",
-                "forecast_days": forecast_days,
-                "timezone": "auto"
-            }
-            resp = requests.get(self.BASE_URL, params=params, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            data = self._fetch_hourly(lat, lon, deadline=deadline)
 
             hourly = data.get("hourly", {})
             times = hourly.get("time", [])
@@ -748,3 +1537,130 @@ class WeatherService:
 
         except Exception as e:
             return {"error": str(e)}
+
+    @classmethod
+    def _classify_hour(cls, code, temp, wind, visibility):
+        """Condition for a single forecast hour, using the same overrides as get_forecast."""
+        if visibility is not None and visibility < 1000:
+            return "cold"  # fog
+        if temp is not None and temp < 10:
+            return "cold"
+        if wind is not None and wind > 40:
+            return "windy"
+        condition = cls.WMO_CONDITIONS.get(code, "sunny")
+        if condition == "sunny" and temp is not None and 15 <= temp <= 30 and (wind or 0) < 25:
+            return "pleasant"
+        return condition
+
+    def get_route_weather(self, points, depart_time, duration_sec, step_km=5, cell_deg=0.2, deadline=None):
+        """
+        Weather along a route at the time the vehicle is expected to pass each part of it.
+        The route geometry is sampled every step_km, samples are deduplicated by forecast
+        grid cell and all cells are fetched in one multi-location Open-Meteo request, so
+        the cost grows with the number of distinct cells rather than the route length.
+        Args:
+            points (list): route points as {"latitude", "longitude"} (get_route geometry)
+            depart_time (datetime): departure time
+            duration_sec (int): expected travel time, used to place each sample in time
+        """
+        if len(points) < 2:
+            return {"error": "Route has no geometry"}
+
+        # 1. Sample the polyline at fixed distances; ETA is proportional to distance
+        lat = np.array([p["latitude"] for p in points], dtype=float)
+        lon = np.array([p["longitude"] for p in points], dtype=float)
+        cum_km = np.concatenate([[0.0], np.cumsum(haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]))])
+        total_km = cum_km[-1]
+        marks = np.append(np.arange(0, total_km, step_km), total_km)
+        idx = np.minimum(np.searchsorted(cum_km, marks), len(points) - 1)
+        eta_sec = marks / total_km * duration_sec if total_km > 0 else np.zeros_like(marks)
+
+        # 2. One forecast location per grid cell
+        cells = np.stack([np.round(lat[idx] / cell_deg), np.round(lon[idx] / cell_deg)], axis=1).astype(int)
+        unique, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        centres = [(round(a * cell_deg, 3), round(b * cell_deg, 3)) for a, b in unique.tolist()]
+
+        # 3. All cells in a single request, covering only the days the trip spans
+        arrive_time = depart_time + timedelta(seconds=int(duration_sec))
+        start_date, end_date = depart_time.strftime("%Y-%m-%d"), arrive_time.strftime("%Y-%m-%d")
+        params = {
+            "latitude": ",".join(str(a) for a, _ in centres),
+            "longitude": ",".join(str(b) for _, b in centres),
+            "hourly": "temperature_2m,weather_code,wind_speed_10m,visibility",
+            "start_date": start_date,
+            "end_date": end_date,
+            "timezone": "auto"
+        }
+
+        def fetch(deadline):
+            resp = self.breaker.call(requests.get, self.BASE_URL, deadline=deadline, params=params, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+            return data if isinstance(data, list) else [data]  # a single location is not wrapped
+
+        try:
+            forecasts = self._revalidator.fetch(
+                self._forecast_cache, (tuple(centres), start_date, end_date), fetch, deadline=deadline
+            )
+        except Exception as e:
+            return {"error": str(e)}
+        if not forecasts or len(forecasts) != len(centres):
+            return {"error": "Weather service is unavailable right now"}
+
+        # 4. Match each sample with the forecast hour it is passed in
+        hour_index = [{t: i for i, t in enumerate(f.get("hourly", {}).get("time", []))} for f in forecasts]
+        samples = []
+        for k in range(len(marks)):
+            cell = inverse[k]
+            hourly = forecasts[cell].get("hourly", {})
+            eta = depart_time + timedelta(seconds=int(eta_sec[k]))
+            i = hour_index[cell].get(eta.strftime("%Y-%m-%dT%H:00"))
+            if i is None:
+                continue
+            code, temp, wind, visibility = (
+                (hourly.get(name) or [None] * (i + 1))[i]
+                for name in ("weather_code", "temperature_2m", "wind_speed_10m", "visibility")
+            )
+            samples.append({
+                "km": round(float(marks[k]), 1),
+                "eta": eta,
+                "condition": self._classify_hour(code, temp, wind, visibility),
+                "temperature": temp,
+                "wind_speed": wind
+            })
+        if not samples:
+            return {"error": "No forecast data for the trip time"}
+
+        # 5. Merge consecutive samples with the same condition into segments
+        segments = []
+        for sample in samples:
+            last = segments[-1] if segments else None
+            if last and last["condition"] == sample["condition"]:
+                last["to_km"] = sample["km"]
+                last["temps"].append(sample["temperature"])
+                continue
+            segments.append({
+                "from_km": sample["km"],
+                "to_km": sample["km"],
+                "eta": sample["eta"].strftime("%Y-%m-%dT%H:%M"),
+                "condition": sample["condition"],
+                "temps": [sample["temperature"]]
+            })
+        for segment in segments:
+            temps = [t for t in segment.pop("temps") if t is not None]
+            segment["temperature"] = round(sum(temps) / len(temps), 1) if temps else None
+            info = self.CONDITION_MESSAGES[segment["condition"]]
+            segment.update({"label": info["label"], "emoji": info["emoji"]})
+
+        alerts = [
+            f"{s['label']} around km {round(s['from_km'])}-{round(s['to_km'])} (from {s['eta'][11:]})"
+            for s in segments if s["condition"] in ("rainy", "windy", "cold")
+        ]
+        return {
+            "segments": segments,
+            "alerts": alerts,
+            "distance_km": round(float(total_km), 1),
+            "samples": len(samples),
+            "cells": len(centres)
+        }
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# test_backend.py drives a running server on localhost:5000; run it by hand against one
+collect_ignore = ["test_backend.py"]
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+# app.py builds its services at import, so point everything it writes at a scratch dir first
+_scratch = tempfile.mkdtemp(prefix="route-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_scratch, "app.db")
+os.environ["PREDICTOR_MODEL_PATH"] = os.path.join(_scratch, "delay_model.joblib")
+os.environ["BACKGROUND_LOCK_PATH"] = os.path.join(_scratch, "background.lock")
+
+
+@pytest.fixture(scope="session")
+def appmod():
+    import app
+    app.app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(appmod):
+    """A test client signed in as a fresh user."""
+    client = appmod.app.test_client()
+    client.post("/login", json={"username": uuid.uuid4().hex[:12], "password": "p", "action": "signup"})
+    return client
+
+
+@pytest.fixture
+def upstream(appmod, monkeypatch):
+    """
+    Record every outgoing requests.get/post instead of sending it. Calls fail with a
+    ConnectionError unless a test sets upstream.respond = lambda method, url, **kwargs: response.
+    """
+    import requests
+    import services
+    from resilience import BREAKERS
+
+    class Upstream:
+        calls = []
+        respond = None
+
+    def fake(method):
+        def call(url, **kwargs):
+            Upstream.calls.append((method, url, kwargs))
+            if Upstream.respond is None:
+                raise requests.ConnectionError(f"no network in tests: {url}")
+            return Upstream.respond(method, url, **kwargs)
+        return call
+
+    monkeypatch.setattr(services.requests, "get", fake("GET"))
+    monkeypatch.setattr(services.requests, "post", fake("POST"))
+    Upstream.calls = []
+    yield Upstream
+    for breaker in BREAKERS.values():
+        breaker.record_success()
@@ -6,6 +6,58 @@ function toggleAuth() {
     signupBox.classList.toggle('hidden');
 }
 
+// Conditional POSTs for route/weather/LAPS: remember each response's ETag and body
+// so repeat queries get a bodiless 304 from the server instead of the full JSON.
+// A Map keeps insertion order, so re-inserting on use makes the first key the least recent.
+const RESPONSE_CACHE_MAX = 50;
+const responseCache = new Map();
+async function fetchCached(url, payload) {
+    const body = JSON.stringify(payload);
+    const key = `${url} ${body}`;
+    const cached = responseCache.get(key);
+    const headers = { 'Content-Type': 'application/json' };
+    if (cached) headers['If-None-Match'] = cached.etag;
+
+    const res = await fetch(url, { method: 'POST', headers, body });
+    if (res.status === 304 && cached) {
+        responseCache.delete(key);
+        responseCache.set(key, cached);
+        return new Response(cached.text, { status: 200, headers: { 'Content-Type': 'application/json' } });
+    }
+    const etag = res.headers.get('ETag');
+    if (res.ok && etag) {
+        responseCache.delete(key);
+        responseCache.set(key, { etag, text: await res.clone().text() });
+        while (responseCache.size > RESPONSE_CACHE_MAX) {
+            responseCache.delete(responseCache.keys().next().value);
+        }
+    } else if (cached) {
+        responseCache.delete(key);
+    }
+    return res;
+}
+
+// City suggestions for the location fields (served from the local gazetteer)
+const placeSuggestions = document.getElementById('place-suggestions');
+if (placeSuggestions) {
+    document.querySelectorAll('input[list="place-suggestions"]').forEach(input => {
+        input.addEventListener('input', async () => {
+            const q = input.value.trim();
+            if (q.length < 2) return;
+            try {
+                const res = await fetch(`/api/autocomplete?q=${encodeURIComponent(q)}`);
+                if (!res.ok) return;
+                const places = await res.json();
+                placeSuggestions.innerHTML = places
+                    .map(p => `<option value="${p.name}, ${p.state}"></option>`)
+                    .join('');
+            } catch (err) {
+                console.error(err);
+            }
+        });
+    });
+}
+
 // Handle Login
 const loginForm = document.getElementById('login-form');
 if (loginForm) {
@@ -180,6 +232,8 @@ if (plannerForm) {
         const vehicleId = vehicleEl ? vehicleEl.value : null;
         const startTime = document.getElementById('plan-start-time').value;
         const endTime = document.getElementById('plan-end-time').value;
+        const arriveByEl = document.getElementById('plan-arrive-by');
+        const arriveBy = arriveByEl ? arriveByEl.value : '';
 
         if (!start || !end) {
             alert("Please enter start and destination.");
@@ -191,11 +245,7 @@ if (plannerForm) {
         let durationText = "Calculating...";
 
         try {
-            const routeRes = await fetch('/api/route', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ origin: start, destination: end })
-            });
+            const routeRes = await fetchCached('/api/route', { origin: start, destination: end });
             const routeData = await routeRes.json();
 
             if (routeRes.ok) {
@@ -211,9 +261,10 @@ if (plannerForm) {
                 }
 
                 await fetchPrediction(startTime, endTime, distanceText, durationText, start, end, planDate, vehicleId);
+                if (arriveBy) await fetchLatestDeparture(start, end, planDate, arriveBy);
                 // Also fetch weather and LAPS for the travel window
                 await fetchWeather(start, end, startTime, endTime, planDate);
-                await fetchLAPS(start, end, startTime, endTime, planDate);
+                await fetchLAPS(start, end, startTime, endTime, planDate, arriveBy);
             } else {
                 alert(routeData.error || "Failed to calculate route");
             }
@@ -306,11 +357,24 @@ async function fetchPrediction(startTime, endTime, distanceText, durationText, s
                     jamHtml = `<div style="font-size: 0.75rem; color: #9a3412; margin-top: 0.2rem;"><i class="fas fa-exclamation-triangle"></i> Jams at: ${route.jam_spots.join(', ')}</div>`;
                 }
 
+                // Congestion profile: where along the route the congested stretches are
+                let profileHtml = '';
+                if (route.congestion_profile && route.congestion_profile.length > 0 && route.distance_km > 0) {
+                    const levelColors = { Low: '#22c55e', Moderate: '#f59e0b', Heavy: '#f97316', Critical: '#ef4444' };
+                    const bars = route.congestion_profile.map(seg => {
+                        const left = Math.min(100, seg.from_km / route.distance_km * 100);
+                        const width = Math.max(0.5, (seg.to_km - seg.from_km) / route.distance_km * 100);
+                        return `<div title="${seg.level}: +${Math.round(seg.delay_sec / 60)} min at km ${seg.from_km}" style="position: absolute; top: 0; bottom: 0; left: ${left}%; width: ${width}%; background: ${levelColors[seg.level] || '#f59e0b'};"></div>`;
+                    }).join('');
+                    profileHtml = `<div style="position: relative; height: 6px; margin-top: 0.4rem; border-radius: 3px; background: rgba(34, 197, 94, 0.3); overflow: hidden;">${bars}</div>`;
+                }
+
                 return `
                 <div class="traffic-alt" style="margin-top: 0.5rem; ${!isPrimary ? 'border-top: 1px dashed var(--glass-border); padding-top: 0.5rem;' : ''}">
                     <strong><i class="fas ${isPrimary ? 'fa-check-circle' : 'fa-directions'}"></i> ${isPrimary ? 'Optimal Route' : 'Alternative Route'}</strong><br>
                     <span>Via: ${route.via_point}${roadType}</span>
                     ${jamHtml}
+                    ${profileHtml}
                     <div class="route-stats-row" style="display: flex; gap: 1rem; margin-top: 0.4rem; font-size: 0.85rem;">
                         <div class="route-stat-item" style="color: ${fuelColor};">
                             <i class="fas fa-droplet"></i> ${Math.abs(fuelSaved).toFixed(1)}L <i class="fas ${fuelIcon}"></i>
@@ -383,11 +447,7 @@ async function fetchPrediction(startTime, endTime, distanceText, durationText, s
 // Weather Engine Logic
 async function fetchWeather(start, end, startTime, endTime, date) {
     try {
-        const res = await fetch('/api/weather', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ origin: start, destination: end, start_hour: startTime, end_hour: endTime, date: date })
-        });
+        const res = await fetchCached('/api/weather', { origin: start, destination: end, start_hour: startTime, end_hour: endTime, date: date, along_route: true });
         const data = await res.json();
         const weatherCard = document.getElementById('weather-engine-card');
         const weatherContent = document.getElementById('weather-engine-content');
@@ -401,7 +461,7 @@ async function fetchWeather(start, end, startTime, endTime, date) {
         weatherCard.classList.remove('hidden');
         weatherCard.style.display = 'block';
 
-        const imagePath = `/static/images/${data.image}`;
+        const imagePath = data.image_url || `/static/images/${data.image}`;
 
         // Generate Dynamic Tip
         let tip = "Drive safely in this weather.";
@@ -455,6 +515,20 @@ async function fetchWeather(start, end, startTime, endTime, date) {
             </div>
         `;
 
+        // Weather on the way, for the time each stretch will be driven
+        const alongRoute = data.along_route;
+        if (alongRoute && alongRoute.alerts && alongRoute.alerts.length) {
+            weatherContent.innerHTML += `
+            <div class="impact-alert">
+                <i class="fas fa-route"></i>
+                <div class="impact-text">
+                    <h4>On the way</h4>
+                    ${alongRoute.alerts.map(a => `<p>${a}</p>`).join('')}
+                </div>
+            </div>
+            `;
+        }
+
         // Color accent the card border
         const borderColors = { sunny: '#f59e0b', pleasant: '#22c55e', cold: '#3b82f6', rainy: '#6366f1', windy: '#ef4444' };
         weatherCard.style.borderLeftColor = borderColors[data.condition] || 'var(--accent-primary)';
@@ -462,14 +536,32 @@ async function fetchWeather(start, end, startTime, endTime, date) {
     } catch (err) { console.error(err); }
 }
 
+// Arrive-by planning: latest departure that still makes it, with a safety margin
+async function fetchLatestDeparture(start, end, date, arriveBy) {
+    try {
+        const res = await fetchCached('/api/arrive_by', { origin: start, destination: end, date: date, arrive_by: arriveBy });
+        const data = await res.json();
+        const resultDiv = document.getElementById('planner-result');
+        if (!resultDiv) return;
+
+        let html;
+        if (!res.ok || data.error) {
+            html = `<span style="color: #ef4444;">${data.error || 'Could not plan the departure.'}</span>`;
+        } else {
+            const warning = data.already_passed ? ' <span style="color: #ef4444;">(already passed)</span>' : '';
+            html = `<strong style="color: var(--accent-secondary);">Leave by ${data.depart_label}</strong>${warning}<br>
+                Arrive ~${data.expected_arrival} (${data.duration_formatted}, ${data.traffic_level} traffic), ${data.margin_minutes} min before ${data.arrive_by}`;
+        }
+        resultDiv.insertAdjacentHTML('beforeend', `<div class="recommendation-box" style="margin-top: 0.5rem;"><i class="fas fa-flag-checkered"></i><div>${html}</div></div>`);
+    } catch (err) { console.error("Arrive-by fetch error:", err); }
+}
+
 // LAPS (Late Arrival Probability Score) Logic
-async function fetchLAPS(start, end, startTime, endTime, date) {
+async function fetchLAPS(start, end, startTime, endTime, date, arriveBy) {
     try {
-        const res = await fetch('/api/laps', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ origin: start, destination: end, start_hour: startTime, end_hour: endTime, date: date })
-        });
+        const payload = { origin: start, destination: end, start_hour: startTime, end_hour: endTime, date: date };
+        if (arriveBy) payload.arrive_by = arriveBy;
+        const res = await fetchCached('/api/laps', payload);
         const data = await res.json();
         const lapsCard = document.getElementById('laps-card');
         const lapsContent = document.getElementById('laps-content');
@@ -498,6 +590,12 @@ async function fetchLAPS(start, end, startTime, endTime, date) {
                 hotspotHtml += `</div>`;
             }
 
+            // Arrive-by mode: simulated on-time chance and arrival spread for this departure
+            let arrivalHtml = '';
+            if (item.on_time_probability !== undefined) {
+                arrivalHtml = `<div style="font-size: 0.75rem; color: var(--text-secondary); margin: 0.2rem 0 0.4rem;">On time: ${item.on_time_probability}% · Arrive ~${item.arrival_p50} (90%: by ${item.arrival_p90})</div>`;
+            }
+
             lapsHtml += `
             <div class="laps-timeline-wrapper">
                 <div class="laps-hour-timeline-item">
@@ -507,6 +605,7 @@ async function fetchLAPS(start, end, startTime, endTime, date) {
                     </div>
                     <div class="laps-percentage" style="color: ${riskColor}">${item.risk}%</div>
                 </div>
+                ${arrivalHtml}
                 ${hotspotHtml}
             </div>
             `;
@@ -531,20 +630,20 @@ if (tripForm) {
             return;
         }
 
+        // Show an instant estimate while the exact route loads
+        document.getElementById('trip-result').dataset.exact = 'false';
+        showEstimate(start, end, vehicleId);
+
         // Call TomTom Routing API via Backend
         try {
-            const routeRes = await fetch('/api/route', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ origin: start, destination: end })
-            });
+            const routeRes = await fetchCached('/api/route', { origin: start, destination: end });
             const routeData = await routeRes.json();
 
             if (routeRes.ok) {
                 const distanceKm = routeData.distance_km;
                 const distanceText = `${distanceKm} km`;
                 const avgSpeed = routeData.avg_speed_kmh;
-                await calculateCost(distanceKm, distanceText, vehicleId, avgSpeed);
+                await calculateCost(distanceKm, distanceText, vehicleId, avgSpeed, start, end);
             } else {
                 alert(routeData.error || "Failed to calculate route");
             }
@@ -555,7 +654,32 @@ if (tripForm) {
     });
 }
 
-async function calculateCost(distanceKm, distanceText, vehicleId, avgSpeed) {
+async function showEstimate(start, end, vehicleId) {
+    try {
+        const res = await fetch('/api/estimate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ origin: start, destination: end, vehicle_id: vehicleId })
+        });
+        const data = await res.json();
+        const resultDiv = document.getElementById('trip-result');
+        // The exact result may already be on screen
+        if (!res.ok || data.error || resultDiv.dataset.exact === 'true') return;
+
+        resultDiv.classList.remove('hidden');
+        resultDiv.innerHTML = `
+            <div class="result-item"><strong>Distance:</strong> ~${data.distance_km} km</div>
+            <div class="result-item"><strong>Duration:</strong> ~${data.duration_formatted}</div>
+            <div class="result-item"><strong>Fuel Needed:</strong> ~${data.fuel_litres} units</div>
+            <div class="result-item highlight"><strong>Estimated Cost:</strong> ~₹${data.cost}</div>
+            <div class="result-item"><em>Approximate, refining with live route...</em></div>
+        `;
+    } catch (err) {
+        console.error(err);
+    }
+}
+
+async function calculateCost(distanceKm, distanceText, vehicleId, avgSpeed, start, end) {
     // 2. Call Backend to Calculate Cost
     try {
         const res = await fetch('/api/calculate_trip', {
@@ -563,13 +687,16 @@ async function calculateCost(distanceKm, distanceText, vehicleId, avgSpeed) {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 distance_km: distanceKm,
-                vehicle_id: vehicleId
+                vehicle_id: vehicleId,
+                origin: start,
+                destination: end
             })
         });
         const data = await res.json();
 
         const resultDiv = document.getElementById('trip-result');
         resultDiv.classList.remove('hidden');
+        resultDiv.dataset.exact = 'true';
 
         if (data.error) {
             resultDiv.innerHTML = `< span style = "color:red" > ${data.error}</span > `;
@@ -0,0 +1,75 @@
+import uuid
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+LIMITS = {"sweep": {"user_concurrency": 1, "global_concurrency": 2, "rate_per_minute": 60, "burst": 2}}
+
+
+def test_user_concurrency_is_429_with_retry_after():
+    admission = AdmissionController(LIMITS)
+    admission.acquire("sweep", 1)
+    with pytest.raises(AdmissionRejected) as e:
+        admission.acquire("sweep", 1)
+    assert e.value.status == 429 and e.value.retry_after >= 1
+
+
+def test_empty_bucket_is_429_until_it_refills():
+    admission = AdmissionController(LIMITS)
+    for _ in range(2):
+        admission.release("sweep", 1, admission.acquire("sweep", 1))
+    with pytest.raises(AdmissionRejected) as e:
+        admission.acquire("sweep", 1)
+    assert e.value.status == 429
+    assert e.value.retry_after == 1  # one token per second at 60/min
+
+
+def test_global_cap_is_503():
+    admission = AdmissionController(LIMITS)
+    admission.acquire("sweep", 1)
+    admission.acquire("sweep", 2)
+    with pytest.raises(AdmissionRejected) as e:
+        admission.acquire("sweep", 3)
+    assert e.value.status == 503
+    assert admission.snapshot()["sweep"]["rejected"] == {"429": 0, "503": 1}
+
+
+def test_disabled_admits_everything():
+    admission = AdmissionController(LIMITS, enabled=False)
+    for _ in range(10):
+        admission.acquire("sweep", 1)
+
+
+@pytest.fixture
+def sweep_stubs(appmod, monkeypatch):
+    """Instant smart_plan / arrive_by / laps, each request unique so nothing is memoized."""
+    monkeypatch.setattr(appmod, "_run_smart_plan", lambda user_id, data, **kw: ({"best_hour": 8}, 200))
+    monkeypatch.setattr(appmod.tomtom_service, "find_latest_departure", lambda *a, **kw: {"depart_at": "08:00"})
+    monkeypatch.setattr(appmod.tomtom_service, "calculate_laps", lambda *a, **kw: [])
+    monkeypatch.setattr(appmod.admission, "_buckets", {})
+
+    def plan(client):
+        body = {"origin": uuid.uuid4().hex, "destination": "B", "start_hour": 8, "end_hour": 9, "arrive_by": "09:30"}
+        return [client.post(path, json=body) for path in ("/api/smart_plan", "/api/arrive_by", "/api/laps")]
+    return plan
+
+
+def test_default_burst_allows_several_dashboard_plans(client, sweep_stubs):
+    for _ in range(3):
+        assert [r.status_code for r in sweep_stubs(client)] == [200, 200, 200]
+
+
+def test_endpoint_sheds_with_429_and_retry_after(appmod, client, sweep_stubs, monkeypatch):
+    monkeypatch.setitem(appmod.admission.limits, "sweep", dict(appmod.admission.limits["sweep"], burst=1, rate_per_minute=1))
+    responses = sweep_stubs(client)
+    assert [r.status_code for r in responses] == [200, 429, 429]
+    assert int(responses[1].headers["Retry-After"]) >= 1
+    assert responses[1].get_json()["retry_after"] == int(responses[1].headers["Retry-After"])
+
+
+def test_endpoint_sheds_with_503_when_server_busy(appmod, client, sweep_stubs, monkeypatch):
+    monkeypatch.setitem(appmod.admission.limits, "sweep", dict(appmod.admission.limits["sweep"], global_concurrency=0))
+    resp = sweep_stubs(client)[0]
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"].isdigit()
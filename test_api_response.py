@@ -0,0 +1,121 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+import api_response
+from api_response import FastJSONProvider, ResponseCompressor, stream_json_array
+
+ROWS = [{"hour": h, "risk": h * 3, "jam_spots": ["Shivajinagar", "Hadapsar"]} for h in range(300)]
+
+
+@pytest.fixture
+def make_client():
+    def build(**kwargs):
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+        compressor = ResponseCompressor(**kwargs)
+
+        @app.route("/big")
+        def big():
+            return jsonify(ROWS)
+
+        @app.route("/small")
+        def small():
+            return jsonify({"ok": True})
+
+        @app.route("/stream")
+        def stream():
+            return Response(stream_json_array(ROWS, app.json.dumps, chunk_size=7), mimetype="application/json")
+
+        @app.route("/tagged")
+        def tagged():
+            response = jsonify(ROWS)
+            response.set_etag("abc123")
+            return response
+
+        @app.after_request
+        def compress(response):
+            return compressor.compress(response, request.accept_encodings)
+
+        client = app.test_client()
+        client.compressor = compressor
+        return client
+    return build
+
+
+def test_stream_json_array_is_valid_json():
+    for items in (ROWS, ROWS[:1], []):
+        assert json.loads("".join(stream_json_array(items, json.dumps, chunk_size=7))) == items
+
+
+def test_gzip_when_accepted(make_client):
+    client = make_client(min_size=100)
+    resp = client.get("/big", headers={"Accept-Encoding": "gzip, deflate"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert json.loads(gzip.decompress(resp.get_data())) == ROWS
+    assert client.compressor.stats["bytes_out"] < client.compressor.stats["bytes_in"]
+
+
+def test_identity_when_not_accepted_still_varies(make_client):
+    resp = make_client(min_size=100).get("/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert resp.get_json() == ROWS
+
+
+def test_small_bodies_are_not_compressed(make_client):
+    resp = make_client(min_size=1024).get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["Vary"]
+
+
+def test_brotli_preferred_when_available(make_client, monkeypatch):
+    class FakeBrotli:
+        @staticmethod
+        def compress(data, quality):
+            return b"BR" + data
+
+    monkeypatch.setattr(api_response, "brotli", FakeBrotli)
+    client = make_client(min_size=100)
+    resp = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert resp.get_data().startswith(b"BR[")
+    # Without br in Accept-Encoding gzip is still chosen
+    assert client.get("/big", headers={"Accept-Encoding": "gzip"}).headers["Content-Encoding"] == "gzip"
+
+
+def test_brotli_unavailable_falls_back_to_gzip(make_client, monkeypatch):
+    monkeypatch.setattr(api_response, "brotli", None)
+    resp = make_client(min_size=100).get("/big", headers={"Accept-Encoding": "br, gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+
+
+def test_streamed_response_is_compressed_chunkwise(make_client):
+    client = make_client(min_size=100)
+    resp = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert json.loads(gzip.decompress(resp.get_data())) == ROWS
+
+
+def test_streamed_response_uncompressed(make_client):
+    resp = make_client().get("/stream")
+    assert "Content-Encoding" not in resp.headers
+    assert json.loads(resp.get_data()) == ROWS
+
+
+def test_compressed_etag_becomes_weak(make_client):
+    resp = make_client(min_size=100).get("/tagged", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["ETag"] == 'W/"abc123"'
+
+
+def test_json_provider_handles_numpy():
+    pytest.importorskip("orjson")
+    import numpy as np
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    assert json.loads(app.json.dumps({"b": np.arange(3), "a": np.float64(1.5)})) == {"a": 1.5, "b": [0, 1, 2]}
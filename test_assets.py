@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+from flask import Flask
+
+from assets import MANIFEST, AssetManifest, build_assets
+
+SCRIPT = "function plan() { return 42; }\n" * 40
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    (static / "js" / "main.js").write_text(SCRIPT)
+    (static / "tiny.css").write_text("body{}")
+    (static / "logo.png").write_bytes(b"\x89PNG" + bytes(600))
+    return static
+
+
+def test_build_into_dir_with_existing_file(tmp_path, static_dir):
+    out = tmp_path / "dist"
+    build_assets(str(static_dir), str(out))
+    (out / "notes.txt").write_text("keep me")
+    (static_dir / "js" / "main.js").write_text(SCRIPT + "// v2\n")
+
+    manifest = build_assets(str(static_dir), str(out))
+
+    assert (out / "notes.txt").read_text() == "keep me"
+    assert json.loads((out / MANIFEST).read_text()) == manifest
+    digest = hashlib.sha256((SCRIPT + "// v2\n").encode()).hexdigest()[:10]
+    assert manifest["js/main.js"] == f"js/main.{digest}.js"
+    assert gzip.decompress((out / f"js/main.{digest}.js.gz").read_bytes()).decode() == SCRIPT + "// v2\n"
+    # Small and already-compressed files get no variant; stale hashed files are gone
+    assert not (out / (manifest["tiny.css"] + ".gz")).exists()
+    assert not (out / (manifest["logo.png"] + ".gz")).exists()
+    assert {p.name.split(".")[1] for p in (out / "js").iterdir()} == {digest}
+
+
+def test_refuses_dir_without_previous_manifest(tmp_path, static_dir):
+    out = tmp_path / "dist"
+    out.mkdir()
+    (out / "notes.txt").write_text("keep me")
+    with pytest.raises(ValueError):
+        build_assets(str(static_dir), str(out))
+    assert (out / "notes.txt").exists()
+
+
+@pytest.mark.parametrize("inside", [".", "build"])
+def test_refuses_to_build_over_the_sources(static_dir, inside):
+    with pytest.raises(ValueError):
+        build_assets(str(static_dir), str(static_dir / inside))
+    assert (static_dir / "js" / "main.js").read_text() == SCRIPT
+
+
+def test_serves_precompressed_variant(tmp_path, static_dir):
+    out = tmp_path / "dist"
+    manifest = build_assets(str(static_dir), str(out))
+    app = Flask(__name__)
+    assets = AssetManifest(str(out))
+    app.add_url_rule("/assets/<path:filename>", "static_assets", assets.serve)
+
+    resp = app.test_client().get(f"/assets/{manifest['js/main.js']}", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert gzip.decompress(resp.get_data()).decode() == SCRIPT
+    with app.test_request_context():
+        assert assets.url("js/main.js") == f"/assets/{manifest['js/main.js']}"
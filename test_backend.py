@@ -55,6 +55,11 @@ def test_smart_plan():
     })
     print(f"Status: {res.status_code}, Response: {res.json()}")
 
+def test_trip_summary():
+    print("Testing Trip Summary...")
+    res = SESSION.get(f"{BASE_URL}/api/trips/summary")
+    print(f"Status: {res.status_code}, Response: {res.json()}")
+
 if __name__ == "__main__":
     try:
         test_signup()
@@ -68,5 +73,6 @@ if __name__ == "__main__":
             test_calculate_trip(vehicles[0]['id'])
         
         test_smart_plan()
+        test_trip_summary()
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,105 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from congestion import (MIN_SECTION_DELAY, analyze_sections, classify, congestion_level, congestion_profile,
+                        top_sections)
+
+
+def make_routes(n_routes=4, seed=7):
+    rng = random.Random(seed)
+    routes = []
+    for r in range(n_routes):
+        points = [{"latitude": 18.5 + i * 0.002 + r * 0.01, "longitude": 73.8 + i * 0.0015} for i in range(400)]
+        sections = []
+        for _ in range(12):
+            start = rng.randrange(0, 380)
+            sections.append({
+                "startPointIndex": start,
+                "endPointIndex": start + rng.randrange(1, 60),
+                "sectionType": rng.choice(["TRAFFIC", "TRAFFIC", "TOLL_ROAD", "MOTORWAY"]),
+                "delayInSeconds": rng.choice([0, 10, 31, 45, 90, 90, 240, 600])
+            })
+        sections.append({"startPointIndex": None, "endPointIndex": 5, "sectionType": "TRAFFIC", "delayInSeconds": 999})
+        routes.append({
+            "summary": {"lengthInMeters": 60000, "noTrafficTravelTimeInSeconds": 3600 + 120 * r},
+            "legs": [{"points": points}],
+            "sections": sections
+        })
+    return routes
+
+
+def haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a["latitude"], a["longitude"], b["latitude"], b["longitude"]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(h))
+
+
+def per_section_loop(routes):
+    """The pre-vectorization logic: walk every section of every route one at a time."""
+    rows = []
+    for r, route in enumerate(routes):
+        points = route["legs"][0]["points"]
+        cum = [0.0]
+        for a, b in zip(points, points[1:]):
+            cum.append(cum[-1] + haversine(a, b))
+        summary = route["summary"]
+        free_kmh = summary["lengthInMeters"] / 1000 / (summary["noTrafficTravelTimeInSeconds"] / 3600)
+        for section in route["sections"]:
+            if not (section.get("sectionType") == "TRAFFIC" or section.get("delayInSeconds", 0) > MIN_SECTION_DELAY):
+                continue
+            start, end = section.get("startPointIndex"), section.get("endPointIndex")
+            if start is None or end is None:
+                continue
+            start, end = min(start, len(points) - 1), min(end, len(points) - 1)
+            mid = points[(start + end) // 2]
+            length = cum[end] - cum[start]
+            ratio = 1 + section["delayInSeconds"] / max(length / free_kmh * 3600, 1)
+            rows.append({"route": r, "start": start, "delay": section["delayInSeconds"], "lat": mid["latitude"],
+                         "lon": mid["longitude"], "from_km": cum[start], "level": congestion_level(ratio)})
+    return rows
+
+
+def ranked(rows, k, per_route=None):
+    order = sorted(range(len(rows)), key=lambda i: -rows[i]["delay"])  # sorted() is stable
+    picked, counts = [], {}
+    for i in order:
+        if per_route is None or counts.get(rows[i]["route"], 0) < per_route:
+            counts[rows[i]["route"]] = counts.get(rows[i]["route"], 0) + 1
+            picked.append(i)
+    return picked[:k]
+
+
+def test_sections_match_per_section_loop():
+    routes = make_routes()
+    expected = per_section_loop(routes)
+    sections = analyze_sections(routes)
+    assert len(sections["delay"]) == len(expected)
+    for key in ("route", "start", "delay", "lat", "lon", "from_km"):
+        assert sections[key] == pytest.approx([row[key] for row in expected])
+    assert list(sections["level"]) == [row["level"] for row in expected]
+
+
+@pytest.mark.parametrize("k, per_route", [(5, None), (8, 2), (3, 1), (100, None)])
+def test_top_sections_ranking_matches_loop(k, per_route):
+    routes = make_routes()
+    sections = analyze_sections(routes)
+    assert top_sections(sections, k, per_route=per_route).tolist() == ranked(per_section_loop(routes), k, per_route)
+
+
+def test_no_sections():
+    sections = analyze_sections([{"summary": {}, "legs": [], "sections": []}])
+    assert len(sections["delay"]) == 0 and top_sections(sections, 3).tolist() == []
+
+
+def test_classify_thresholds():
+    assert list(classify([1.0, 1.15, 1.39, 1.4, 1.8, 3.0])) == ["Low", "Moderate", "Moderate", "Heavy", "Critical", "Critical"]
+
+
+def test_profile_is_in_driving_order():
+    sections = analyze_sections(make_routes(1))
+    profile = congestion_profile(sections)
+    assert [p["from_km"] for p in profile] == sorted(p["from_km"] for p in profile)
+    assert np.isclose(sum(p["delay_sec"] for p in profile), sections["delay"].sum())
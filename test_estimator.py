@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from estimator import RouteEstimator, haversine_km
+
+PUNE = {"lat": 18.5204, "lon": 73.8567}
+MUMBAI = {"lat": 19.0760, "lon": 72.8777}
+NASHIK = {"lat": 19.9975, "lon": 73.7898}
+CHENNAI = {"lat": 13.0827, "lon": 80.2707}
+
+
+def test_haversine_known_distances():
+    assert haversine_km(0, 0, 0, 0) == 0
+    assert haversine_km(0, 0, 0, 1) == pytest.approx(111.195, abs=0.01)  # one degree on the equator
+    assert haversine_km(PUNE["lat"], PUNE["lon"], MUMBAI["lat"], MUMBAI["lon"]) == pytest.approx(120, abs=2)
+
+
+def test_haversine_broadcasts():
+    lat = np.array([PUNE["lat"], MUMBAI["lat"]])
+    lon = np.array([PUNE["lon"], MUMBAI["lon"]])
+    matrix = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    assert matrix.shape == (2, 2)
+    assert matrix[0, 1] == matrix[1, 0] and matrix[0, 0] == 0
+
+
+def test_regional_circuity_after_min_samples():
+    estimator = RouteEstimator(circuity=1.3, min_samples=3)
+    straight = float(haversine_km(PUNE["lat"], PUNE["lon"], MUMBAI["lat"], MUMBAI["lon"]))
+    cell = estimator._cell((PUNE["lat"] + MUMBAI["lat"]) / 2, (PUNE["lon"] + MUMBAI["lon"]) / 2)
+
+    estimator.observe(PUNE, MUMBAI, straight * 1.25, duration_sec=3 * 3600)
+    estimator.observe(PUNE, MUMBAI, straight * 1.25, duration_sec=3 * 3600)
+    assert estimator.factors(cell)[2] == 0  # still national figures
+    estimator.observe(PUNE, MUMBAI, straight * 1.25, duration_sec=3 * 3600)
+
+    circuity, speed, samples = estimator.factors(cell)
+    assert (circuity, samples) == (pytest.approx(1.25), 3)
+    assert speed == pytest.approx(straight * 1.25 / 3)
+    estimate = estimator.estimate(PUNE, MUMBAI)
+    assert estimate["distance_km"] == pytest.approx(straight * 1.25, abs=0.1)
+    assert estimate["calibration_samples"] == 3
+    # A region with no observations of its own uses the (updated) national factor
+    assert estimator.factors(estimator._cell(CHENNAI["lat"], CHENNAI["lon"]))[2] == 0
+
+
+def test_implausible_routes_are_ignored():
+    estimator = RouteEstimator(circuity=1.3)
+    straight = float(haversine_km(PUNE["lat"], PUNE["lon"], MUMBAI["lat"], MUMBAI["lon"]))
+    estimator.observe(PUNE, MUMBAI, straight * 6)  # ferry or detour
+    estimator.observe(PUNE, {"lat": PUNE["lat"] + 0.001, "lon": PUNE["lon"]}, 5)  # street-grid hop
+    assert estimator.factors(None) == (1.3, 45.0, 0)
+
+
+def test_matrix_is_symmetric_with_zero_diagonal():
+    distances, durations, _ = RouteEstimator().estimate_matrix([PUNE, MUMBAI, NASHIK])
+    assert np.allclose(distances, distances.T) and np.allclose(np.diag(durations), 0)
+
+
+@pytest.mark.parametrize("stops", [[1, 2], "Pune,Mumbai", [None, "Pune"], {"a": "Pune"}])
+def test_estimate_rejects_non_string_stops(client, upstream, stops):
+    resp = client.post("/api/estimate", json={"stops": stops})
+    assert resp.status_code == 400
+    assert not upstream.calls
+
+
+def test_estimate_between_known_cities_needs_no_upstream(client, upstream):
+    resp = client.post("/api/estimate", json={"origin": "Pune", "destination": "Mumbai"})
+    assert resp.status_code == 200
+    assert resp.get_json()["approximate"] is True
+    assert not [c for c in upstream.calls if "tomtom" in c[1]]
@@ -0,0 +1,32 @@
+import pytest
+
+from gazetteer import Gazetteer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer()
+
+
+def test_lookup_names_aliases_and_state(gazetteer):
+    assert gazetteer.lookup("Bombay")["name"] == "Mumbai"
+    assert gazetteer.lookup("Pune, Maharashtra, India")["name"] == "Pune"
+    assert gazetteer.lookup("Pune, Gujarat") is None
+
+
+@pytest.mark.parametrize("query", [None, 123, 4.5, ["Pune"], {"name": "Pune"}, ""])
+def test_lookup_ignores_non_strings(gazetteer, query):
+    assert gazetteer.lookup(query) is None
+
+
+def test_lookup_leaves_neighbouring_towns_to_the_geocoder(gazetteer):
+    for query in ("Secunderabad", "Vashi", "Pink City"):
+        assert gazetteer.lookup(query) is None
+
+
+@pytest.mark.parametrize("endpoint", ["/api/route", "/api/smart_plan", "/api/laps", "/api/weather", "/api/arrive_by"])
+def test_numeric_origin_is_a_client_error(client, upstream, endpoint):
+    body = {"origin": 123, "destination": 456, "start_hour": 8, "end_hour": 9, "arrive_by": "09:00"}
+    resp = client.post(endpoint, json=body)
+    assert resp.status_code == 400
+    assert not upstream.calls
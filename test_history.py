@@ -0,0 +1,30 @@
+import threading
+
+from history import TripLogger
+
+
+def logger_threads():
+    return [t for t in threading.enumerate() if t.name == "trip-logger"]
+
+
+def test_flush_thread_starts_on_first_log(appmod):
+    before = len(logger_threads())
+    logger = TripLogger(appmod.app, flush_interval=0.05)
+    assert logger._thread is None
+    assert len(logger_threads()) == before
+
+    logger.log(None, start_location="Pune", end_location="Mumbai", source="test")
+    assert logger._thread.is_alive()
+    logger.close()
+    assert not logger._thread.is_alive()
+
+
+def test_logged_trip_shows_in_history_after_flush(appmod, client):
+    with client.session_transaction() as session:
+        user_id = session["user_id"]
+    appmod.trip_logger.log(user_id, start_location="Pune", end_location="Mumbai", distance_km=148.5,
+                           fuel_cost=900.0, fuel_litres=9.9, source="test")
+    appmod.trip_logger.flush()
+
+    trips = client.get("/api/trips").get_json()
+    assert [(t["start_location"], t["end_location"]) for t in trips] == [("Pune", "Mumbai")]
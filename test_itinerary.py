@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from itinerary import nearest_neighbour_order, plan_visit_order, route_cost, two_opt
+
+# Greedy from stop 0 goes 0 -> 3 -> 4 -> 2 -> 1 -> 5, whose 4 -> 2 and 1 -> 5 legs cross 0 -> 3
+POINTS = np.array([[6, 3], [0, 0], [8, 9], [6, 7], [5, 9], [8, 0]], dtype=float)
+
+
+def distances(points):
+    return np.linalg.norm(points[:, None] - points[None, :], axis=-1)
+
+
+def crossings(points, order):
+    def side(a, b, c):
+        return np.sign((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+
+    legs = [(points[a], points[b]) for a, b in zip(order, order[1:])]
+    return sum(
+        side(p, q, r) * side(p, q, s) < 0 and side(r, s, p) * side(r, s, q) < 0
+        for i, (p, q) in enumerate(legs) for r, s in legs[i + 2:]
+    )
+
+
+def test_two_opt_removes_a_crossing():
+    durations = distances(POINTS)
+    greedy = nearest_neighbour_order(durations, start=0, end=5)
+    assert greedy == [0, 3, 4, 2, 1, 5] and crossings(POINTS, greedy)
+
+    order = plan_visit_order(durations, start=0, end=5)
+    assert crossings(POINTS, order) == 0
+    assert route_cost(durations, order) < route_cost(durations, greedy)
+    assert (order[0], order[-1]) == (0, 5)
+    assert sorted(order) == list(range(6))
+
+
+def test_two_opt_untangles_a_square():
+    square = np.array([[0, 0], [1, 1], [1, 0], [0, 1]], dtype=float)
+    assert two_opt(distances(square), [0, 1, 2, 3]) in ([0, 2, 1, 3], [0, 3, 1, 2])
+    assert route_cost(distances(square), two_opt(distances(square), [0, 1, 2, 3])) == pytest.approx(3)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_first_and_last_stops_stay_fixed(seed):
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(5, 60, (7, 7))  # asymmetric, like real travel times
+    np.fill_diagonal(durations, 0)
+    start, end = 2, 4
+    order = plan_visit_order(durations, start=start, end=end)
+    assert order[0] == start and order[-1] == end
+    assert sorted(order) == list(range(7))
+    assert route_cost(durations, order) <= route_cost(durations, nearest_neighbour_order(durations, start, end))
+
+
+def test_round_trip_returns_to_start():
+    order = plan_visit_order(distances(POINTS), start=0, end=0)
+    assert order[0] == order[-1] == 0
+    assert sorted(order[1:-1]) == [1, 2, 3, 4, 5]
+
+
+def test_unreachable_pairs_are_avoided():
+    durations = distances(POINTS)
+    durations[0, 3] = durations[3, 0] = np.inf
+    order = plan_visit_order(durations, start=0)
+    assert all(np.isfinite(durations[a, b]) for a, b in zip(order, order[1:]))
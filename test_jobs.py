@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from jobs import JobManager
+from models import db, Job
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_status_flow_and_dedup(appmod):
+    manager = JobManager(appmod.app, max_workers=2)
+    gate = threading.Event()
+    runs = []
+
+    def work(user_id, params, progress=None):
+        runs.append(params)
+        progress(1, 4)
+        gate.wait(5)
+        return {"answer": params["x"] * 2}, 200
+
+    with appmod.app.test_request_context():
+        first = manager.submit(1, "laps", {"x": 21}, work)
+        assert first["status"] == "queued"
+        assert manager.submit(1, "laps", {"x": 21}, work)["job_id"] == first["job_id"]
+        other = manager.submit(2, "laps", {"x": 21}, work)
+        assert other["job_id"] != first["job_id"]
+
+        assert wait_for(lambda: manager.get(first["job_id"], 1)["status"] == "running")
+        assert manager.get(first["job_id"], 2) is None
+        gate.set()
+        assert wait_for(lambda: manager.get(first["job_id"], 1)["status"] == "done")
+        done = manager.get(first["job_id"], 1)
+        assert done["result"] == {"answer": 42} and done["progress"] == 100
+        # A finished job is reused for identical work inside reuse_seconds
+        assert manager.submit(1, "laps", {"x": 21}, work)["job_id"] == first["job_id"]
+    assert len(runs) == 2
+
+
+def test_failed_job_reports_error(appmod):
+    manager = JobManager(appmod.app)
+    with appmod.app.test_request_context():
+        job = manager.submit(1, "smart_plan", {"x": 1}, lambda user_id, params, progress=None: ({"error": "no route"}, 400))
+        assert wait_for(lambda: manager.get(job["job_id"], 1)["status"] == "failed")
+        assert manager.get(job["job_id"], 1)["error"] == "no route"
+
+
+def test_progress_is_visible_from_another_worker(appmod):
+    running, other_worker = JobManager(appmod.app), JobManager(appmod.app)
+    running.PROGRESS_WRITE_SECONDS = 0
+    reported, gate = threading.Event(), threading.Event()
+
+    def work(user_id, params, progress=None):
+        progress(3, 4)
+        reported.set()
+        gate.wait(5)
+        return {}, 200
+
+    with appmod.app.test_request_context():
+        job = running.submit(1, "batch_plan", {"rows": 4}, work)
+        assert reported.wait(5)
+        assert other_worker.get(job["job_id"], 1)["progress"] == 75
+        gate.set()
+
+
+def test_only_stale_jobs_are_expired(appmod):
+    manager = JobManager(appmod.app, heartbeat_seconds=30)
+    old = datetime.utcnow() - timedelta(minutes=10)
+    with appmod.app.test_request_context():
+        db.session.add(Job(id="stale", kind="laps", status="running", user_id=1, owner="gone:1:x",
+                           heartbeat_at=old, created_at=old))
+        db.session.add(Job(id="alive", kind="laps", status="running", user_id=1, owner="other:2:y",
+                           heartbeat_at=datetime.utcnow()))
+        db.session.commit()
+        assert manager.get("stale", 1)["status"] == "failed"
+        assert manager.get("alive", 1)["status"] == "running"
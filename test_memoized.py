@@ -0,0 +1,73 @@
+import uuid
+
+import pytest
+
+LAPS_ROWS = [{"hour": h, "time_label": f"{h} AM", "risk": 10 + h, "jam_spots": ["Hinjewadi Phase 1"] * 3}
+             for h in range(24)]
+
+
+@pytest.fixture
+def laps(appmod, monkeypatch):
+    calls = []
+
+    def calculate_laps(*args, **kwargs):
+        calls.append(args)
+        return LAPS_ROWS
+
+    monkeypatch.setattr(appmod.tomtom_service, "calculate_laps", calculate_laps)
+    body = {"origin": f"Pune {uuid.uuid4().hex[:6]}", "destination": "Mumbai", "start_hour": 6, "end_hour": 9}
+    return body, calls
+
+
+def test_repeat_request_with_etag_gets_304(client, laps):
+    body, calls = laps
+    first = client.post("/api/laps", json=body, headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert "private" in first.headers["Cache-Control"]
+
+    again = client.post("/api/laps", json=body, headers={"If-None-Match": first.headers["ETag"],
+                                                         "Accept-Encoding": "identity"})
+    assert again.status_code == 304 and again.get_data() == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert len(calls) == 1
+
+
+def test_memo_ignores_case_and_whitespace_but_not_params(client, laps):
+    body, calls = laps
+    client.post("/api/laps", json=body)
+    same = dict(body, origin=f"  {body['origin'].upper()} ")
+    assert client.post("/api/laps", json=same).status_code == 200
+    assert len(calls) == 1
+    client.post("/api/laps", json=dict(body, end_hour=10))
+    assert len(calls) == 2
+
+
+def test_weak_etag_under_gzip_still_matches(client, laps):
+    body, calls = laps
+    first = client.post("/api/laps", json=body, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    again = client.post("/api/laps", json=body, headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+    assert again.status_code == 304
+    # The weak tag also validates the identity representation, and vice versa
+    plain = client.post("/api/laps", json=body, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert plain.status_code == 304
+    assert len(calls) == 1
+
+
+def test_stale_etag_gets_full_body(client, laps):
+    body, _ = laps
+    resp = client.post("/api/laps", json=body, headers={"If-None-Match": '"not-the-tag"'})
+    assert resp.status_code == 200 and resp.get_json() == LAPS_ROWS
+
+
+def test_errors_are_not_memoized(appmod, client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(appmod.tomtom_service, "calculate_laps",
+                        lambda *a, **kw: calls.append(a) or {"error": "Could not find location"})
+    body = {"origin": uuid.uuid4().hex, "destination": "Mumbai", "start_hour": 6, "end_hour": 9}
+    assert client.post("/api/laps", json=body).status_code == 400
+    assert client.post("/api/laps", json=body).status_code == 400
+    assert len(calls) == 2
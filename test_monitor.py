@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+
+from monitor import TrafficMonitor
+
+
+@pytest.fixture
+def routing(appmod, monkeypatch):
+    """Instant get_route for any place names; records every geocode the request makes."""
+    geocoded = []
+    monkeypatch.setattr(appmod.tomtom_service, "_geocode", lambda query, **kw: geocoded.append(query))
+    monkeypatch.setattr(appmod.tomtom_service, "get_route", lambda origin, destination, **kw: {
+        "primary": {"distance_km": 12.0},
+        "corridor": {"origin": "18.52,73.85", "destination": "19.07,72.87"}
+    })
+    monkeypatch.setitem(appmod.app.config, "MONITOR_ENABLED", True)
+    return geocoded
+
+
+def check_route(client):
+    return client.post("/api/route", json={"origin": uuid.uuid4().hex, "destination": "Mumbai"})
+
+
+def test_signed_in_route_watches_resolved_corridor(appmod, client, routing):
+    r = check_route(client)
+    assert r.status_code == 200 and r.get_json()["distance_km"] == 12.0
+    with client.session_transaction() as session:
+        assert session["monitor_corridor"] == "18.52,73.85>19.07,72.87"
+    assert routing == []  # the route's own endpoints are reused
+    assert client.get("/api/monitor").get_json()["active"] is True
+
+
+def test_anonymous_route_does_not_watch(appmod, routing):
+    client = appmod.app.test_client()
+    assert check_route(client).status_code == 200
+    with client.session_transaction() as session:
+        assert "monitor_corridor" not in session
+
+
+def test_route_does_not_watch_with_monitor_disabled(appmod, client, routing, monkeypatch):
+    monkeypatch.setitem(appmod.app.config, "MONITOR_ENABLED", False)
+    assert check_route(client).status_code == 200
+    with client.session_transaction() as session:
+        assert "monitor_corridor" not in session
+
+
+def test_importing_the_app_does_not_start_the_sampler(appmod):
+    assert appmod.traffic_monitor._thread is None
+
+
+def test_sampled_state_is_visible_to_other_workers(appmod, client, routing):
+    check_route(client)
+
+    class Flow:
+        def get_traffic(self, origin, destination):
+            return {"raw": {"flowSegmentData": {"currentSpeed": 42.0, "freeFlowSpeed": 60}}}
+
+    # The background process samples; the web worker serving /api/monitor never does
+    sampler = TrafficMonitor(appmod.app, Flow())
+    sampler.sample_all()
+
+    state = client.get("/api/monitor").get_json()
+    assert state["active"] and state["current_speed"] == 42.0 and state["samples"] == 1
+    with appmod.app.app_context():
+        assert TrafficMonitor(appmod.app, Flow()).get_state("18.52,73.85>19.07,72.87")["current_speed"] == 42.0
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def predictor(appmod, monkeypatch):
+    """The app's delay predictor fitted on the baseline profile only, restored afterwards."""
+    model = appmod.delay_predictor
+    for attr in ("model", "corridors", "residual_std", "samples", "trained_at"):
+        monkeypatch.setattr(model, attr, getattr(model, attr))
+    monkeypatch.setattr(model, "refresh", lambda: False)
+    monkeypatch.setattr(appmod.tomtom_service, "predictor", model)
+    monkeypatch.setattr(appmod.tomtom_service, "prediction_horizon_days", 3)
+    model.train([], set())
+    return model
+
+
+def far_date():
+    return (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+
+
+def tomtom_calls(upstream):
+    return [url for _, url, _ in upstream.calls if "tomtom" in url]
+
+
+def test_far_date_smart_plan_makes_no_routing_call(client, upstream, predictor):
+    r = client.post("/api/smart_plan", json={
+        "origin": "Pune", "destination": "Mumbai", "start_hour": 7, "end_hour": 10, "date": far_date()
+    })
+    assert r.status_code == 200, r.get_json()
+    body = r.get_json()
+    assert 7 <= body["best_hour"] <= 10
+    assert body["primary"]["predicted"] and body["primary"]["distance_km"] > 100
+    assert body["alternative"] is None
+    assert tomtom_calls(upstream) == []
+
+
+def test_far_date_laps_makes_no_routing_call(client, upstream, predictor):
+    r = client.post("/api/laps", json={
+        "origin": "Pune", "destination": "Mumbai", "start_hour": 7, "end_hour": 10, "date": far_date()
+    })
+    assert r.status_code == 200, r.get_json()
+    assert [entry["hour"] for entry in r.get_json()] == [7, 8, 9, 10]
+    assert all(entry["predicted"] for entry in r.get_json())
+    assert tomtom_calls(upstream) == []
+
+
+def test_near_date_still_uses_live_routing(appmod, upstream, predictor):
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%dT08:00:00")
+    assert appmod.tomtom_service.predicted_route("Pune", "Mumbai", tomorrow) is None
+    assert tomtom_calls(upstream) == []
@@ -0,0 +1,98 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache import TTLCache
+from models import SharedCache, SharedCacheEntry
+
+TOMORROW = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+ROUTE = {"routes": [{
+    "summary": {"lengthInMeters": 150000, "travelTimeInSeconds": 9000, "noTrafficTravelTimeInSeconds": 7200},
+    "legs": [{"points": []}],
+    "sections": []
+}]}
+FORECAST = {"hourly": {
+    "time": [f"{TOMORROW}T{h:02d}:00" for h in range(24)],
+    "temperature_2m": [25.0] * 24,
+    "weather_code": [0] * 24,
+    "wind_speed_10m": [10.0] * 24,
+    "relative_humidity_2m": [50] * 24,
+    "visibility": [10000] * 24
+}}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self._body = json.dumps(body).encode()
+
+    def json(self):
+        return json.loads(self._body)
+
+    def iter_content(self, chunk_size=1):
+        yield self._body
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def background(appmod):
+    """Services as the background process has them: same database, its own memory, publishing."""
+    from services import TomTomTrafficService, WeatherService
+
+    tomtom, weather = TomTomTrafficService("key"), WeatherService()
+    tomtom._summary_cache = SharedCache(appmod.app, "route_summary", tomtom._summary_cache, publish=True)
+    tomtom._laps_cache = SharedCache(appmod.app, "laps", tomtom._laps_cache, publish=True)
+    weather._forecast_cache = SharedCache(appmod.app, "forecast", weather._forecast_cache, publish=True)
+    return tomtom, weather
+
+
+def test_warmed_corridor_is_served_by_web_workers(appmod, client, upstream, background, monkeypatch):
+    import prewarm
+    from prewarm import Prewarmer
+
+    upstream.respond = lambda method, url, **kw: FakeResponse(FORECAST if "open-meteo" in url else ROUTE)
+    monkeypatch.setattr(prewarm, "get_top_corridors", lambda limit: [("Pune", "Mumbai")])
+    warmer = Prewarmer(appmod.app, *background, days=2, start_hour=13, end_hour=15)
+    assert warmer.run_once() == 2
+    assert upstream.calls
+
+    # Nothing warmed is in this worker's memory; it has to come from the shared store
+    for cache in (appmod.tomtom_service._laps_cache, appmod.weather_service._forecast_cache):
+        cache.clear()
+    upstream.calls = []
+
+    laps = client.post("/api/laps", json={
+        "origin": "Pune", "destination": "Mumbai", "start_hour": 13, "end_hour": 15, "date": TOMORROW
+    })
+    assert laps.status_code == 200, laps.get_json()
+    assert [entry["hour"] for entry in laps.get_json()] == [13, 14, 15]
+    weather = client.post("/api/weather", json={
+        "destination": "Mumbai", "start_hour": 13, "end_hour": 15, "date": TOMORROW
+    })
+    assert weather.status_code == 200, weather.get_json()
+    assert upstream.calls == []
+
+
+def test_web_workers_do_not_publish(appmod):
+    cache = SharedCache(appmod.app, "test", TTLCache())
+    key = uuid.uuid4().hex
+    cache.set(key, {"travel_time": 1})
+    assert cache.get(key) == {"travel_time": 1}
+    with appmod.app.app_context():
+        assert SharedCacheEntry.query.filter_by(namespace="test").count() == 0
+
+
+def test_expired_entry_is_only_served_stale(appmod):
+    key = uuid.uuid4().hex
+    SharedCache(appmod.app, "test", TTLCache(), publish=True).set(key, [1, 2], ttl=-10)
+    reader = SharedCache(appmod.app, "test", TTLCache())
+    assert reader.get(key) is None
+    assert reader.get(key, allow_stale=True) == [1, 2]
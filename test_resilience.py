@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    return breaker
+
+
+def test_expired_deadline_does_not_hold_half_open_trial():
+    breaker = half_open_breaker()
+    with pytest.raises(DeadlineExceeded):
+        breaker.call(lambda url, **kw: FakeResponse(), "http://example", deadline=Deadline(0.1))
+    assert not breaker._trial_running
+    assert breaker.allow()
+
+
+def test_half_open_trial_success_closes_breaker():
+    breaker = half_open_breaker()
+    breaker.call(lambda url, **kw: FakeResponse(), "http://example", deadline=Deadline(5))
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda url, **kw: FakeResponse(), "http://example")
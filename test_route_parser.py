@@ -0,0 +1,60 @@
+import json
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from congestion import analyze_sections
+from route_parser import RouteStreamParser
+
+
+def route_response():
+    rng = random.Random(1)
+
+    def leg(n, lat0):
+        return {
+            "summary": {"lengthInMeters": 1},
+            "points": [{"latitude": round(lat0 + i * 1e-4, 5), "longitude": round(73 + i * 1e-4, 5)} for i in range(n)]
+        }
+
+    return {"routes": [{
+        "summary": {"lengthInMeters": 90000, "travelTimeInSeconds": 5000, "noTrafficTravelTimeInSeconds": 4000},
+        "legs": [leg(3000, 18.5), leg(2000, 19.1)],
+        "sections": [{"startPointIndex": a, "endPointIndex": a + 200, "sectionType": "TRAFFIC",
+                      "delayInSeconds": rng.randint(40, 400)} for a in range(100, 4700, 500)]
+    }]}
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_lean_parse_matches_full_parse(separators):
+    doc = route_response()
+    body = json.dumps(doc, separators=separators).encode()
+    expected = analyze_sections(doc["routes"])
+    rng = random.Random(2)
+    for _ in range(5):
+        parser = RouteStreamParser()
+        i = 0
+        while i < len(body):
+            step = rng.randint(1, 4000)
+            parser.feed(body[i:i + step])
+            i += step
+        data = parser.result()
+        sections = analyze_sections(data["routes"])
+        assert len(sections["delay"]) == len(expected["delay"]) > 0
+        for key in ("from_km", "to_km", "lat", "lon", "delay", "delay_ratio"):
+            assert np.allclose(sections[key], expected[key])
+        assert data["routes"][0]["summary"] == doc["routes"][0]["summary"]
+        assert all(RouteStreamParser.REF_KEY not in leg for leg in data["routes"][0]["legs"])
+
+
+def test_compact_points_are_not_materialized():
+    body = json.dumps(route_response(), separators=(",", ":")).encode()
+    parser = RouteStreamParser()
+    parser.feed(body)
+    leg = parser.result()["routes"][0]["legs"][0]
+    assert leg["points"] == []
+    assert leg["points_array"].shape == (3000, 2)
@@ -0,0 +1,36 @@
+from models import VehicleCache
+
+
+def user_id_of(client):
+    with client.session_transaction() as session:
+        return session["user_id"]
+
+
+def vehicles_seen_by(appmod, cache, user_id):
+    with appmod.app.test_request_context():
+        return sorted(v["name"] for v in cache.for_user(user_id).values())
+
+
+def test_other_workers_see_added_and_deleted_vehicles(appmod, client):
+    user_id = user_id_of(client)
+    other_worker = VehicleCache(ttl=600)
+    assert vehicles_seen_by(appmod, other_worker, user_id) == []
+
+    client.post("/api/vehicle", json={"name": "Swift", "mileage": 18, "type": "fuel"})
+    assert vehicles_seen_by(appmod, other_worker, user_id) == ["Swift"]
+
+    vehicle_id = client.get("/api/vehicle").get_json()[0]["id"]
+    client.delete(f"/api/vehicle/{vehicle_id}")
+    assert vehicles_seen_by(appmod, other_worker, user_id) == []
+    with appmod.app.test_request_context():
+        assert other_worker.get(user_id, vehicle_id) is None
+
+
+def test_unchanged_list_is_served_from_memory(appmod, client):
+    user_id = user_id_of(client)
+    client.post("/api/vehicle", json={"name": "Nexon EV", "mileage": 7, "type": "ev", "fuel_type": "ev"})
+    cache = VehicleCache(ttl=600)
+    vehicles_seen_by(appmod, cache, user_id)
+    misses = cache._cache.misses
+    assert vehicles_seen_by(appmod, cache, user_id) == ["Nexon EV"]
+    assert cache._cache.misses == misses